@@ -0,0 +1,87 @@
+"""收货地址格式化（纯函数，不依赖 Qt，可在子进程中调用）"""
+
+import re
+from typing import List
+
+import pandas as pd
+
+
+# 预先格式化好的地址列（多进程/其他引擎处理后带上，渲染时直接使用）
+ADDRESS_COLUMN = "__addr__"
+
+_HYPHEN = re.compile(r"\s*[-\-\–\—\－]\s*")
+_PHONE_LIKE = re.compile(r"(\d[\d\s-]{5,19}\d)")
+_MOBILE = re.compile(r"1[3-9]\d{9}")
+_ALREADY_SPLIT = re.compile(r"^[^-]+-[^-]+-")
+
+
+def re_split_hyphen(text: str) -> List[str]:
+    return _HYPHEN.split(text)
+
+
+def find_phone_like(text: str):
+    return _PHONE_LIKE.search(text)
+
+
+def split_address(text: str) -> str:
+    """PyQt 版格式：姓名 - 电话 - 地址"""
+    if not isinstance(text, str):
+        text = str(text) if pd.notna(text) else ""
+    t = text.strip()
+    if not t:
+        return " -  - "
+    parts = [p.strip() for p in re_split_hyphen(t)]
+    if len(parts) >= 3:
+        return f"{parts[0]} - {parts[1]} - {' - '.join(parts[2:])}"
+    m = find_phone_like(t)
+    if m:
+        s, e = m.span()
+        name = t[:s].strip(" -")
+        phone = t[s:e]
+        addr = t[e:].strip(" -")
+        return f"{name} - {phone} - {addr}" if (name or addr) else f" - {phone} - "
+    return f" -  - {t}"
+
+
+def address_part(text) -> str:
+    """解析出的地址部分（去掉姓名和电话），用于按区域分群"""
+    t = str(text).strip() if isinstance(text, str) or pd.notna(text) else ""
+    m = _MOBILE.search(t)
+    if m:
+        return t[m.end():].strip(" -")
+    parts = [p.strip() for p in re_split_hyphen(t)]
+    if len(parts) >= 3:
+        return " - ".join(parts[2:])
+    return t
+
+
+def contact_fields(raw: pd.Series) -> pd.DataFrame:
+    """整列收货地址一次解析出 姓名 / 手机号 / 地址部分（没有手机号的行姓名、手机号为 NaN）"""
+    raw = raw.fillna("").astype(str).str.strip()
+    return pd.DataFrame({
+        "name": raw.str.extract(r"^(.*?)\s*-?\s*1[3-9]\d{9}", expand=False).str.strip(" -"),
+        "phone": raw.str.extract(r"(1[3-9]\d{9})", expand=False),
+        "area": [address_part(a) for a in raw.tolist()],
+    }, index=raw.index)
+
+
+def format_address_compact(address) -> str:
+    """终极版格式：姓名-手机号-地址，已是该格式的原样返回"""
+    address = str(address).strip()
+    if not address:
+        return "地址信息缺失"
+
+    if _ALREADY_SPLIT.match(address):
+        return address
+
+    phone_match = _MOBILE.search(address)
+
+    if phone_match:
+        phone = phone_match.group()
+        parts = address.split(phone)
+        if len(parts) >= 2:
+            name = parts[0].strip(' -')
+            addr = phone.join(parts[1:]).strip(' -')
+            return f"{name}-{phone}-{addr}"
+
+    return address
@@ -0,0 +1,117 @@
+"""PC 微信自动化发送（不依赖 Qt）：uiautomation 优先，热键方式兜底，按台账断点续发。
+具体的窗口 / 键鼠操作由 driver 模块中的驱动完成，传入 SimulatedWeChat 即可在任何平台上跑完整发送流程"""
+
+import time
+import random
+import platform
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from py_wechat_sender.driver import DesktopDriver, UIAutomationDriver, WeChatDriver
+from py_wechat_sender.render import Payload, as_chunks
+from py_wechat_sender.ledger import LedgerCursor, SendLedger
+from py_wechat_sender.pipeline import plan_entries
+
+
+class WeChatAutomation:
+    """PC 微信自动化发送：先用 UI 自动化进入群聊逐段发送，失败时改用热键方式；进度通过 progress 回调输出"""
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None, driver: Optional[WeChatDriver] = None):
+        self.progress: Callable[[str], None] = progress or (lambda msg: None)
+        # None 时用 Windows 上的 UI 自动化 + 热键两种驱动
+        self.driver = driver
+        self._stop = threading.Event()
+        self.wechat_path: Optional[str] = None
+        self._cursor: Optional[LedgerCursor] = None
+        # 本次各群已送达的段数（含台账中此前已发送而跳过的）
+        self._delivered: Counter = Counter()
+
+    def stop(self):
+        self._stop.set()
+
+    def _sleep(self, seconds: float) -> bool:
+        end = time.time() + seconds
+        while time.time() < end:
+            if self._stop.is_set():
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _drivers(self) -> List[WeChatDriver]:
+        """依次尝试的驱动：指定了就只用它；否则先 UI 自动化，失败时热键方式接着发"""
+        if self.driver is not None:
+            return [self.driver]
+        return [UIAutomationDriver(self.progress, self.wechat_path),
+                DesktopDriver(self.progress, self.wechat_path, launch=True)]
+
+    def _send_to_group(self, group: str, text: Payload, interval_min: float, interval_max: float):
+        """进入群聊后逐段发送；当前驱动进不了群时换下一个驱动"""
+        self.progress(f"正在搜索群聊: {group}")
+        # 共用同一个段落迭代器：前一个驱动中途失败时后一个接着发剩下的段落
+        chunks = iter(as_chunks(text))
+        drivers = self._drivers()
+        for n, driver in enumerate(drivers):
+            try:
+                if not driver.open_chat(group):
+                    raise RuntimeError(f"无法找到或进入群聊: {group}")
+                self.progress(f"成功进入群聊: {group}")
+                self._send_chunks(driver, group, chunks, interval_min, interval_max)
+                return
+            except Exception as e:
+                if n == len(drivers) - 1:
+                    raise
+                self.progress(f"{driver.label}方式失败: {e}")
+                self.progress(f"尝试使用{drivers[n + 1].label}方式...")
+
+    def _send_chunks(self, driver: WeChatDriver, group: str, chunks: Iterator[str],
+                     interval_min: float, interval_max: float):
+        for idx, chunk in enumerate(chunks, start=1):
+            if self._stop.is_set():
+                return
+            if self._cursor and not self._cursor.should_send(group, chunk):
+                self.progress(f"⏭️ {group} 第 {idx} 段此前已发送，跳过")
+                self._delivered[group] += 1
+                continue
+            if idx > 1:
+                d = random.uniform(interval_min, interval_max)
+                if not self._sleep(d):
+                    return
+
+            if driver.send_text(chunk):
+                if self._cursor:
+                    self._cursor.done(group, chunk)
+                self._delivered[group] += 1
+                self.progress(f"✅ 已发送 {group} 第 {idx} 段")
+            else:
+                self.progress(f"⚠️ {group} 第 {idx} 段发送可能失败")
+
+    def send(self, items: List[Tuple[str, Payload]], interval_min: float, interval_max: float,
+             run_id: Optional[str] = None) -> Dict[str, int]:
+        """依次发送 [(群名, 内容)]；单个群失败只记进度并继续下一个群，平台不支持等整体错误直接抛出。
+        返回 {群名: 未送达的段数}，只含有未送达段落的群（中途停止时剩下的也算），全部送达时为空"""
+        if (self.driver is None or self.driver.requires_windows) and platform.system().lower() != "windows":
+            raise RuntimeError("仅支持 Windows 平台")
+        # 内容先整体展开：台账的任务标识由完整计划求得，生成器也只能读一遍，计划和发送必须用同一份段落
+        items = [(group, list(as_chunks(text))) for group, text in items]
+        # 写入发送计划；同一计划重启时跳过台账中已完成的段落
+        plan = plan_entries(items)
+        self._cursor = LedgerCursor(SendLedger(), run_id or SendLedger.make_run_id(plan), plan)
+        self._delivered = Counter()
+        for i, (group, text) in enumerate(items):
+            if self._stop.is_set():
+                break
+            group = str(group).strip()
+            if not group:
+                continue
+            self.progress(f"正在发送到：{group}")
+            try:
+                self._send_to_group(group, text, interval_min, interval_max)
+            except Exception as e:
+                self.progress(f"发送到 {group} 失败：{e}")
+            if i < len(items) - 1:
+                d = random.uniform(interval_min, interval_max)
+                if not self._sleep(d):
+                    break
+        planned = Counter(group for group, _ in plan)
+        return {group: n - self._delivered[group] for group, n in planned.items() if n > self._delivered[group]}
@@ -0,0 +1,218 @@
+"""命令行入口：不加载 Qt，读表 → 判重筛选 → 编号 → 渲染，输出文本或 JSON，可选直接发送到微信群
+
+    python -m py_wechat_sender.cli 订单.xlsx
+    python -m py_wechat_sender.cli 订单.xlsx --map 收货地址=地址 --lunch-start 21 --format json -o out.json
+    python -m py_wechat_sender.cli 订单.xlsx --lunch-group 午餐群 --dinner-group 晚餐群 --send
+    python -m py_wechat_sender.cli 订单.xlsx --send-to 测试群 --send --driver sim --sim-latency 0.05
+
+映射默认套用该表头格式保存过的方案（与界面一致），--map 逐项覆盖。各阶段耗时写入 JSON 的 timings，
+--timing 时在文本模式下打印到 stderr，便于在 Linux 上用计划任务运行和做基准测试。
+--driver sim 用进程内模拟的微信跑完整的发送流程（含台账），结束时把模拟结果打印到 stderr。
+与界面共用当天的已发送记录：读表时排除今天已发送过的订单；--send 全部送达后登记本次发出的订单
+（模拟驱动和 --send-to 的发送不登记）。
+退出码：0 成功，1 出错，2 参数错误，3 已发送但有段落未送达（重跑时按台账只补发未送达的段落）。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from py_wechat_sender.dedupe import SeenOrders, order_hashes
+from py_wechat_sender.driver import DRIVER_ENV, DRIVERS, SimulatedWeChat, get_driver
+from py_wechat_sender.orders import REQUIRED_COLUMNS
+from py_wechat_sender.loader import ensure_columns, infer_default_mapping, load_dataframe, normalize_columns
+from py_wechat_sender.profiles import MappingProfiles
+from py_wechat_sender.sharding import load_shard_rules, shard_rules_path
+from py_wechat_sender.pipeline import (
+    MEAL_TITLES, filter_orders, meal_texts, number_orders, plan_entries, render_orders, send_items,
+)
+
+
+class StageTimer:
+    """记录各阶段耗时（秒）"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = round(time.perf_counter() - t0, 6)
+
+
+def parse_mapping(pairs: Sequence[str], columns: Sequence[str]) -> Dict[str, str]:
+    """--map 目标=列名，目标须为 REQUIRED_COLUMNS 之一，列名须在表中"""
+    mapping: Dict[str, str] = {}
+    for pair in pairs:
+        target, sep, col = pair.partition("=")
+        target, col = target.strip(), col.strip()
+        if not sep or target not in REQUIRED_COLUMNS:
+            raise ValueError(f"映射格式应为 目标=列名，目标可选: {', '.join(REQUIRED_COLUMNS)}（收到 {pair!r}）")
+        if col not in columns:
+            raise ValueError(f"表中没有列: {col}")
+        mapping[target] = col
+    return mapping
+
+
+def run(path: str, overrides: Sequence[str] = (), starts: Optional[Dict[str, int]] = None,
+        shard: bool = False, save_profile: bool = False) -> Dict:
+    """跑一遍流水线，返回可直接序列化的结果（outputs 为 [(餐别, 区域群, 消息段)]）"""
+    timer = StageTimer()
+    profiles = MappingProfiles()
+    with timer("load"):
+        df, _ = load_dataframe(path, profiles.projection)
+        df = normalize_columns(df)
+    mp = infer_default_mapping(df, profiles)
+    mp.update(parse_mapping(overrides, df.attrs.get("source_columns", list(df.columns))))
+    # --map 指到了按方案投影时没加载的列：完整重新加载
+    df = ensure_columns(df, path, list(mp.values()))
+    rules = tuple(load_shard_rules()) if shard else ()
+    if shard and not rules:
+        raise RuntimeError(f"未配置分群规则：请编辑 {shard_rules_path()}，填写规则并把 enabled 设为 true")
+    starts = {cat: (starts or {}).get(cat, 1) for cat, _ in MEAL_TITLES}
+
+    with timer("filter"):
+        filtered = filter_orders(df, mp, SeenOrders().snapshot())
+    with timer("number"):
+        numbered = number_orders(df, filtered, starts, mp, rules)
+    with timer("render"):
+        outputs = render_orders(numbered, MEAL_TITLES, mp)
+    if save_profile:
+        profiles.save(df.attrs.get("source_columns", list(df.columns)), mp)
+
+    counts = {cat: int(sum(len(part) for _, part in numbered["shards"][cat])) for cat, _ in MEAL_TITLES}
+    return {
+        "file": os.path.abspath(path),
+        "rows": len(df),
+        "mapping": mp,
+        "starts": numbered["starts"],
+        "counts": counts,
+        "duplicate_report": filtered["duplicate_report"],
+        "validation_report": numbered["validation_report"],
+        "outputs": outputs,
+        "timings": timer.timings,
+        # 发送成功后登记到当天的已发送记录
+        "order_hashes": order_hashes(numbered["frames"].values(), filtered["key_cols"]),
+    }
+
+
+def to_json(result: Dict) -> Dict:
+    data = {k: v for k, v in result.items() if k not in ("outputs", "order_hashes")}
+    data["sections"] = [{"meal": cat, "group": group, "chunks": chunks} for cat, group, chunks in result["outputs"]]
+    return data
+
+
+def to_text(result: Dict) -> str:
+    text = "\n\n".join(t for t in meal_texts(result["outputs"]) if t.strip())
+    for report in (result["validation_report"], result["duplicate_report"]):
+        if report:
+            text = report + "\n\n" + text
+    return text
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="py_wechat_sender", description="订单整理（无界面）")
+    parser.add_argument("file", help="订单表（xlsx / xls / xlsb / ods / csv）")
+    parser.add_argument("--map", action="append", default=[], metavar="目标=列名",
+                        help=f"列映射，可多次指定；目标: {' / '.join(REQUIRED_COLUMNS)}")
+    parser.add_argument("--lunch-start", type=int, default=1, help="午餐起始编号")
+    parser.add_argument("--dinner-start", type=int, default=1, help="晚餐起始编号")
+    parser.add_argument("--shard", action="store_true", help="按区域分群规则拆分")
+    parser.add_argument("--format", choices=("text", "json"), default="text")
+    parser.add_argument("-o", "--output", help="写入文件，默认输出到 stdout")
+    parser.add_argument("--timing", action="store_true", help="文本模式下把各阶段耗时打印到 stderr")
+    parser.add_argument("--save-profile", action="store_true", help="把本次映射保存为该表头格式的方案")
+    send = parser.add_argument_group("发送（仅 Windows，需已登录 PC 微信）")
+    send.add_argument("--send", action="store_true", help="渲染后直接发送")
+    send.add_argument("--lunch-group", default="", help="午餐群名")
+    send.add_argument("--dinner-group", default="", help="晚餐群名")
+    send.add_argument("--send-to", help="与 --send 一起使用：全部内容发到这个群（如测试群）")
+    send.add_argument("--interval-min", type=float, default=1.0)
+    send.add_argument("--interval-max", type=float, default=2.0)
+    send.add_argument("--fresh", action="store_true", help="忽略台账，全部重新发送")
+    send.add_argument("--driver", choices=sorted(DRIVERS), help=f"微信驱动，默认取环境变量 {DRIVER_ENV}，都没有时用 Windows 自动化")
+    send.add_argument("--sim-latency", type=float, default=0.0, help="--driver sim 时每步耗时（秒）")
+    send.add_argument("--sim-failure", type=float, default=0.0, help="--driver sim 时每步失败概率")
+    return parser
+
+
+def send_result(result: Dict, args: argparse.Namespace) -> int:
+    from py_wechat_sender.automation import WeChatAutomation
+    from py_wechat_sender.ledger import SendLedger
+
+    items = send_items(result["outputs"], {"午餐": args.lunch_group, "晚餐": args.dinner_group}, args.send_to)
+    if not items:
+        print("没有可发送的内容（未设置群名或没有订单）", file=sys.stderr)
+        return 1
+    plan = plan_entries(items)
+    run_id = SendLedger.make_run_id(plan)
+    if args.fresh:
+        run_id = SendLedger.fresh_run_id(run_id)
+    progress = lambda msg: print(msg, file=sys.stderr)  # noqa: E731
+    if args.driver == "sim":
+        driver = SimulatedWeChat(strict_chats=False, latency=args.sim_latency, failure=args.sim_failure,
+                                 progress=progress)
+    else:
+        driver = get_driver(args.driver, progress)
+    sender = WeChatAutomation(progress=progress, driver=driver)
+    t0 = time.perf_counter()
+    try:
+        unsent = sender.send(items, args.interval_min, args.interval_max, run_id)
+    except RuntimeError as e:
+        print(f"发送失败: {e}", file=sys.stderr)
+        return 1
+    if isinstance(driver, SimulatedWeChat):
+        stats = dict(driver.stats(), wall=round(time.perf_counter() - t0, 3))
+        print(json.dumps(stats, ensure_ascii=False), file=sys.stderr)
+    if unsent:
+        # 计划任务据退出码判断：有段落没发出去即失败，重跑时按台账只补发这些段落
+        detail = "，".join(f"{group} {n} 段" for group, n in unsent.items())
+        print(f"发送未完成：{detail}（共 {sum(unsent.values())}/{len(plan)} 段未发出）", file=sys.stderr)
+        return 3
+    if result["order_hashes"] and not args.send_to and not isinstance(driver, SimulatedWeChat):
+        # 与界面一致：发到测试群或模拟发送不算已发送；登记后再次运行时这些订单按重复排除
+        source = f"{os.path.basename(result['file'])}（{datetime.now().strftime('%H:%M')}）"
+        SeenOrders().register(result["order_hashes"], source)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.interval_max < args.interval_min:
+        print("最大发送间隔不能小于最小发送间隔", file=sys.stderr)
+        return 2
+    try:
+        result = run(args.file, args.map, {"午餐": args.lunch_start, "晚餐": args.dinner_start},
+                     args.shard, args.save_profile)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+    if args.format == "json":
+        out = json.dumps(to_json(result), ensure_ascii=False, indent=2)
+    else:
+        out = to_text(result)
+        if args.timing:
+            for stage, seconds in result["timings"].items():
+                print(f"{stage:<8} {seconds:8.3f}s", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if args.send:
+        return send_result(result, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
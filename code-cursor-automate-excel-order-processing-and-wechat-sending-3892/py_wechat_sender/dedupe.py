@@ -0,0 +1,122 @@
+"""重复订单检测：按稳定键对每行订单求哈希，识别同一次加载内的重复及当天已发送过的订单
+
+加载时只读取当天的已发送记录；订单哈希在发送成功后才登记（键列取发送时实际使用的映射），
+重启程序或改了映射后重新加载同一文件，未发送的订单不会被当成重复排除。
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.orders import state_path
+
+
+# 订单号和下单时间的表头（去空白后整名匹配）。这些列同一订单在各次导出间不变，一并参与哈希；
+# 更新时间、支付时间、商家/骑手 ID 等会随导出变化的列不在其中，否则同一订单会被当成新订单
+ORDER_KEY_HEADERS = frozenset((
+    "订单号", "订单编号", "订单ID", "订单id", "订单Id", "外部订单号", "平台订单号",
+    "下单时间", "订单创建时间", "创建时间",
+))
+
+
+def is_order_key_header(name) -> bool:
+    return str(name).strip() in ORDER_KEY_HEADERS
+
+
+def order_key_columns(df: pd.DataFrame, address_col: str, product_col: str,
+                      note_col: Optional[str] = None) -> List[str]:
+    """参与哈希的列：地址、商品、备注，以及表中存在的订单号/下单时间列"""
+    cols = [c for c in (address_col, product_col, note_col) if c and c in df.columns]
+    cols += [c for c in df.columns if c not in cols and is_order_key_header(c)]
+    return cols
+
+
+def row_hashes(df: pd.DataFrame, key_cols: List[str]) -> pd.Series:
+    """每行一个 64 位哈希；值先转字符串并去首尾空白，保证不同导出间稳定"""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype="uint64")
+    norm = pd.DataFrame({c: df[c].fillna("").astype(str).str.strip() for c in key_cols}, index=df.index)
+    return pd.util.hash_pandas_object(norm, index=False)
+
+
+def order_hashes(frames: Iterable[pd.DataFrame], key_cols: List[str]) -> List[int]:
+    """几份订单（如各餐别本次发出的订单）合在一起的去重哈希，用于发送成功后登记"""
+    hashes: Dict[int, None] = {}
+    for frame in frames:
+        if not frame.empty:
+            hashes.update(dict.fromkeys(int(h) for h in row_hashes(frame, key_cols)))
+    return list(hashes)
+
+
+class SeenOrders:
+    """当天已发送过的订单哈希，持久化到本地，判重为 O(1) 的 dict 查找"""
+
+    def __init__(self, day: Optional[str] = None, path: Optional[str] = None):
+        self.day = day or datetime.now().strftime("%Y%m%d")
+        # 旧版在加载时登记的 seen_orders_*.json 含未发送的订单，不再读取
+        self.path = path or state_path(f"sent_orders_{self.day}.json")
+        self.hashes: Dict[int, str] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.hashes = {int(h): src for h, src in raw.get("hashes", {}).items()}
+        except Exception:
+            self.hashes = {}
+
+    def __contains__(self, h: int) -> bool:
+        return int(h) in self.hashes
+
+    def snapshot(self) -> Dict[int, str]:
+        return dict(self.hashes)
+
+    def register(self, hashes: Iterable[int], source: str):
+        for h in hashes:
+            self.hashes.setdefault(int(h), source)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"day": self.day, "hashes": {str(h): s for h, s in self.hashes.items()}}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def find_duplicates(df: pd.DataFrame, key_cols: List[str],
+                    earlier: Optional[Dict[int, str]] = None) -> Tuple[pd.Series, List[str]]:
+    """返回 (重复行掩码, 说明列表)。
+
+    同一次加载内后出现的重复行、以及当天已发送过的行（earlier）都记为重复。
+    df 需保留原表的 RangeIndex，说明中的行号为原表数据行号。
+    """
+    earlier = earlier or {}
+    hashes = row_hashes(df, key_cols)
+    within = hashes.duplicated(keep="first")
+    seen_before = hashes.isin(earlier.keys()) if earlier else pd.Series(False, index=df.index)
+    dup = within | seen_before
+
+    notes: List[str] = []
+    if dup.any():
+        pos = pd.Series(df.index + 1, index=df.index)
+        first_pos = pos.groupby(hashes.values).transform("first")
+        for idx in df.index[dup]:
+            h = int(hashes[idx])
+            if h in earlier:
+                notes.append(f"第{pos[idx]}行：今日已在 {earlier[h]} 中发送过")
+            else:
+                notes.append(f"第{pos[idx]}行：与第{first_pos[idx]}行重复")
+    return dup, notes
+
+
+def format_duplicate_report(notes: List[str], limit: int = 20) -> str:
+    if not notes:
+        return ""
+    lines = [f"⚠️ 检测到重复订单 {len(notes)} 条（已排除，不会发送）："]
+    lines.extend(f"  {n}" for n in notes[:limit])
+    if len(notes) > limit:
+        lines.append(f"  …… 另有 {len(notes) - limit} 条")
+    return "\n".join(lines)
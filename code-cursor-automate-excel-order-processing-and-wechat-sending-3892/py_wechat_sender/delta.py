@@ -0,0 +1,106 @@
+"""增量发送：与上次已发送的快照比较，只发新增订单、编号接续，并列出已发送后被取消/退款的订单"""
+
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.orders import effective_mask, state_path
+from py_wechat_sender.dedupe import row_hashes
+
+
+def entry_keys(df: pd.DataFrame, key_cols: List[str]) -> pd.Series:
+    """每条待编号记录的标识：行哈希 + 同一订单内的序号（数量 xN 展开后的第几份）"""
+    hashes = row_hashes(df, key_cols)
+    occ = hashes.groupby(hashes.values).cumcount()
+    return hashes.astype(str) + ":" + occ.astype(str)
+
+
+class MealDelta:
+    """某一餐别本次需要发送的增量"""
+
+    def __init__(self, category: str, new: pd.DataFrame, keys: List[str], start: int,
+                 retracted: List[Tuple[int, pd.Series]], retracted_keys: List[str]):
+        self.category = category
+        self.new = new                      # 新增订单，按发送顺序
+        self.keys = keys                    # 与 new 一一对应的记录标识
+        self.start = start                  # 新增订单的起始编号（接续上次）
+        self.retracted = retracted          # [(原编号, 原始行)]，已发送后被取消/退款
+        self.retracted_keys = retracted_keys
+
+    @property
+    def empty(self) -> bool:
+        return self.new.empty and not self.retracted
+
+
+class SentSnapshot:
+    """当天已发送订单的快照：{餐别: {"next": 下一个编号, "orders": {记录标识: 编号}}}"""
+
+    def __init__(self, day: Optional[str] = None, path: Optional[str] = None):
+        self.day = day or datetime.now().strftime("%Y%m%d")
+        self.path = path or state_path(f"sent_snapshot_{self.day}.json")
+        self.data: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except Exception:
+                self.data = {}
+
+    def next_number(self, category: str) -> Optional[int]:
+        cat = self.data.get(category)
+        return cat["next"] if cat else None
+
+    def compute(self, category: str, orders: pd.DataFrame, all_rows: pd.DataFrame, key_cols: List[str],
+                start: int, pay_col: str, status_col: Optional[str] = None) -> MealDelta:
+        """orders 为本次该餐别的有效订单（已排序、已按数量展开），all_rows 为整张表"""
+        cat = self.data.get(category, {"next": start, "orders": {}})
+        sent: Dict[str, int] = cat["orders"]
+
+        keys = entry_keys(orders, key_cols)
+        is_new = ~keys.isin(sent.keys())
+        new = orders[is_new.values]
+
+        # 已发送但现在状态变为取消/退款的订单（整表中存在且不再有效）
+        retracted: List[Tuple[int, pd.Series]] = []
+        retracted_keys: List[str] = []
+        if sent:
+            eff = effective_mask(all_rows, pay_col, status_col)
+            all_hashes = row_hashes(all_rows, key_cols)
+            active = set(all_hashes[eff].astype(str))
+            lookup = {}
+            for idx, h in all_hashes[~eff].astype(str).items():
+                if h not in active:
+                    lookup.setdefault(h, all_rows.loc[idx])
+            for key, number in sorted(sent.items(), key=lambda kv: kv[1]):
+                row = lookup.get(key.split(":", 1)[0])
+                if row is not None:
+                    retracted.append((number, row))
+                    retracted_keys.append(key)
+
+        return MealDelta(category, new, list(keys[is_new.values]), int(cat["next"]), retracted, retracted_keys)
+
+    def commit(self, delta: MealDelta):
+        """发送完成后记录本次发出的编号，已通知的撤回订单不再重复列出"""
+        cat = self.data.setdefault(delta.category, {"next": delta.start, "orders": {}})
+        for i, key in enumerate(delta.keys):
+            cat["orders"][key] = delta.start + i
+        for key in delta.retracted_keys:
+            cat["orders"].pop(key, None)
+        cat["next"] = max(int(cat["next"]), delta.start + len(delta.keys))
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def format_retractions(title: str, retracted: List[Tuple[int, pd.Series]],
+                       render: Callable[[pd.Series], str]) -> str:
+    if not retracted:
+        return ""
+    lines = [f"### {title}（以下订单已取消/退款，请勿配送）"]
+    for number, row in retracted:
+        lines.append(f"{number} {render(row)}")
+    return "\n".join(lines)
@@ -0,0 +1,843 @@
+"""微信操作驱动：把发送拆成 找窗口 → 激活 → 搜索进入聊天 → 定位输入框 → 粘贴 → 发送 → 读标题 几步
+
+发送器只调用这几步，不直接碰 pyautogui / pyperclip / win32gui / uiautomation：
+    UIAutomationDriver  Windows，uiautomation 控件方式（原 WeChatAutomation 的主路径）
+    DesktopDriver       Windows，win32 窗口 + pyautogui 热键 / 点击方式（原终极微信发送器的做法）
+    SimulatedWeChat     进程内模拟，任何平台可用：模拟聊天列表、焦点、每步耗时与失败率，并记录实际“发出”的内容
+选择驱动：参数 name，或环境变量 PY_WECHAT_DRIVER（uia / desktop / sim）；不指定时发送器沿用原来的 Windows 方式。
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+DRIVER_ENV = "PY_WECHAT_DRIVER"
+SIM_LATENCY_ENV = "PY_WECHAT_SIM_LATENCY"
+
+STEPS = ("find_window", "activate", "search_chat", "focus_input", "paste", "send", "read_title")
+
+WECHAT_EXE_CANDIDATES = [
+    'WeChat.exe',
+    r'C:\\Program Files (x86)\\Tencent\\WeChat\\WeChat.exe',
+    r'C:\\Program Files\\Tencent\\WeChat\\WeChat.exe',
+    r'D:\\Program Files (x86)\\Tencent\\WeChat\\WeChat.exe',
+    r'D:\\Program Files\\Tencent\\WeChat\\WeChat.exe',
+    r'D:\\Program Files (x86)\\Weixin\\Weixin.exe',
+    r'C:\\Program Files (x86)\\Weixin\\Weixin.exe',
+]
+
+
+def wechat_exe_path(preferred: Optional[str] = None) -> Optional[str]:
+    """微信可执行文件：优先用户指定的路径，其次常见安装位置，最后交给系统按 PATH 查找"""
+    candidates = ([preferred] if preferred else []) + WECHAT_EXE_CANDIDATES
+    for p in candidates:
+        try:
+            if os.path.isabs(p) and os.path.exists(p):
+                return p
+            if p.lower().endswith('.exe') and not os.path.isabs(p):
+                return p
+        except Exception:
+            continue
+    return None
+
+
+class WeChatDriver:
+    """驱动接口。每一步返回是否成功（read_title 返回标题文本），出错时尽量返回 False 而不是抛异常"""
+
+    name = ""
+    label = ""
+    # 是否只能在 Windows 上运行
+    requires_windows = False
+    # read_title 能否读到当前聊天名；能读到时 open_chat 会核对是否进错了聊天
+    title_reliable = False
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None):
+        self.progress: Callable[[str], None] = progress or (lambda msg: None)
+
+    def find_window(self) -> bool:
+        raise NotImplementedError
+
+    def activate(self) -> bool:
+        raise NotImplementedError
+
+    def search_chat(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def focus_input(self) -> bool:
+        raise NotImplementedError
+
+    def paste(self, text: str) -> bool:
+        raise NotImplementedError
+
+    def send(self) -> bool:
+        raise NotImplementedError
+
+    def read_title(self) -> str:
+        raise NotImplementedError
+
+    def enter_chat(self, name: str) -> bool:
+        """窗口已激活时搜索并进入指定聊天；能读到聊天名时核对是否进对了"""
+        if not self.search_chat(name):
+            return False
+        if self.title_reliable and self.read_title() != name:
+            self.progress(f"⚠️ 进入的聊天不是 {name}")
+            return False
+        return True
+
+    def open_chat(self, name: str) -> bool:
+        """找到并激活窗口，进入指定聊天"""
+        return self.find_window() and self.activate() and self.enter_chat(name)
+
+    def send_text(self, text: str) -> bool:
+        """在当前聊天中发送一条消息"""
+        return self.focus_input() and self.paste(text) and self.send()
+
+
+class UIAutomationDriver(WeChatDriver):
+    """uiautomation 控件方式：按类名找主窗口，Ctrl+F 搜索进入聊天，取最后一个可点击的编辑框作为输入框"""
+
+    name = "uia"
+    label = "UI自动化"
+    requires_windows = True
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None, wechat_path: Optional[str] = None):
+        super().__init__(progress)
+        self.wechat_path = wechat_path
+        self.main = None
+        self.input_box = None
+
+    def find_window(self) -> bool:
+        # Try attach to WeChat window; if not, try to start
+        import uiautomation as auto
+        main = auto.WindowControl(searchDepth=1, ClassName="WeChatMainWndForPC")
+        if not main.Exists(0.5):
+            try:
+                exe = wechat_exe_path(self.wechat_path)
+                if exe:
+                    os.startfile(exe)
+            except Exception:
+                pass
+            # Wait up to 20s for window to appear
+            start = time.time()
+            while time.time() - start < 20:
+                if main.Exists(0.5):
+                    break
+                time.sleep(0.5)
+        if not main.Exists(0.5):
+            self.progress("未找到微信窗口，请先登录微信")
+            return False
+        self.main = main
+        return True
+
+    def activate(self) -> bool:
+        try:
+            self.main.SetActive()
+            time.sleep(1.0)  # 等待窗口完全激活
+            self.progress("微信窗口已激活，开始搜索群聊...")
+            return True
+        except Exception as e:
+            self.progress(f"激活微信窗口失败: {e}")
+            return False
+
+    def search_chat(self, name: str) -> bool:
+        """搜索并进入聊天 - 改进版"""
+        import uiautomation as auto
+        import pyperclip
+
+        self.input_box = None
+        try:
+            # 方法1: 尝试使用Ctrl+F打开搜索
+            for hotkey in ['{Ctrl}f', '^f']:
+                try:
+                    auto.SendKeys(hotkey)
+                    time.sleep(0.8)
+                    break
+                except Exception:
+                    continue
+
+            # 清空搜索框并输入群名
+            pyperclip.copy(name)
+            auto.SendKeys('{Ctrl}a')
+            time.sleep(0.3)
+            auto.SendKeys('{Ctrl}v')
+            time.sleep(0.8)
+
+            # 按Enter进入聊天
+            auto.SendKeys('{Enter}')
+            time.sleep(1.5)
+
+            # 验证是否成功进入聊天
+            return self._verify_chat_window(name)
+
+        except Exception as e:
+            self.progress(f"搜索聊天失败: {e}")
+            return False
+
+    def _verify_chat_window(self, expected_name: str) -> bool:
+        """验证是否成功进入目标聊天窗口"""
+        try:
+            # 等待界面稳定
+            time.sleep(1.0)
+
+            # 查找聊天标题或相关文本控件
+            for text_ctrl in self.main.TextControls():
+                try:
+                    text = text_ctrl.Name
+                    if expected_name in text or text in expected_name:
+                        return True
+                except Exception:
+                    continue
+
+            # 如果找不到标题，检查是否有输入框（说明进入了某个聊天）
+            return len(self.main.EditControls()) > 0
+
+        except Exception:
+            return False
+
+    def focus_input(self) -> bool:
+        """点击消息输入框；进入聊天后第一次调用时查找（通常是最后一个编辑控件），之后复用"""
+        try:
+            if self.input_box is not None:
+                self.input_box.Click()
+                time.sleep(0.3)
+                return True
+            edits = self.main.EditControls()
+            for edit in reversed(edits):
+                try:
+                    edit.Click()
+                    time.sleep(0.2)
+                    self.input_box = edit
+                    return True
+                except Exception:
+                    continue
+            self.progress("无法找到消息输入框")
+            return False
+        except Exception:
+            return False
+
+    def paste(self, text: str) -> bool:
+        import pyperclip
+
+        try:
+            # 清空输入框
+            self.input_box.SendKeys('{Ctrl}a')
+            time.sleep(0.2)
+            # 复制消息到剪贴板并粘贴
+            pyperclip.copy(text)
+            time.sleep(0.1)
+            self.input_box.SendKeys('{Ctrl}v')
+            time.sleep(0.5)
+            return True
+        except Exception as e:
+            self.progress(f"发送消息出错: {e}")
+            return False
+
+    def send(self) -> bool:
+        try:
+            self.input_box.SendKeys('{Enter}')
+            time.sleep(0.3)
+            return True
+        except Exception as e:
+            self.progress(f"发送消息出错: {e}")
+            return False
+
+    def read_title(self) -> str:
+        """主窗口标题（通常就是“微信”，不是当前聊天名）"""
+        try:
+            return self.main.Name if self.main is not None else ""
+        except Exception:
+            return ""
+
+
+class DesktopDriver(WeChatDriver):
+    """win32 + pyautogui 方式：枚举窗口按特征打分找微信，热键搜索进入聊天，按控件 / 窗口位置估算输入框后点击粘贴"""
+
+    name = "desktop"
+    label = "热键"
+    requires_windows = True
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None, wechat_path: Optional[str] = None,
+                 launch: bool = False):
+        super().__init__(progress)
+        self.wechat_path = wechat_path
+        # 找不到窗口时是否尝试启动微信
+        self.launch = launch
+        self.hwnd = None
+
+    # ---- 窗口 ----
+
+    def _enum_wechat_window(self):
+        """查找微信窗口 - 改进版"""
+        import win32gui
+
+        def enum_windows_callback(hwnd, windows):
+            try:
+                if not win32gui.IsWindowVisible(hwnd):
+                    return True
+
+                window_text = win32gui.GetWindowText(hwnd)
+                class_name = win32gui.GetClassName(hwnd)
+
+                # 更准确的微信窗口识别
+                wechat_indicators = [
+                    ("WeChatMainWndForPC" in class_name, "主窗口类名"),
+                    ("微信" in window_text and len(window_text) < 10, "窗口标题"),
+                    ("WeChat" in window_text and "PC" not in window_text, "英文标题"),
+                    (class_name.startswith("Qt") and "微信" in window_text, "Qt框架窗口"),
+                    (class_name == "Chrome_WidgetWin_1" and "微信" in window_text, "Chrome内核窗口")
+                ]
+
+                # 计算匹配度
+                match_score = 0
+                match_reasons = []
+                for condition, reason in wechat_indicators:
+                    if condition:
+                        match_score += 1
+                        match_reasons.append(reason)
+
+                if match_score > 0:
+                    # 排除一些明显不是主窗口的
+                    if any(keyword in window_text.lower() for keyword in ['update', 'installer', 'setup']):
+                        return True
+
+                    windows.append((hwnd, window_text, class_name, match_score, match_reasons))
+
+            except Exception:
+                pass  # 忽略获取窗口信息时的异常
+
+            return True
+
+        windows = []
+        win32gui.EnumWindows(enum_windows_callback, windows)
+
+        if not windows:
+            self.progress("❌ 未找到任何微信窗口")
+            return None
+
+        # 按匹配度排序，选择最佳匹配
+        windows.sort(key=lambda x: x[3], reverse=True)
+
+        for hwnd, title, class_name, score, reasons in windows:
+            try:
+                # 验证窗口是否真的可用
+                if win32gui.IsWindow(hwnd) and win32gui.IsWindowEnabled(hwnd):
+                    self.progress(f"✅ 找到微信窗口: {title}")
+                    self.progress(f"   类名: {class_name}")
+                    self.progress(f"   匹配度: {score} ({', '.join(reasons)})")
+                    return hwnd
+            except Exception:
+                continue
+
+        self.progress("❌ 找到微信窗口但都不可用")
+        return None
+
+    def find_window(self) -> bool:
+        try:
+            self.hwnd = self._enum_wechat_window()
+        except ImportError:
+            self.progress("❌ 需要安装 pywin32 包")
+            return False
+        if not self.hwnd and self.launch:
+            # Last resort: try to start WeChat
+            try:
+                exe = wechat_exe_path(self.wechat_path)
+                if exe:
+                    os.startfile(exe)
+                time.sleep(2)
+                self.hwnd = self._enum_wechat_window()
+            except Exception:
+                pass
+        return bool(self.hwnd)
+
+    def activate(self) -> bool:
+        """激活微信窗口 - 改进版"""
+        import win32gui
+        import win32con
+
+        try:
+            # 检查窗口是否仍然有效
+            try:
+                if not win32gui.IsWindow(self.hwnd):
+                    self.progress("⚠️ 微信窗口句柄无效，重新查找")
+                    if not self.find_window():
+                        return False
+            except Exception:
+                if not self.find_window():
+                    return False
+
+            # 多步骤激活窗口
+            try:
+                # 1. 先恢复窗口（如果被最小化）
+                win32gui.ShowWindow(self.hwnd, win32con.SW_RESTORE)
+                time.sleep(0.3)
+
+                # 2. 将窗口置顶
+                win32gui.SetWindowPos(self.hwnd, win32con.HWND_TOP, 0, 0, 0, 0,
+                                      win32con.SWP_NOMOVE | win32con.SWP_NOSIZE | win32con.SWP_SHOWWINDOW)
+                time.sleep(0.3)
+
+                # 3. 设置为前台窗口
+                win32gui.SetForegroundWindow(self.hwnd)
+                time.sleep(0.5)
+
+                # 4. 验证窗口是否真的在前台
+                if win32gui.GetForegroundWindow() != self.hwnd:
+                    self.progress("⚠️ 微信窗口可能未完全激活，但继续尝试")
+                else:
+                    self.progress("✅ 微信窗口已成功激活")
+
+            except Exception as e:
+                self.progress(f"⚠️ 窗口激活过程中出现异常: {e}")
+                # 尝试备用方法
+                try:
+                    win32gui.SetForegroundWindow(self.hwnd)
+                    time.sleep(0.5)
+                except Exception:
+                    pass
+
+            return True
+
+        except Exception as e:
+            self.progress(f"❌ 激活微信窗口失败: {str(e)}")
+            return False
+
+    def read_title(self) -> str:
+        """窗口标题（通常就是“微信”，不是当前聊天名）"""
+        try:
+            import win32gui
+            return win32gui.GetWindowText(self.hwnd) if self.hwnd else ""
+        except Exception:
+            return ""
+
+    # ---- 聊天 ----
+
+    def search_chat(self, name: str) -> bool:
+        """切换到指定群 - 改进版"""
+        import pyautogui
+        import pyperclip
+
+        try:
+            self.progress(f"🔍 搜索群聊: {name}")
+
+            # 多次尝试打开搜索框
+            for attempt in range(3):
+                try:
+                    pyautogui.hotkey('ctrl', 'f')
+                    time.sleep(0.8)
+                    break
+                except Exception as e:
+                    if attempt == 2:
+                        raise e
+                    time.sleep(0.5)
+
+            # 确保搜索框激活并清空
+            pyautogui.hotkey('ctrl', 'a')
+            time.sleep(0.3)
+            pyautogui.press('delete')
+            time.sleep(0.2)
+
+            # 输入群名 - 分步骤确保准确
+            pyperclip.copy(name)
+            time.sleep(0.2)
+            pyautogui.hotkey('ctrl', 'v')
+            time.sleep(0.8)
+
+            # 验证输入内容
+            pyautogui.hotkey('ctrl', 'a')
+            time.sleep(0.2)
+            pyautogui.hotkey('ctrl', 'c')
+            time.sleep(0.2)
+
+            # 检查剪贴板内容是否正确
+            try:
+                if pyperclip.paste() != name:
+                    self.progress("⚠️ 剪贴板内容不匹配，重新输入")
+                    pyautogui.hotkey('ctrl', 'a')
+                    time.sleep(0.2)
+                    pyperclip.copy(name)
+                    time.sleep(0.2)
+                    pyautogui.hotkey('ctrl', 'v')
+                    time.sleep(0.5)
+            except Exception:
+                pass
+
+            # 按回车进入群聊
+            pyautogui.press('enter')
+            time.sleep(2.0)  # 增加等待时间确保进入
+
+            self.progress(f"✅ 成功切换到群: {name}")
+            return True
+
+        except Exception as e:
+            self.progress(f"❌ 切换到群 {name} 失败: {str(e)}")
+            return False
+
+    # ---- 输入框 ----
+
+    def find_input_box_position(self):
+        """查找微信输入框的实际位置"""
+        try:
+            # 方法1: 尝试使用控件识别（如果可用）
+            position = self.find_input_by_control()
+            if position:
+                return position
+
+            # 方法2: 基于窗口位置的智能估算
+            return self.find_input_by_window_calc()
+
+        except Exception as e:
+            self.progress(f"⚠️ 查找输入框位置失败: {e}")
+            return None
+
+    def find_input_by_control(self):
+        """通过控件识别查找输入框"""
+        try:
+            # 尝试导入uiautomation
+            try:
+                import uiautomation as auto
+            except ImportError:
+                return None
+
+            if not self.hwnd:
+                return None
+
+            # 通过句柄创建窗口控件
+            main_window = auto.WindowControl(handle=self.hwnd)
+            if not main_window.Exists():
+                return None
+
+            # 查找编辑控件（输入框）
+            edit_controls = main_window.EditControls()
+            if not edit_controls:
+                return None
+
+            # 通常最后一个编辑控件是消息输入框
+            for edit_ctrl in reversed(edit_controls):
+                try:
+                    rect = edit_ctrl.BoundingRectangle
+                    if rect.width() > 100 and rect.height() > 20:  # 输入框应该有一定大小
+                        center_x = rect.left + rect.width() // 2
+                        center_y = rect.top + rect.height() // 2
+                        self.progress(f"🎯 通过控件找到输入框: ({center_x}, {center_y})")
+                        return (center_x, center_y)
+                except Exception:
+                    continue
+
+            return None
+
+        except Exception as e:
+            self.progress(f"⚠️ 控件识别输入框失败: {e}")
+            return None
+
+    def find_input_by_window_calc(self):
+        """通过窗口计算查找输入框位置"""
+        try:
+            import pyautogui
+            import win32gui
+
+            if not self.hwnd:
+                return None
+
+            # 获取微信窗口的位置和大小
+            left, top, right, bottom = win32gui.GetWindowRect(self.hwnd)
+            window_width = right - left
+            window_height = bottom - top
+
+            self.progress(f"🔍 微信窗口位置: ({left}, {top}) 大小: {window_width}x{window_height}")
+
+            # 根据窗口大小动态调整输入框位置
+            if window_height < 400:  # 小窗口
+                input_offset = 30
+            elif window_height < 600:  # 中等窗口
+                input_offset = 50
+            else:  # 大窗口
+                input_offset = 70
+
+            # 输入框位置计算
+            input_x = left + window_width // 2
+            input_y = bottom - input_offset
+
+            # 验证位置是否合理
+            screen_width, screen_height = pyautogui.size()
+            if (0 <= input_x <= screen_width and
+                    0 <= input_y <= screen_height and
+                    input_y > top + 100):  # 确保不在窗口标题栏
+
+                self.progress(f"🎯 计算得出输入框位置: ({input_x}, {input_y})")
+                return (input_x, input_y)
+
+            return None
+
+        except Exception as e:
+            self.progress(f"⚠️ 窗口计算输入框位置失败: {e}")
+            return None
+
+    def smart_click_input_area(self) -> bool:
+        """智能点击输入区域"""
+        try:
+            import pyautogui
+            import win32gui
+
+            if not self.hwnd:
+                return False
+
+            # 获取微信窗口信息
+            left, top, right, bottom = win32gui.GetWindowRect(self.hwnd)
+
+            # 在窗口底部区域尝试多个点击位置
+            click_positions = [
+                (left + (right - left) // 2, bottom - 60),  # 窗口中下部
+                (left + (right - left) // 2, bottom - 80),  # 稍微往上一点
+                (left + (right - left) // 2, bottom - 40),  # 更靠近底部
+                (left + (right - left) * 3 // 4, bottom - 60),  # 右侧区域
+                (left + (right - left) // 4, bottom - 60),   # 左侧区域
+            ]
+
+            for i, (x, y) in enumerate(click_positions):
+                try:
+                    # 确保点击位置在屏幕范围内
+                    screen_width, screen_height = pyautogui.size()
+                    if 0 <= x <= screen_width and 0 <= y <= screen_height:
+                        pyautogui.click(x, y)
+                        time.sleep(0.3)
+
+                        # 测试是否点击成功（尝试输入测试字符）
+                        pyautogui.typewrite("t")
+                        time.sleep(0.2)
+
+                        # 如果能删除测试字符，说明点击成功
+                        pyautogui.press('backspace')
+                        time.sleep(0.2)
+
+                        self.progress(f"✅ 智能点击成功: 位置 {i+1} ({x}, {y})")
+                        return True
+
+                except Exception:
+                    continue
+
+            return False
+
+        except Exception as e:
+            self.progress(f"⚠️ 智能点击失败: {e}")
+            return False
+
+    def focus_input(self) -> bool:
+        import pyautogui
+
+        try:
+            input_position = self.find_input_box_position()
+            if input_position:
+                x, y = input_position
+                self.progress(f"🎯 找到输入框位置: ({x}, {y})")
+                pyautogui.click(x, y)
+                time.sleep(0.4)
+            elif not self.smart_click_input_area():
+                self.progress("⚠️ 智能点击也失败，使用默认位置")
+                screen_width, screen_height = pyautogui.size()
+                pyautogui.click(screen_width // 2, int(screen_height * 0.85))
+                time.sleep(0.4)
+            return True
+        except Exception as e:
+            self.progress(f"❌ 定位输入框失败: {str(e)}")
+            return False
+
+    def paste(self, text: str) -> bool:
+        import pyautogui
+        import pyperclip
+
+        try:
+            # 复制内容到剪贴板并验证
+            pyperclip.copy(text)
+            time.sleep(0.3)
+            try:
+                if pyperclip.paste() != text:
+                    self.progress("⚠️ 剪贴板验证失败，重新复制")
+                    pyperclip.copy(text)
+                    time.sleep(0.3)
+            except Exception:
+                pass
+
+            # 清空输入框 - 多次尝试确保清空
+            for attempt in range(2):
+                try:
+                    pyautogui.hotkey('ctrl', 'a')
+                    time.sleep(0.2)
+                    pyautogui.press('delete')
+                    time.sleep(0.2)
+                    break
+                except Exception:
+                    time.sleep(0.3)
+
+            # 粘贴内容
+            pyautogui.hotkey('ctrl', 'v')
+            time.sleep(0.5)
+
+            # 验证粘贴是否成功（全选复制回来看看）
+            try:
+                pyautogui.hotkey('ctrl', 'a')
+                time.sleep(0.2)
+                pyautogui.hotkey('ctrl', 'c')
+                time.sleep(0.2)
+                if text not in pyperclip.paste():
+                    self.progress("⚠️ 粘贴验证失败，但继续发送")
+            except Exception:
+                pass
+            return True
+
+        except Exception as e:
+            self.progress(f"❌ 粘贴失败: {str(e)}")
+            return False
+
+    def send(self) -> bool:
+        import pyautogui
+
+        try:
+            pyautogui.press('enter')
+            time.sleep(0.3)
+            return True
+        except Exception as e:
+            self.progress(f"❌ 发送失败: {str(e)}")
+            return False
+
+
+class SimulatedWeChat(WeChatDriver):
+    """进程内模拟的微信，用于在 Linux 上测试和压测发送流程。
+
+    chats       已有的聊天（群 / 联系人）名；strict_chats=False 时搜索任何名字都能进入
+    latency     每步耗时（秒），一个数或 {步骤: 秒}；sleep=False 时只累计到 elapsed 不真的等待
+    failure     每步失败概率，一个数或 {步骤: 概率}；失败的步骤返回 False，状态不变
+    running     微信是否“已启动”；False 时 find_window 失败
+    发出的消息按顺序记在 sent [(聊天, 内容)]，各聊天的记录在 chats[名字]，每步调用次数和失败次数在 calls / failures。
+    """
+
+    name = "sim"
+    label = "模拟"
+    title_reliable = True
+
+    def __init__(self, chats=(), latency: Union[float, Dict[str, float]] = 0.0,
+                 failure: Union[float, Dict[str, float]] = 0.0, seed: Optional[int] = None,
+                 running: bool = True, strict_chats: bool = True, sleep: bool = True,
+                 progress: Optional[Callable[[str], None]] = None):
+        super().__init__(progress)
+        self.chats: Dict[str, List[str]] = {str(c): [] for c in chats}
+        self.latency = self._per_step(latency)
+        self.failure = self._per_step(failure)
+        self.running = running
+        self.strict_chats = strict_chats
+        self.sleep = sleep
+        self.sent: List[Tuple[str, str]] = []
+        self.calls: Dict[str, int] = {step: 0 for step in STEPS}
+        self.failures: Dict[str, int] = {step: 0 for step in STEPS}
+        self.elapsed = 0.0
+        self.window_found = False
+        self.active = False
+        self.current: Optional[str] = None
+        self.input_focused = False
+        self.draft = ""
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _per_step(value: Union[float, Dict[str, float]]) -> Dict[str, float]:
+        if isinstance(value, dict):
+            unknown = set(value) - set(STEPS)
+            if unknown:
+                raise ValueError(f"未知的步骤: {', '.join(sorted(unknown))}（可选: {', '.join(STEPS)}）")
+            return {step: float(value.get(step, 0.0)) for step in STEPS}
+        return {step: float(value) for step in STEPS}
+
+    def _step(self, step: str) -> bool:
+        """记一次调用、模拟耗时，按失败率决定这一步是否成功"""
+        with self._lock:
+            self.calls[step] += 1
+            delay = self.latency[step]
+            self.elapsed += delay
+            failed = self.failure[step] > 0 and self._rng.random() < self.failure[step]
+            if failed:
+                self.failures[step] += 1
+        if delay and self.sleep:
+            time.sleep(delay)
+        return not failed
+
+    def find_window(self) -> bool:
+        self.window_found = self._step("find_window") and self.running
+        if not self.window_found:
+            self.active = False
+        return self.window_found
+
+    def activate(self) -> bool:
+        if not self._step("activate") or not self.window_found:
+            return False
+        self.active = True
+        return True
+
+    def search_chat(self, name: str) -> bool:
+        if not self._step("search_chat") or not self.active:
+            return False
+        if name not in self.chats:
+            if self.strict_chats:
+                self.progress(f"模拟微信：没有找到 {name}")
+                return False
+            self.chats[name] = []
+        # 切换聊天后输入框失去焦点，未发出的草稿不带过去
+        self.current = name
+        self.input_focused = False
+        self.draft = ""
+        return True
+
+    def focus_input(self) -> bool:
+        if not self._step("focus_input") or not self.active or self.current is None:
+            return False
+        self.input_focused = True
+        return True
+
+    def paste(self, text: str) -> bool:
+        if not self._step("paste") or not self.input_focused:
+            return False
+        self.draft = text  # 粘贴前先全选，替换输入框原有内容
+        return True
+
+    def send(self) -> bool:
+        if not self._step("send") or not self.input_focused or not self.draft:
+            return False
+        with self._lock:
+            self.chats[self.current].append(self.draft)
+            self.sent.append((self.current, self.draft))
+        self.draft = ""
+        return True
+
+    def read_title(self) -> str:
+        self._step("read_title")
+        return self.current or ""
+
+    def lose_focus(self):
+        """模拟用户切走窗口：微信不再是前台，输入框失去焦点"""
+        self.active = False
+        self.input_focused = False
+
+    def stats(self) -> Dict[str, object]:
+        return {"sent": len(self.sent), "elapsed": round(self.elapsed, 3),
+                "calls": dict(self.calls), "failures": {k: v for k, v in self.failures.items() if v}}
+
+
+DRIVERS = {
+    "uia": UIAutomationDriver,
+    "desktop": DesktopDriver,
+    "sim": SimulatedWeChat,
+}
+
+
+def get_driver(name: Optional[str] = None, progress: Optional[Callable[[str], None]] = None) -> Optional[WeChatDriver]:
+    """按名字或环境变量 PY_WECHAT_DRIVER 创建驱动；都未指定时返回 None（发送器用原来的 Windows 方式）。
+    环境变量选 sim 时可进入任意聊天，每步耗时取 PY_WECHAT_SIM_LATENCY（秒，默认 0）"""
+    name = (name or os.environ.get(DRIVER_ENV) or "").strip().lower()
+    if not name:
+        return None
+    if name not in DRIVERS:
+        raise ValueError(f"未知的微信驱动: {name}（可选: {', '.join(DRIVERS)}）")
+    if name == "sim":
+        return SimulatedWeChat(strict_chats=False, latency=float(os.environ.get(SIM_LATENCY_ENV) or 0),
+                               progress=progress)
+    return DRIVERS[name](progress)
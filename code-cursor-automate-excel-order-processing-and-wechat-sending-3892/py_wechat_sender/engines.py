@@ -0,0 +1,206 @@
+"""可插拔的数据引擎：筛选 → 分类 → 排序 这一段可在 pandas、Polars 或 pyarrow compute 上运行
+
+pandas 为默认引擎（即 orders.filter_and_classify）。Polars / pyarrow 引擎把参与计算的几列
+转成 Arrow 字符串，在多线程的原生实现中完成去空白、状态筛选和商品/数量正则提取，
+得到命中的行位置后再从原表取行，所以各引擎返回的 DataFrame（以及渲染出的文本）完全一致。
+选择引擎：参数 engine，或环境变量 PY_WECHAT_ENGINE（pandas / polars / pyarrow）。
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from py_wechat_sender.orders import (
+    DEFAULT_MEAL_RULES, EXCLUDED_ORDER_STATUS, bucket_entries, compile_rules, filter_and_classify,
+    keyword_alternation, prepare_orders, product_entries,
+)
+
+try:
+    import polars as pl
+    HAS_POLARS = True
+except ImportError:
+    HAS_POLARS = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+ENGINE_ENV = "PY_WECHAT_ENGINE"
+DEFAULT_ENGINE = "pandas"
+
+# RE2（pyarrow）的 \d、\s 只认 ASCII，换成 Unicode 类别，与 Python re 的匹配保持一致
+_RE2_QTY_PATTERN = r"(?:.*?[xX×*][\s\p{Z}\x{85}\x{1c}-\x{1f}]*(?P<qty>\p{Nd}+))?"
+
+
+class PandasEngine:
+    name = "pandas"
+
+    def filter_and_classify(self, df: pd.DataFrame, product_col: str, pay_col: str,
+                            status_col: Optional[str] = None,
+                            rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES) -> Dict[str, pd.DataFrame]:
+        return filter_and_classify(df, product_col, pay_col, status_col, rules)
+
+
+class _ArrowEngine:
+    """Arrow 字符串引擎的公共部分：子类只需实现 _parse，返回 (有效掩码, 去空白后的商品信息,
+    命中的第一个商品关键字, 数量, 是否含多个商品关键字)。多商品行交给 orders.product_entries
+    逐个解析（RE2 / Rust 正则不支持向前否定断言，无法在原生实现里限定数量的查找范围）"""
+
+    name = ""
+
+    def _parse(self, product: np.ndarray, pay: np.ndarray, status: Optional[np.ndarray],
+               rules: Sequence[Tuple[str, str, str]]
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def filter_and_classify(self, df: pd.DataFrame, product_col: str, pay_col: str,
+                            status_col: Optional[str] = None,
+                            rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES) -> Dict[str, pd.DataFrame]:
+        df = prepare_orders(df, product_col, pay_col, status_col)
+        has_status = bool(status_col) and status_col in df.columns
+        texts = [df[c].astype(str).to_numpy(dtype=object) for c in (product_col, pay_col)]
+        status = df[status_col].astype(str).to_numpy(dtype=object) if has_status else None
+        eff, text, product, qty, multi = self._parse(texts[0], texts[1], status, rules)
+
+        pos, category, qty = product_entries(text, product, qty, eff & multi, rules)
+        keep = eff[pos]
+        pos, category, qty = pos[keep], category[keep], qty[keep]
+        order = np.argsort(-df["__row__"].to_numpy()[pos], kind="stable")
+        return bucket_entries(df, pos[order], category[order], qty[order], rules)
+
+
+class PolarsEngine(_ArrowEngine):
+    name = "polars"
+
+    def _parse(self, product, pay, status, rules):
+        pattern, _ = compile_rules(rules)
+        frame = pl.DataFrame({
+            "product": pl.Series(product, dtype=pl.Utf8).str.strip_chars(),
+            "pay": pl.Series(pay, dtype=pl.Utf8).str.strip_chars(),
+        })
+        eff = pl.col("pay") == "已支付"
+        if status is not None:
+            frame = frame.with_columns(status=pl.Series(status, dtype=pl.Utf8).str.strip_chars())
+            eff = eff & ~pl.col("status").is_in(list(EXCLUDED_ORDER_STATUS))
+        out = frame.select(
+            eff=eff,
+            product=pl.col("product").str.extract(pattern.pattern, 1),
+            qty=pl.col("product").str.extract(pattern.pattern, 2)
+                .cast(pl.Int64, strict=False).fill_null(1).clip(lower_bound=1),
+            multi=pl.col("product").str.count_matches(keyword_alternation(rules)) > 1,
+        )
+        return (out["eff"].to_numpy(), frame["product"].to_numpy(), out["product"].to_numpy(),
+                out["qty"].to_numpy(), out["multi"].to_numpy())
+
+
+class PyArrowEngine(_ArrowEngine):
+    name = "pyarrow"
+
+    def _parse(self, product, pay, status, rules):
+        pattern, _ = compile_rules(rules, _RE2_QTY_PATTERN)
+        text = pc.utf8_trim_whitespace(pa.array(product, type=pa.string()))
+        eff = pc.equal(pc.utf8_trim_whitespace(pa.array(pay, type=pa.string())), "已支付")
+        if status is not None:
+            st = pc.utf8_trim_whitespace(pa.array(status, type=pa.string()))
+            eff = pc.and_(eff, pc.invert(pc.is_in(st, value_set=pa.array(EXCLUDED_ORDER_STATUS))))
+        parsed = pc.extract_regex(text, pattern.pattern)
+        hit = pc.struct_field(parsed, [0])
+        # RE2 中未参与匹配的可选分组为空串；非 ASCII 数字与 pandas 一样按 1 份处理
+        raw = pc.struct_field(parsed, [1])
+        digits = pc.match_substring_regex(raw, r"^[0-9]+$")
+        qty = pc.cast(pc.if_else(digits, raw, pa.scalar(None, pa.string())), pa.int64())
+        qty = pc.max_element_wise(pc.fill_null(qty, 1), 1)
+        multi = pc.greater(pc.count_substring_regex(text, keyword_alternation(rules)), 1)
+        return (
+            eff.to_numpy(zero_copy_only=False),
+            text.to_numpy(zero_copy_only=False),
+            hit.to_numpy(zero_copy_only=False),
+            qty.to_numpy(zero_copy_only=False),
+            multi.to_numpy(zero_copy_only=False),
+        )
+
+
+ENGINES = {
+    "pandas": PandasEngine,
+    "polars": PolarsEngine,
+    "pyarrow": PyArrowEngine,
+}
+
+
+def available_engines() -> List[str]:
+    names = ["pandas"]
+    if HAS_POLARS:
+        names.append("polars")
+    if HAS_PYARROW:
+        names.append("pyarrow")
+    return names
+
+
+def get_engine(name: Optional[str] = None):
+    """按名称取引擎；未指定时读环境变量，环境变量指定的引擎未安装则回退到 pandas"""
+    explicit = name is not None
+    name = (name or os.environ.get(ENGINE_ENV) or DEFAULT_ENGINE).strip().lower()
+    if name not in ENGINES:
+        raise ValueError(f"未知的数据引擎: {name}（可选: {', '.join(ENGINES)}）")
+    if name not in available_engines():
+        if explicit:
+            raise RuntimeError(f"数据引擎 {name} 未安装")
+        name = DEFAULT_ENGINE
+    return ENGINES[name]()
+
+
+def edge_case_orders() -> pd.DataFrame:
+    """等价性检查用的边界样例：空值、空白、各种数量写法、全角数字、非字符串值、一行多个商品"""
+    return pd.DataFrame({
+        "商品信息": ["明日午餐", " 明日晚餐 x2 ", "明日午餐×3 加蛋", "明日午餐 X 0", "明日晚餐*２",
+                   "明日晚餐 x　2", None, 12, "饮料", "明日午餐明日晚餐x4", "明日午餐 加饭x2",
+                   "明日午餐 x1;明日晚餐 x1", "明日午餐+明日晚餐 x2", "明日晚餐×2 明日午餐"],
+        "支付状态": ["已支付", "已支付 ", "已支付", "已支付", "已支付",
+                   "已支付", "已支付", "已支付", "已支付", "已支付", None,
+                   "已支付", "已支付", "已支付"],
+        "订单状态": ["已完成", None, "待配送", "已完成", "已完成",
+                   " 已取消", "已完成", "已完成", "已完成", "用户申请退款 ", "已完成",
+                   "已完成", "已完成", "已完成"],
+        "收货地址": ["张三13800000000幸福小区1号", "李四-13900000000-2号楼", None, "", "王五 13700000000",
+                   "赵六13600000000", "钱七", "孙八13500000000", "周九", "吴十13400000000", "郑一",
+                   "王二13300000000", "冯三13200000000", "陈四13100000000"],
+        "用户备注": ["", None, "多放辣", "", "", "", "", "", "", "", "", "", "", ""],
+    })
+
+
+def check_equivalence(df: Optional[pd.DataFrame] = None, rows: int = 20000,
+                      rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES) -> Dict[str, bool]:
+    """在已安装的各引擎上跑同一条流水线，与 pandas 比较分组结果和渲染出的文本"""
+    from py_wechat_sender.parallel import make_sample_orders
+    from py_wechat_sender.render import build_output
+
+    mapping = {"商品信息": "商品信息", "支付状态": "支付状态", "订单状态": "订单状态",
+               "收货地址": "收货地址", "用户备注": "用户备注"}
+    cases = [df] if df is not None else [edge_case_orders(), make_sample_orders(rows)]
+
+    def run(engine, data):
+        groups = engine.filter_and_classify(data, "商品信息", "支付状态", "订单状态", rules)
+        texts = [build_output(g.fillna({"收货地址": "", "用户备注": ""}), mapping, 1, cat, cat)
+                 for cat, g in groups.items()]
+        return groups, texts
+
+    result: Dict[str, bool] = {}
+    for name in available_engines():
+        same = True
+        for data in cases:
+            ref_groups, ref_texts = run(PandasEngine(), data)
+            groups, texts = run(get_engine(name), data)
+            same &= texts == ref_texts and all(groups[k].equals(ref_groups[k]) for k in ref_groups)
+        result[name] = same
+    return result
+
+
+if __name__ == "__main__":
+    for engine_name, ok in check_equivalence().items():
+        print(f"{engine_name:<8} {'一致' if ok else '不一致'}")
@@ -0,0 +1,123 @@
+"""导出表格：把分类、编号后的午餐/晚餐订单写成 xlsx 或 csv，供厨房和骑手使用
+
+按行流式写出（openpyxl 只写模式 / csv.writer），整表不在内存中另建副本，大表导出内存占用基本恒定。
+xlsx 每个餐别一张工作表；csv 为一张表，用“餐别”列区分。
+"""
+
+import csv
+import os
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.address import contact_fields
+
+try:
+    from openpyxl import Workbook
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+
+EXPORT_HEADER = ["餐别", "编号", "姓名", "电话", "地址", "备注", "配送群"]
+EXPORT_FORMATS = (".xlsx", ".csv")
+
+# (餐别, 区域群或 None, 该群订单, 起始编号)
+Section = Tuple[str, Optional[str], pd.DataFrame, int]
+
+
+def iter_export_rows(sections: Iterable[Section], addr_col: str,
+                     note_col: Optional[str] = None) -> Iterator[Tuple]:
+    """逐行产出导出内容，顺序和编号与发送的消息一致；每段的地址一次向量化拆分"""
+    for meal, group, frame, start in sections:
+        if frame.empty:
+            continue
+        fields = contact_fields(frame[addr_col])
+        fields = fields.astype(object).where(fields.notna(), "")
+        notes = (frame[note_col].fillna("").astype(str).str.strip().tolist()
+                 if note_col and note_col in frame.columns else [""] * len(frame))
+        rows = zip(fields["name"].tolist(), fields["phone"].tolist(), fields["area"].tolist(), notes)
+        for i, (name, phone, area, note) in enumerate(rows):
+            yield meal, int(start) + i, name, phone, area, note, group or ""
+
+
+def write_csv(path: str, rows: Iterable[Sequence], header: Sequence[str] = EXPORT_HEADER) -> int:
+    """写 csv（UTF-8 带 BOM，Excel 直接打开不乱码），返回写入行数"""
+    count = 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def write_xlsx(path: str, rows: Iterable[Sequence], header: Sequence[str] = EXPORT_HEADER) -> int:
+    """只写模式写 xlsx，每个餐别（第一列）一张工作表，返回写入行数"""
+    if not HAS_OPENPYXL:
+        raise RuntimeError("导出 xlsx 需要安装 openpyxl（pip install openpyxl），或改为导出 csv")
+    wb = Workbook(write_only=True)
+    sheets = {}
+    count = 0
+    for row in rows:
+        meal = row[0]
+        ws = sheets.get(meal)
+        if ws is None:
+            ws = sheets[meal] = wb.create_sheet(str(meal)[:31] or "订单")
+            ws.append(list(header))
+        ws.append(list(row))
+        count += 1
+    if not sheets:
+        wb.create_sheet("订单").append(list(header))
+    tmp = path + ".tmp"
+    wb.save(tmp)
+    os.replace(tmp, path)
+    return count
+
+
+def export_orders(path: str, sections: Iterable[Section], addr_col: str,
+                  note_col: Optional[str] = None) -> int:
+    """按扩展名导出为 xlsx 或 csv，返回导出的订单数"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {ext or '（无扩展名）'}（可选: {' / '.join(EXPORT_FORMATS)}）")
+    rows = iter_export_rows(sections, addr_col, note_col)
+    return write_xlsx(path, rows) if ext == ".xlsx" else write_csv(path, rows)
+
+
+def default_export_name(source: Optional[str] = None, ext: str = ".xlsx") -> str:
+    """默认导出文件名：<源文件名>_订单清单.xlsx"""
+    stem = os.path.splitext(os.path.basename(source))[0] if source else "订单"
+    return f"{stem}_订单清单{ext}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from py_wechat_sender.parallel import parallel_filter_and_classify
+    from py_wechat_sender.profiles import infer_mapping
+
+    parser = argparse.ArgumentParser(description="把订单表导出为按餐别编号的清单")
+    parser.add_argument("input", help="订单表（xlsx / csv）")
+    parser.add_argument("output", nargs="?", help="导出路径（.xlsx / .csv），默认与订单表同目录")
+    parser.add_argument("--lunch-start", type=int, default=1)
+    parser.add_argument("--dinner-start", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.input.lower().endswith((".csv", ".txt")):
+        data = pd.read_csv(args.input, dtype=str)
+    else:
+        data = pd.read_excel(args.input, dtype=str)
+    mp = infer_mapping(data.columns)
+    missing = [t for t in ("商品信息", "支付状态", "收货地址") if mp.get(t) is None]
+    if missing:
+        raise SystemExit(f"缺少必要列: {', '.join(missing)}")
+    groups = parallel_filter_and_classify(data, mp["商品信息"], mp["支付状态"], mp.get("订单状态"))
+    starts = {"午餐": args.lunch_start, "晚餐": args.dinner_start}
+    out = args.output or os.path.join(os.path.dirname(os.path.abspath(args.input)), default_export_name(args.input))
+    n = export_orders(out, [(cat, None, g, starts.get(cat, 1)) for cat, g in groups.items()],
+                      mp["收货地址"], mp.get("用户备注"))
+    print(f"已导出 {n} 条 → {out}")
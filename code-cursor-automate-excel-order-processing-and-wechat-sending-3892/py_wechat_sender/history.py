@@ -0,0 +1,169 @@
+"""历史订单库：每次处理的有效订单批量写入本地 SQLite，按日期 / 手机号 / 商品建索引，跨天查询不必再打开旧表格"""
+
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.orders import state_path
+from py_wechat_sender.address import contact_fields
+from py_wechat_sender.delta import entry_keys
+
+
+# 每批写入的行数
+INSERT_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id        INTEGER PRIMARY KEY,
+    day       TEXT NOT NULL,      -- 处理日期 YYYY-MM-DD
+    meal      TEXT NOT NULL,      -- 餐别
+    entry     TEXT NOT NULL,      -- 行哈希:份数序号，同一天重复处理不会重复入库
+    name      TEXT,
+    phone     TEXT,
+    address   TEXT,               -- 原始收货地址
+    area      TEXT,               -- 去掉姓名电话后的地址部分
+    product   TEXT,
+    note      TEXT,
+    source    TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_orders_entry ON orders(day, meal, entry);
+CREATE INDEX IF NOT EXISTS ix_orders_day ON orders(day, meal);
+CREATE INDEX IF NOT EXISTS ix_orders_phone ON orders(phone, day);
+CREATE INDEX IF NOT EXISTS ix_orders_product ON orders(product, day);
+"""
+
+_COLUMNS = ("day", "meal", "entry", "name", "phone", "address", "area", "product", "note", "source")
+
+
+def _day(value) -> str:
+    if value is None:
+        return date.today().isoformat()
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+class OrderHistory:
+    """历史订单库（单文件 SQLite，WAL 模式）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or state_path("order_history.sqlite3")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---- 写入 ----
+
+    def rows_from_frame(self, df: pd.DataFrame, meal: str, key_cols: List[str], addr_col: str,
+                        product_col: str, note_col: Optional[str] = None, day=None,
+                        source: str = "") -> List[Tuple]:
+        """把一餐别的有效订单（已按数量展开）转成待写入的行，姓名/手机号/区域一次向量化解析"""
+        if df.empty:
+            return []
+        raw = df[addr_col].fillna("").astype(str).str.strip()
+        fields = contact_fields(raw)
+        note = df[note_col].fillna("").astype(str).str.strip() if note_col and note_col in df.columns else ""
+        frame = pd.DataFrame({
+            "day": _day(day),
+            "meal": meal,
+            "entry": entry_keys(df, key_cols).to_numpy(),
+            "name": fields["name"].to_numpy(),
+            "phone": fields["phone"].to_numpy(),
+            "address": raw.to_numpy(),
+            "area": fields["area"].to_numpy(),
+            "product": df[product_col].fillna("").astype(str).str.strip().to_numpy(),
+            "note": note if isinstance(note, str) else note.to_numpy(),
+            "source": source,
+        }, columns=list(_COLUMNS))
+        frame = frame.astype(object).where(frame.notna(), None)
+        return list(frame.itertuples(index=False, name=None))
+
+    def insert_rows(self, rows: Iterable[Tuple]) -> int:
+        """分批 executemany，整个批次一个事务；已存在的记录忽略。返回新增条数"""
+        sql = f"INSERT OR IGNORE INTO orders ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        rows = list(rows)
+        before = self.conn.total_changes
+        with self.conn:
+            for i in range(0, len(rows), INSERT_BATCH):
+                self.conn.executemany(sql, rows[i:i + INSERT_BATCH])
+        return self.conn.total_changes - before
+
+    def record_groups(self, groups: Dict[str, pd.DataFrame], key_cols: List[str], addr_col: str,
+                      product_col: str, note_col: Optional[str] = None, day=None, source: str = "") -> int:
+        """一次处理得到的各餐别有效订单整批入库"""
+        rows: List[Tuple] = []
+        for meal, df in groups.items():
+            rows.extend(self.rows_from_frame(df, meal, key_cols, addr_col, product_col, note_col, day, source))
+        return self.insert_rows(rows)
+
+    # ---- 查询 ----
+
+    def _query(self, sql: str, params: Sequence = ()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.conn, params=list(params))
+
+    def customer_orders(self, phone: str, start=None, end=None) -> pd.DataFrame:
+        """某个手机号在日期区间内的订单"""
+        sql = "SELECT day, meal, name, address, product, note FROM orders WHERE phone = ?"
+        params: List = [re.sub(r"\D", "", str(phone))]
+        if start is not None:
+            sql += " AND day >= ?"
+            params.append(_day(start))
+        if end is not None:
+            sql += " AND day <= ?"
+            params.append(_day(end))
+        return self._query(sql + " ORDER BY day, meal", params)
+
+    def ordered_on(self, phone: str, day=None) -> bool:
+        """某个手机号当天（默认今天）是否下过单"""
+        cur = self.conn.execute("SELECT 1 FROM orders WHERE phone = ? AND day = ? LIMIT 1",
+                                (re.sub(r"\D", "", str(phone)), _day(day)))
+        return cur.fetchone() is not None
+
+    def range_orders(self, start, end, meal: Optional[str] = None) -> pd.DataFrame:
+        sql = "SELECT day, meal, name, phone, address, area, product, note FROM orders WHERE day BETWEEN ? AND ?"
+        params: List = [_day(start), _day(end)]
+        if meal:
+            sql += " AND meal = ?"
+            params.append(meal)
+        return self._query(sql + " ORDER BY day, meal, id", params)
+
+    def count_by_day(self, start, end, meal: Optional[str] = None, area_like: Optional[str] = None) -> pd.DataFrame:
+        """日期区间内每天的份数，可按餐别、地址关键字（如楼栋）过滤"""
+        sql = "SELECT day, meal, COUNT(*) AS count FROM orders WHERE day BETWEEN ? AND ?"
+        params: List = [_day(start), _day(end)]
+        if meal:
+            sql += " AND meal = ?"
+            params.append(meal)
+        if area_like:
+            sql += " AND area LIKE ?"
+            params.append(f"%{area_like}%")
+        return self._query(sql + " GROUP BY day, meal ORDER BY day, meal", params)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="历史订单查询")
+    parser.add_argument("--phone", help="查询某个手机号的订单")
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD，默认今天")
+    parser.add_argument("--meal", help="餐别，如 午餐 / 晚餐")
+    parser.add_argument("--area", help="地址关键字，如 3号楼")
+    parser.add_argument("--db", help="数据库路径，默认 ~/.py_wechat_sender/order_history.sqlite3")
+    args = parser.parse_args()
+
+    history = OrderHistory(args.db)
+    end_day = args.end or date.today().isoformat()
+    if args.phone:
+        print(history.customer_orders(args.phone, args.start, end_day).to_string(index=False))
+    else:
+        start_day = args.start or end_day[:8] + "01"
+        print(history.count_by_day(start_day, end_day, args.meal, args.area).to_string(index=False))
+    history.close()
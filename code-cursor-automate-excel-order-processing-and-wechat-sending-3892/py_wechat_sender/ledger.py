@@ -0,0 +1,143 @@
+"""发送台账（预写日志）：发送前写入计划，每条发出后写入完成，崩溃或中途停止后可从断点继续
+
+只依赖标准库，订单发送器（py_wechat_sender/ledger.py）与餐数统计发送器（send_ledger.py）用的是同一份文件，
+两边分开部署各带一份，修改时两处保持一致。台账所在目录由调用方通过 state_path 传入。
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# 未传入 state_path 时台账放在订单发送器的状态目录
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".py_wechat_sender")
+
+
+def default_state_path(name: str) -> str:
+    os.makedirs(DEFAULT_STATE_DIR, exist_ok=True)
+    return os.path.join(DEFAULT_STATE_DIR, name)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_keys(entries: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """[(目标, 内容)] -> [(目标, 内容哈希)]；同一目标重复的相同内容加序号区分"""
+    seen: Dict[Tuple[str, str], int] = {}
+    keys = []
+    for target, text in entries:
+        h = content_hash(text)
+        n = seen.get((target, h), 0)
+        seen[(target, h)] = n + 1
+        keys.append((target, h if n == 0 else f"{h}#{n}"))
+    return keys
+
+
+class SendLedger:
+    """按天一个 JSONL 文件，记录 (run_id, 目标, 内容哈希) 的 plan/done。
+
+    每次写入都 flush + fsync，done 记录在消息发出之后立即落盘；
+    run_id 由计划内容决定，同样的发送任务重启后得到同一个 run_id。
+    state_path 把文件名映射到各工具自己的状态目录，指定 path 时不使用。
+    """
+
+    def __init__(self, path: Optional[str] = None, state_path: Callable[[str], str] = default_state_path):
+        self.path = path or state_path(f"send_ledger_{datetime.now().strftime('%Y%m%d')}.jsonl")
+        self._done: Dict[str, Set[Tuple[str, str]]] = {}
+        self._planned: Dict[str, List[Tuple[str, str]]] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时可能留下半行
+                key = (rec["target"], rec["hash"])
+                if rec["op"] == "plan":
+                    self._planned.setdefault(rec["run"], []).append(key)
+                elif rec["op"] == "done":
+                    self._done.setdefault(rec["run"], set()).add(key)
+
+    def _append(self, records: List[dict]):
+        if not records:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def make_run_id(entries: Iterable[Tuple[str, str]]) -> str:
+        h = hashlib.sha1()
+        for target, chash in plan_keys(entries):
+            h.update(f"{target}\x1f{chash}\x1e".encode("utf-8"))
+        return h.hexdigest()[:12]
+
+    @staticmethod
+    def fresh_run_id(run_id: str) -> str:
+        """用户选择重新发送时，基于原 run_id 派生一个新的"""
+        return f"{run_id}-{int(time.time())}"
+
+    def plan(self, run_id: str, entries: List[Tuple[str, str]]):
+        """写入计划（已计划过的同一 run 不重复写）"""
+        keys = plan_keys(entries)
+        if run_id in self._planned:
+            return
+        self._planned[run_id] = keys
+        ts = time.time()
+        self._append([{"op": "plan", "run": run_id, "target": t, "hash": h, "ts": ts} for t, h in keys])
+
+    def done_count(self, run_id: str) -> int:
+        return len(self._done.get(run_id, ()))
+
+    def is_done(self, run_id: str, target: str, chash: str) -> bool:
+        return (target, chash) in self._done.get(run_id, ())
+
+    def mark_done(self, run_id: str, target: str, chash: str):
+        self._done.setdefault(run_id, set()).add((target, chash))
+        self._append([{"op": "done", "run": run_id, "target": target, "hash": chash, "ts": time.time()}])
+
+
+class LedgerCursor:
+    """按计划顺序逐条消费，跳过已完成项；发送代码只需调用 should_send / done"""
+
+    def __init__(self, ledger: SendLedger, run_id: str, entries: List[Tuple[str, str]]):
+        self.ledger = ledger
+        self.run_id = run_id
+        self._keys: Dict[Tuple[str, str], List[str]] = {}
+        for (target, text), (_, chash) in zip(entries, plan_keys(entries)):
+            self._keys.setdefault((target, text), []).append(chash)
+        self._used: Dict[Tuple[str, str], int] = {}
+        ledger.plan(run_id, entries)
+
+    def _key(self, target: str, text: str) -> Optional[str]:
+        hashes = self._keys.get((target, text))
+        if not hashes:
+            return None
+        i = self._used.get((target, text), 0)
+        return hashes[min(i, len(hashes) - 1)]
+
+    def should_send(self, target: str, text: str) -> bool:
+        chash = self._key(target, text)
+        if chash is None:
+            return True
+        if self.ledger.is_done(self.run_id, target, chash):
+            self._used[(target, text)] = self._used.get((target, text), 0) + 1
+            return False
+        return True
+
+    def done(self, target: str, text: str):
+        chash = self._key(target, text)
+        if chash is None:
+            return
+        self._used[(target, text)] = self._used.get((target, text), 0) + 1
+        self.ledger.mark_done(self.run_id, target, chash)
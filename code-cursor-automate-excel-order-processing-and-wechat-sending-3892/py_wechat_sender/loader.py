@@ -0,0 +1,202 @@
+"""订单表读取：xlsx / xls / xlsb / ods / csv，自动识别表头行，可按映射方案只保留用到的列（不依赖 Qt）"""
+
+import os
+import time
+import platform
+import tempfile
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.orders import REQUIRED_COLUMNS
+from py_wechat_sender.profiles import MappingProfiles, infer_mapping
+
+
+def detect_csv_encoding(file_path: str) -> str:
+    try:
+        import chardet  # type: ignore
+    except Exception:
+        return "utf-8"
+    with open(file_path, "rb") as f:
+        raw = f.read(4096)
+    result = chardet.detect(raw)
+    return result.get("encoding") or "utf-8"
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    def _to_str(col) -> str:
+        if isinstance(col, tuple):
+            return " ".join([str(x).strip() for x in col])
+        return str(col).strip()
+    df.columns = [_to_str(c) for c in df.columns]
+    return df
+
+
+# 列投影：拿到完整表头后返回需要保留的列名，返回 None 表示全部保留
+ColumnSelector = Callable[[List[str]], Optional[List[str]]]
+
+
+def rows_to_frame(rows: List[list], select: Optional[ColumnSelector] = None) -> pd.DataFrame:
+    # header guess
+    header_idx = 0
+    best = -1
+    for i in range(min(10, len(rows))):
+        cnt = sum(1 for v in rows[i] if v not in (None, ""))
+        if cnt > best:
+            best = cnt
+            header_idx = i
+    headers = [str(h).strip() if h is not None else f"列{i+1}" for i, h in enumerate(rows[header_idx] if rows else [])]
+    data_rows = rows[header_idx+1:]
+    width = len(headers)
+    keep = select(headers) if select else None
+    if keep is not None:
+        keep = set(keep)
+        idx = [i for i, h in enumerate(headers) if h in keep]
+        norm = [[(r[i] if i < len(r) else None) for i in idx] for r in data_rows]
+        df = pd.DataFrame(norm, columns=[headers[i] for i in idx])
+    else:
+        norm = []
+        for r in data_rows:
+            r = list(r)
+            if len(r) < width:
+                r += [None]*(width-len(r))
+            elif len(r) > width:
+                r = r[:width]
+            norm.append(r)
+        df = pd.DataFrame(norm, columns=headers)
+    df.attrs["source_columns"] = headers
+    return df
+
+
+def project_columns(df: pd.DataFrame, select: Optional[ColumnSelector] = None) -> pd.DataFrame:
+    headers = [str(c).strip() for c in df.columns]
+    keep = select(headers) if select else None
+    if keep is not None:
+        keep = set(keep)
+        df = df.loc[:, [c for c, h in zip(df.columns, headers) if h in keep]]
+    df.attrs["source_columns"] = headers
+    return df
+
+
+def load_dataframe(file_path: str, select: Optional[ColumnSelector] = None) -> Tuple[pd.DataFrame, List[str]]:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in [".xlsx", ".xlsm", ".xltx", ".xltm"]:
+        try:
+            from openpyxl import load_workbook
+            wb = load_workbook(filename=file_path, read_only=True, data_only=True)
+            sheets = wb.sheetnames
+            ws = wb[sheets[0]]
+            rows = [list(r) for r in ws.iter_rows(values_only=True)]
+            return rows_to_frame(rows, select), sheets
+        except Exception:
+            # Attempt repair by re-saving via Excel COM (Windows only)
+            if platform.system().lower() == "windows":
+                fixed = convert_via_excel_com(file_path)
+                if fixed and os.path.exists(fixed):
+                    return load_dataframe(fixed, select)
+            raise
+    if ext == ".xls":
+        # Try pyexcel-xls first
+        try:
+            from pyexcel_xls import get_data  # type: ignore
+            data = get_data(file_path)
+            sheets = list(data.keys())
+            rows = data[sheets[0]]
+            return rows_to_frame(rows, select), sheets
+        except Exception:
+            # Fallback 1: xlrd direct
+            try:
+                return read_xls_via_xlrd(file_path, select)
+            except Exception:
+                # Fallback 2: Excel COM convert to xlsx then load (Windows only)
+                if platform.system().lower() == "windows":
+                    fixed = convert_via_excel_com(file_path)
+                    if fixed and os.path.exists(fixed):
+                        return load_dataframe(fixed, select)
+                raise
+    if ext == ".xlsb":
+        xls = pd.ExcelFile(file_path, engine="pyxlsb")
+        sheets = xls.sheet_names
+        df = pd.read_excel(xls, sheet_name=sheets[0])
+        return project_columns(df, select), sheets
+    if ext == ".ods":
+        xls = pd.ExcelFile(file_path, engine="odf")
+        sheets = xls.sheet_names
+        df = pd.read_excel(xls, sheet_name=sheets[0])
+        return project_columns(df, select), sheets
+    if ext in [".csv", ".txt"]:
+        enc = detect_csv_encoding(file_path)
+        try:
+            df = pd.read_csv(file_path, encoding=enc, sep=None, engine="python")
+        except Exception:
+            df = pd.read_csv(file_path, encoding="utf-8", sep=",", engine="python", errors="ignore")
+        return project_columns(df, select), ["CSV"]
+    # last resort try parse as csv
+    enc = detect_csv_encoding(file_path)
+    df = pd.read_csv(file_path, encoding=enc, sep=None, engine="python")
+    return project_columns(df, select), ["CSV"]
+
+
+def ensure_columns(df: pd.DataFrame, file_path: str, columns: Sequence[str]) -> pd.DataFrame:
+    """按已存方案投影加载的表缺少 columns 中的列（映射改到了方案之外的列）时，重新完整加载"""
+    if all(c in df.columns for c in columns if c):
+        return df
+    full, _ = load_dataframe(file_path)
+    return normalize_columns(full)
+
+
+def read_xls_via_xlrd(file_path: str, select: Optional[ColumnSelector] = None) -> Tuple[pd.DataFrame, List[str]]:
+    import xlrd  # type: ignore
+    try:
+        book = xlrd.open_workbook(file_path, formatting_info=False, on_demand=True)
+    except Exception:
+        try:
+            # Some xlrd builds accept ignore_workbook_corruption
+            book = xlrd.open_workbook(file_path, formatting_info=False, on_demand=True, ignore_workbook_corruption=True)  # type: ignore
+        except Exception as e:
+            raise e
+    sheet_names = book.sheet_names()
+    sh = book.sheet_by_index(0)
+    rows = [sh.row_values(r) for r in range(sh.nrows)]
+    return rows_to_frame(rows, select), sheet_names
+
+
+def convert_via_excel_com(file_path: str) -> Optional[str]:
+    """Use Excel COM to resave as .xlsx to repair, Windows only.
+    Returns temp .xlsx path or None if not available.
+    """
+    if platform.system().lower() != "windows":
+        return None
+    try:
+        import win32com.client  # type: ignore
+    except Exception:
+        return None
+    try:
+        excel = win32com.client.Dispatch("Excel.Application")
+        excel.Visible = False
+        excel.DisplayAlerts = False
+        wb = excel.Workbooks.Open(os.path.abspath(file_path))
+        tmp_xlsx = os.path.join(tempfile.gettempdir(), f"repaired_{int(time.time()*1000)}.xlsx")
+        # 51: xlOpenXMLWorkbook (xlsx)
+        wb.SaveAs(tmp_xlsx, 51)
+        wb.Close(False)
+        excel.Quit()
+        return tmp_xlsx
+    except Exception:
+        try:
+            excel.Quit()
+        except Exception:
+            pass
+        return None
+
+
+def infer_default_mapping(df: pd.DataFrame, profiles: Optional[MappingProfiles] = None) -> Dict[str, str]:
+    cols = list(df.columns)
+    headers = df.attrs.get("source_columns", cols)
+    found = profiles.resolve(headers) if profiles else infer_mapping(cols)
+    mapping: Dict[str, str] = {}
+    for target in REQUIRED_COLUMNS:
+        col = found.get(target)
+        mapping[target] = col if col in cols else cols[0]
+    return mapping
@@ -1,14 +1,31 @@
 import os
 import sys
 import time
-import random
 import threading
 import platform
 import traceback
-import tempfile
+from datetime import datetime
 from typing import List, Optional, Tuple, Dict
 
 import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from py_wechat_sender.render import Payload  # noqa: E402
+from py_wechat_sender.dedupe import SeenOrders, order_hashes  # noqa: E402
+from py_wechat_sender.profiles import MappingProfiles  # noqa: E402
+from py_wechat_sender.delta import SentSnapshot  # noqa: E402
+from py_wechat_sender.ledger import SendLedger  # noqa: E402
+from py_wechat_sender.stages import StageCache, file_fingerprint  # noqa: E402
+from py_wechat_sender.sharding import load_shard_rules, shard_rules_path  # noqa: E402
+from py_wechat_sender.history import OrderHistory  # noqa: E402
+from py_wechat_sender.export import default_export_name, export_orders  # noqa: E402
+from py_wechat_sender.loader import ensure_columns, infer_default_mapping, load_dataframe, normalize_columns  # noqa: E402
+from py_wechat_sender.pipeline import (  # noqa: E402
+    MEAL_TITLES, export_sections, filter_orders, meal_texts, number_orders, plan_entries, render_orders, send_items,
+)
+from py_wechat_sender.automation import WeChatAutomation  # noqa: E402
+from py_wechat_sender.driver import get_driver  # noqa: E402
+
 try:
     from PyQt5 import QtCore, QtGui, QtWidgets
     HAS_PYQT5 = True
@@ -24,275 +41,6 @@ except ImportError:
     HAS_PYQT5 = False
 
 
-REQUIRED_COLUMNS = ["商品信息", "支付状态", "订单状态", "收货地址", "用户备注"]
-
-
-def detect_csv_encoding(file_path: str) -> str:
-    try:
-        import chardet  # type: ignore
-    except Exception:
-        return "utf-8"
-    with open(file_path, "rb") as f:
-        raw = f.read(4096)
-    result = chardet.detect(raw)
-    return result.get("encoding") or "utf-8"
-
-
-def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    def _to_str(col) -> str:
-        if isinstance(col, tuple):
-            return " ".join([str(x).strip() for x in col])
-        return str(col).strip()
-    df.columns = [_to_str(c) for c in df.columns]
-    return df
-
-
-def load_dataframe(file_path: str) -> Tuple[pd.DataFrame, List[str]]:
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in [".xlsx", ".xlsm", ".xltx", ".xltm"]:
-        try:
-            from openpyxl import load_workbook
-            wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-            sheets = wb.sheetnames
-            ws = wb[sheets[0]]
-            rows = [list(r) for r in ws.iter_rows(values_only=True)]
-            # header guess
-            header_idx = 0
-            best = -1
-            for i in range(min(10, len(rows))):
-                cnt = sum(1 for v in rows[i] if v not in (None, ""))
-                if cnt > best:
-                    best = cnt
-                    header_idx = i
-            headers = [str(h).strip() if h is not None else f"列{i+1}" for i, h in enumerate(rows[header_idx] if rows else [])]
-            data = rows[header_idx+1:]
-            width = len(headers)
-            norm = []
-            for r in data:
-                r = list(r)
-                if len(r) < width:
-                    r += [None]*(width-len(r))
-                elif len(r) > width:
-                    r = r[:width]
-                norm.append(r)
-            return pd.DataFrame(norm, columns=headers), sheets
-        except Exception:
-            # Attempt repair by re-saving via Excel COM (Windows only)
-            if platform.system().lower() == "windows":
-                fixed = convert_via_excel_com(file_path)
-                if fixed and os.path.exists(fixed):
-                    return load_dataframe(fixed)
-            raise
-    if ext == ".xls":
-        # Try pyexcel-xls first
-        try:
-            from pyexcel_xls import get_data  # type: ignore
-            data = get_data(file_path)
-            sheets = list(data.keys())
-            rows = data[sheets[0]]
-            header_idx = 0
-            best = -1
-            for i in range(min(10, len(rows))):
-                cnt = sum(1 for v in rows[i] if v not in (None, ""))
-                if cnt > best:
-                    best = cnt
-                    header_idx = i
-            headers = [str(h).strip() if h is not None else f"列{i+1}" for i, h in enumerate(rows[header_idx] if rows else [])]
-            data_rows = rows[header_idx+1:]
-            width = len(headers)
-            norm = []
-            for r in data_rows:
-                r = list(r)
-                if len(r) < width:
-                    r += [None]*(width-len(r))
-                elif len(r) > width:
-                    r = r[:width]
-                norm.append(r)
-            return pd.DataFrame(norm, columns=headers), sheets
-        except Exception:
-            # Fallback 1: xlrd direct
-            try:
-                return read_xls_via_xlrd(file_path)
-            except Exception:
-                # Fallback 2: Excel COM convert to xlsx then load (Windows only)
-                if platform.system().lower() == "windows":
-                    fixed = convert_via_excel_com(file_path)
-                    if fixed and os.path.exists(fixed):
-                        return load_dataframe(fixed)
-                raise
-    if ext == ".xlsb":
-        xls = pd.ExcelFile(file_path, engine="pyxlsb")
-        sheets = xls.sheet_names
-        df = pd.read_excel(xls, sheet_name=sheets[0])
-        return df, sheets
-    if ext == ".ods":
-        xls = pd.ExcelFile(file_path, engine="odf")
-        sheets = xls.sheet_names
-        df = pd.read_excel(xls, sheet_name=sheets[0])
-        return df, sheets
-    if ext in [".csv", ".txt"]:
-        enc = detect_csv_encoding(file_path)
-        try:
-            df = pd.read_csv(file_path, encoding=enc, sep=None, engine="python")
-        except Exception:
-            df = pd.read_csv(file_path, encoding="utf-8", sep=",", engine="python", errors="ignore")
-        return df, ["CSV"]
-    # last resort try parse as csv
-    enc = detect_csv_encoding(file_path)
-    df = pd.read_csv(file_path, encoding=enc, sep=None, engine="python")
-    return df, ["CSV"]
-
-
-def read_xls_via_xlrd(file_path: str) -> Tuple[pd.DataFrame, List[str]]:
-    import xlrd  # type: ignore
-    try:
-        book = xlrd.open_workbook(file_path, formatting_info=False, on_demand=True)
-    except Exception:
-        try:
-            # Some xlrd builds accept ignore_workbook_corruption
-            book = xlrd.open_workbook(file_path, formatting_info=False, on_demand=True, ignore_workbook_corruption=True)  # type: ignore
-        except Exception as e:
-            raise e
-    sheet_names = book.sheet_names()
-    sh = book.sheet_by_index(0)
-    rows = [sh.row_values(r) for r in range(sh.nrows)]
-    header_idx = 0
-    best = -1
-    for i in range(min(10, len(rows))):
-        cnt = sum(1 for v in rows[i] if v not in (None, ""))
-        if cnt > best:
-            best = cnt
-            header_idx = i
-    headers = [str(h).strip() if h is not None else f"列{i+1}" for i, h in enumerate(rows[header_idx] if rows else [])]
-    data_rows = rows[header_idx+1:]
-    width = len(headers)
-    norm = []
-    for r in data_rows:
-        r = list(r)
-        if len(r) < width:
-            r += [None]*(width-len(r))
-        elif len(r) > width:
-            r = r[:width]
-        norm.append(r)
-    return pd.DataFrame(norm, columns=headers), sheet_names
-
-
-def convert_via_excel_com(file_path: str) -> Optional[str]:
-    """Use Excel COM to resave as .xlsx to repair, Windows only.
-    Returns temp .xlsx path or None if not available.
-    """
-    if platform.system().lower() != "windows":
-        return None
-    try:
-        import win32com.client  # type: ignore
-    except Exception:
-        return None
-    try:
-        excel = win32com.client.Dispatch("Excel.Application")
-        excel.Visible = False
-        excel.DisplayAlerts = False
-        wb = excel.Workbooks.Open(os.path.abspath(file_path))
-        tmp_xlsx = os.path.join(tempfile.gettempdir(), f"repaired_{int(time.time()*1000)}.xlsx")
-        # 51: xlOpenXMLWorkbook (xlsx)
-        wb.SaveAs(tmp_xlsx, 51)
-        wb.Close(False)
-        excel.Quit()
-        return tmp_xlsx
-    except Exception:
-        try:
-            excel.Quit()
-        except Exception:
-            pass
-        return None
-
-
-def infer_default_mapping(df: pd.DataFrame) -> Dict[str, str]:
-    cols = list(df.columns)
-    mapping: Dict[str, str] = {}
-    for target in REQUIRED_COLUMNS:
-        if target in cols:
-            mapping[target] = target
-        else:
-            k = target.replace(" ", "")
-            found = None
-            for c in cols:
-                if str(c).replace(" ", "") == k:
-                    found = c
-                    break
-            mapping[target] = found or cols[0]
-    return mapping
-
-
-def split_address(text: str) -> str:
-    if not isinstance(text, str):
-        text = str(text) if pd.notna(text) else ""
-    t = text.strip()
-    if not t:
-        return " -  - "
-    parts = [p.strip() for p in re_split_hyphen(t)]
-    if len(parts) >= 3:
-        return f"{parts[0]} - {parts[1]} - {' - '.join(parts[2:])}"
-    m = find_phone_like(t)
-    if m:
-        s, e = m.span()
-        name = t[:s].strip(" -")
-        phone = t[s:e]
-        addr = t[e:].strip(" -")
-        return f"{name} - {phone} - {addr}" if (name or addr) else f" - {phone} - "
-    return f" -  - {t}"
-
-
-def re_split_hyphen(text: str) -> List[str]:
-    import re
-    return re.split(r"\s*[-\-\–\—\－]\s*", text)
-
-
-def find_phone_like(text: str):
-    import re
-    return re.search(r"(\d[\d\s-]{5,19}\d)", text)
-
-
-def filter_and_order(df: pd.DataFrame, mapping: Dict[str, str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    df = df.copy()
-    df["__row__"] = range(1, len(df) + 1)
-    for col in mapping.values():
-        if col in df.columns:
-            df[col] = df[col].fillna("")
-    paid = df[df[mapping["支付状态"]].astype(str).str.strip() == "已支付"]
-    def excluded(row):
-        st = str(row[mapping["订单状态"]]).strip()
-        pay = str(row[mapping["支付状态"]]).strip()
-        if pay == "未支付":
-            return True
-        if st in ("已取消", "用户申请退款"):
-            return True
-        if pay == "已退款":
-            return True
-        return False
-    eff = paid[~paid.apply(excluded, axis=1)].copy()
-    lunch = eff[eff[mapping["商品信息"]].astype(str).str.strip() == "明日午餐 x1"].copy()
-    dinner = eff[eff[mapping["商品信息"]].astype(str).str.strip() == "明日晚餐 x1"].copy()
-    lunch = lunch.sort_values("__row__", ascending=False)
-    dinner = dinner.sort_values("__row__", ascending=False)
-    return lunch, dinner
-
-
-def build_output(df: pd.DataFrame, mapping: Dict[str, str], start: int, title: str, product_label: str) -> str:
-    lines: List[str] = []
-    lines.append(f"### {title}（商品信息：{product_label}，编号从{start}开始）")
-    cur = start
-    for _, row in df.iterrows():
-        addr = split_address(str(row.get(mapping["收货地址"], "")))
-        note = str(row.get(mapping["用户备注"], ""))
-        lines.append(str(cur))
-        lines.append(addr)
-        if note.strip():
-            lines.append(f"（用户备注：{note}）")
-        cur += 1
-    return "\n".join(lines)
-
-
 class DropArea(QtWidgets.QFrame):
     fileDropped = QtCore.pyqtSignal(str)
     def __init__(self, parent=None):
@@ -317,422 +65,44 @@ class DropArea(QtWidgets.QFrame):
 
 
 class WeChatSender(QtCore.QObject):
+    """WeChatAutomation 的 Qt 包装：进度、完成、失败通过信号回到界面线程"""
+
     progressed = QtCore.pyqtSignal(str)
     finished = QtCore.pyqtSignal()
     failed = QtCore.pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
-        self._stop = threading.Event()
-        self.wechat_path: Optional[str] = None
+        # 环境变量 PY_WECHAT_DRIVER=sim 时用模拟微信，可在非 Windows 上演练整个发送流程
+        self.automation = WeChatAutomation(progress=self.progressed.emit,
+                                           driver=get_driver(progress=self.progressed.emit))
+        # 上次发送中未送达的段数 {群名: 段数}
+        self.unsent: Dict[str, int] = {}
 
-    def stop(self):
-        self._stop.set()
-
-    def _sleep(self, seconds: float) -> bool:
-        end = time.time() + seconds
-        while time.time() < end:
-            if self._stop.is_set():
-                return False
-            time.sleep(0.05)
-        return True
-
-    def _ensure_wechat(self):
-        # Try attach to WeChat window; if not, try to start
-        import uiautomation as auto
-        main = auto.WindowControl(searchDepth=1, ClassName="WeChatMainWndForPC")
-        if not main.Exists(0.5):
-            try:
-                exe = self._get_wechat_exe_path()
-                if exe:
-                    os.startfile(exe)
-            except Exception:
-                pass
-            # Wait up to 20s for window to appear
-            start = time.time()
-            while time.time() - start < 20:
-                if main.Exists(0.5):
-                    break
-                time.sleep(0.5)
-        if not main.Exists(0.5):
-            raise RuntimeError("未找到微信窗口，请先登录微信")
-        return main
-
-    def _send_to_group(self, group: str, text: str, interval_min: float, interval_max: float):
-        """发送消息到群聊 - 改进版窗口识别"""
-        self.progressed.emit(f"正在搜索群聊: {group}")
-        
-        try:
-            import uiautomation as auto
-            import pyperclip
-            
-            # 确保微信窗口存在并激活
-            main = self._ensure_wechat()
-            main.SetActive()
-            time.sleep(1.0)  # 等待窗口完全激活
-            
-            self.progressed.emit("微信窗口已激活，开始搜索群聊...")
-            
-            # 使用更可靠的搜索方式
-            success = self._search_and_enter_chat(group, main)
-            if not success:
-                raise RuntimeError(f"无法找到或进入群聊: {group}")
-            
-            self.progressed.emit(f"成功进入群聊: {group}")
-            
-            # 查找并验证输入框
-            input_box = self._find_message_input(main)
-            if not input_box:
-                raise RuntimeError("无法找到消息输入框")
-            
-            self.progressed.emit("找到消息输入框，开始发送...")
-            
-            # 分块发送消息
-            chunks = split_message_chunks(text, 3500)
-            for idx, chunk in enumerate(chunks, start=1):
-                if self._stop.is_set():
-                    return
-                
-                success = self._send_single_message(input_box, chunk)
-                if success:
-                    self.progressed.emit(f"✅ 已发送 {group} 第 {idx}/{len(chunks)} 段")
-                else:
-                    self.progressed.emit(f"⚠️ {group} 第 {idx} 段发送可能失败")
-                
-                if idx < len(chunks):
-                    d = random.uniform(interval_min, interval_max)
-                    if not self._sleep(d):
-                        return
-            return
-            
-        except Exception as e:
-            self.progressed.emit(f"UI自动化方式失败: {e}")
-            self.progressed.emit("尝试使用热键方式...")
-            self._send_via_hotkeys(group, text, interval_min, interval_max)
-
-    def _search_and_enter_chat(self, group_name: str, main_window) -> bool:
-        """搜索并进入聊天 - 改进版"""
-        import uiautomation as auto
-        import pyperclip
-        
-        try:
-            # 方法1: 尝试使用Ctrl+F打开搜索
-            for hotkey in ['{Ctrl}f', '^f']:
-                try:
-                    auto.SendKeys(hotkey)
-                    time.sleep(0.8)
-                    break
-                except Exception:
-                    continue
-            
-            # 清空搜索框并输入群名
-            pyperclip.copy(group_name)
-            auto.SendKeys('{Ctrl}a')
-            time.sleep(0.3)
-            auto.SendKeys('{Ctrl}v')
-            time.sleep(0.8)
-            
-            # 按Enter进入聊天
-            auto.SendKeys('{Enter}')
-            time.sleep(1.5)
-            
-            # 验证是否成功进入聊天
-            return self._verify_chat_window(main_window, group_name)
-            
-        except Exception as e:
-            self.progressed.emit(f"搜索聊天失败: {e}")
-            return False
-    
-    def _verify_chat_window(self, main_window, expected_name: str) -> bool:
-        """验证是否成功进入目标聊天窗口"""
-        try:
-            # 等待界面稳定
-            time.sleep(1.0)
-            
-            # 查找聊天标题或相关文本控件
-            text_controls = main_window.TextControls()
-            for text_ctrl in text_controls:
-                try:
-                    text = text_ctrl.Name
-                    if expected_name in text or text in expected_name:
-                        return True
-                except Exception:
-                    continue
-            
-            # 如果找不到标题，检查是否有输入框（说明进入了某个聊天）
-            edits = main_window.EditControls()
-            return len(edits) > 0
-            
-        except Exception:
-            return False
-    
-    def _find_message_input(self, main_window) -> Optional:
-        """查找消息输入框 - 改进版"""
-        try:
-            # 获取所有编辑控件
-            edits = main_window.EditControls()
-            if not edits:
-                return None
-            
-            # 通常消息输入框是最后一个或最大的编辑控件
-            # 先尝试最后一个
-            last_edit = edits[-1]
-            
-            # 验证这个控件是否可用
-            try:
-                last_edit.Click()
-                time.sleep(0.2)
-                return last_edit
-            except Exception:
-                pass
-            
-            # 如果最后一个不行，尝试其他的
-            for edit in reversed(edits[:-1]):
-                try:
-                    edit.Click()
-                    time.sleep(0.2)
-                    return edit
-                except Exception:
-                    continue
-            
-            return None
-            
-        except Exception:
-            return None
-    
-    def _send_single_message(self, input_box, message: str) -> bool:
-        """发送单条消息"""
-        import pyperclip
-        
-        try:
-            # 点击输入框确保焦点
-            input_box.Click()
-            time.sleep(0.3)
-            
-            # 清空输入框
-            input_box.SendKeys('{Ctrl}a')
-            time.sleep(0.2)
-            
-            # 复制消息到剪贴板
-            pyperclip.copy(message)
-            time.sleep(0.1)
-            
-            # 粘贴消息
-            input_box.SendKeys('{Ctrl}v')
-            time.sleep(0.5)
-            
-            # 发送消息
-            input_box.SendKeys('{Enter}')
-            time.sleep(0.3)
-            
-            return True
-            
-        except Exception as e:
-            self.progressed.emit(f"发送消息出错: {e}")
-            return False
+    @property
+    def _stop(self) -> threading.Event:
+        return self.automation._stop
 
-    def _focus_wechat_window(self):
-        try:
-            import win32gui, win32con
-            hwnd = win32gui.FindWindow('WeChatMainWndForPC', None)
-            if hwnd:
-                win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-                win32gui.SetForegroundWindow(hwnd)
-                return True
-        except Exception:
-            pass
-        # Last resort: try to start WeChat
-        try:
-            exe = self._get_wechat_exe_path()
-            if exe:
-                os.startfile(exe)
-            time.sleep(2)
-            return True
-        except Exception:
-            return False
-
-    def _get_wechat_exe_path(self) -> Optional[str]:
-        # Prefer user-specified path
-        candidates: List[str] = []
-        if self.wechat_path:
-            candidates.append(self.wechat_path)
-        # Common install paths
-        candidates.extend([
-            'WeChat.exe',
-            r'C:\\Program Files (x86)\\Tencent\\WeChat\\WeChat.exe',
-            r'C:\\Program Files\\Tencent\\WeChat\\WeChat.exe',
-            r'D:\\Program Files (x86)\\Tencent\\WeChat\\WeChat.exe',
-            r'D:\\Program Files\\Tencent\\WeChat\\WeChat.exe',
-            r'D:\\Program Files (x86)\\Weixin\\Weixin.exe',
-            r'C:\\Program Files (x86)\\Weixin\\Weixin.exe',
-        ])
-        for p in candidates:
-            try:
-                if os.path.isabs(p) and os.path.exists(p):
-                    return p
-                # For bare name, allow OS to resolve via PATH
-                if p.lower().endswith('.exe') and not os.path.isabs(p):
-                    return p
-            except Exception:
-                continue
-        return None
-
-    def _send_via_hotkeys(self, group: str, text: str, interval_min: float, interval_max: float):
-        """热键方式发送 - 改进版"""
-        import pyautogui
-        import pyperclip
-        
-        self.progressed.emit("使用热键方式发送...")
-        
-        # 设置pyautogui的安全设置
-        pyautogui.FAILSAFE = True
-        pyautogui.PAUSE = 0.2
-        
-        # 激活微信窗口
-        ok = self._focus_wechat_window()
-        if not ok:
-            raise RuntimeError('无法激活微信窗口')
-        time.sleep(1.5)  # 等待窗口完全激活
-        
-        self.progressed.emit(f"热键方式搜索群聊: {group}")
-        
-        # 多次尝试打开搜索框
-        for attempt in range(3):
-            try:
-                pyautogui.hotkey('ctrl', 'f')
-                time.sleep(0.8)
-                break
-            except Exception as e:
-                if attempt == 2:
-                    raise RuntimeError(f"无法打开搜索框: {e}")
-                time.sleep(0.5)
-        
-        # 搜索群聊 - 多次尝试确保成功
-        for attempt in range(2):
-            try:
-                pyperclip.copy(group)
-                time.sleep(0.3)
-                
-                # 全选并粘贴
-                pyautogui.hotkey('ctrl', 'a')
-                time.sleep(0.3)
-                pyautogui.hotkey('ctrl', 'v')
-                time.sleep(0.8)
-                
-                # 按Enter进入聊天
-                pyautogui.press('enter')
-                time.sleep(2.0)  # 等待进入聊天界面
-                break
-                
-            except Exception as e:
-                if attempt == 1:
-                    raise RuntimeError(f"搜索群聊失败: {e}")
-                time.sleep(1.0)
-        
-        self.progressed.emit(f"热键方式进入群聊成功，开始发送消息")
-        
-        # 分块发送消息
-        chunks = split_message_chunks(text, 3500)
-        for idx, chunk in enumerate(chunks, start=1):
-            if self._stop.is_set():
-                return
-            
-            success = self._send_message_via_hotkey(chunk, idx, len(chunks), group)
-            if not success:
-                self.progressed.emit(f"⚠️ {group} 第 {idx} 段发送可能失败")
-            
-            if idx < len(chunks):
-                d = random.uniform(interval_min, interval_max)
-                if not self._sleep(d):
-                    return
-    
-    def _send_message_via_hotkey(self, message: str, idx: int, total: int, group: str) -> bool:
-        """通过热键发送单条消息"""
-        import pyautogui
-        import pyperclip
-        
-        try:
-            # 复制消息到剪贴板
-            pyperclip.copy(message)
-            time.sleep(0.2)
-            
-            # 点击消息输入区域（确保焦点）
-            # 可以点击屏幕下方中间位置，通常是输入框
-            screen_width, screen_height = pyautogui.size()
-            input_x = screen_width // 2
-            input_y = int(screen_height * 0.85)  # 屏幕下方85%位置
-            
-            try:
-                pyautogui.click(input_x, input_y)
-                time.sleep(0.3)
-            except Exception:
-                pass  # 如果点击失败，继续尝试发送
-            
-            # 清空输入框并粘贴内容
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.2)
-            pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.5)
-            
-            # 发送消息
-            pyautogui.press('enter')
-            time.sleep(0.5)
-            
-            self.progressed.emit(f"✅ 热键发送 {group} 第 {idx}/{total} 段")
-            return True
-            
-        except Exception as e:
-            self.progressed.emit(f"❌ 热键发送第 {idx} 段失败: {e}")
-            return False
+    @property
+    def wechat_path(self) -> Optional[str]:
+        return self.automation.wechat_path
+
+    @wechat_path.setter
+    def wechat_path(self, path: Optional[str]):
+        self.automation.wechat_path = path
 
-    def send(self, items: List[Tuple[str, str]], interval_min: float, interval_max: float):
+    def stop(self):
+        self.automation.stop()
+
+    def send(self, items: List[Tuple[str, Payload]], interval_min: float, interval_max: float,
+             run_id: Optional[str] = None):
         try:
-            if platform.system().lower() != "windows":
-                raise RuntimeError("仅支持 Windows 平台")
-            for i, (group, text) in enumerate(items):
-                if self._stop.is_set():
-                    break
-                group = str(group).strip()
-                if not group:
-                    continue
-                self.progressed.emit(f"正在发送到：{group}")
-                try:
-                    self._send_to_group(group, text, interval_min, interval_max)
-                except Exception as e:
-                    self.progressed.emit(f"发送到 {group} 失败：{e}")
-                if i < len(items) - 1:
-                    d = random.uniform(interval_min, interval_max)
-                    if not self._sleep(d):
-                        break
+            self.unsent = self.automation.send(items, interval_min, interval_max, run_id)
             self.finished.emit()
         except Exception as e:
             self.failed.emit(str(e))
 
 
-def split_message_chunks(text: str, max_len: int = 3500) -> List[str]:
-    if len(text) <= max_len:
-        return [text]
-    parts: List[str] = []
-    current: List[str] = []
-    current_len = 0
-    for line in text.splitlines():
-        add_len = len(line) + (1 if current else 0)
-        if current_len + add_len > max_len:
-            parts.append("\n".join(current))
-            current = [line]
-            current_len = len(line)
-        else:
-            if current:
-                current.append(line)
-                current_len += len(line) + 1
-            else:
-                current = [line]
-                current_len = len(line)
-    if current:
-        parts.append("\n".join(current))
-    return parts
-
-
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -741,6 +111,23 @@ class MainWindow(QtWidgets.QMainWindow):
         self.df: Optional[pd.DataFrame] = None
         self.current_file: Optional[str] = None
         self.mapping: Optional[Dict[str, str]] = None
+        self.profiles = MappingProfiles()
+        self.source_columns: List[str] = []
+        # 当天已发送订单的哈希 -> 来源，用于跨导出判重；本次发送成功后再登记本次的订单
+        self._seen_before: Dict[int, str] = {}
+        self._pending_seen: List[int] = []
+        # 本次有效订单（各餐别、键列、映射），发送成功后写入历史库
+        self._pending_history: Optional[Tuple[Dict[str, pd.DataFrame], List[str], Dict[str, str]]] = None
+        self.duplicate_report = ""
+        self.validation_report = ""
+        self._pending_deltas: List = []
+        self._sending_test = False
+        # 筛选分类 / 编号 / 渲染 三个阶段的缓存，预览和发送共用同一份结果
+        self._stages = StageCache(("filter", "number", "render"))
+        self._fingerprint: Optional[Tuple] = None
+        # 渲染结果：[(餐别, 区域群或 None, 消息段)]
+        self._outputs: List[Tuple[str, Optional[str], List[str]]] = []
+        self._numbered: Optional[Dict] = None
 
         self.sender = WeChatSender()
         self._send_thread: Optional[threading.Thread] = None
@@ -782,6 +169,10 @@ class MainWindow(QtWidgets.QMainWindow):
         ]):
             grid.addWidget(QtWidgets.QLabel(label+"："), i, 0)
             grid.addWidget(w, i, 1)
+        self.btn_save_mapping = QtWidgets.QPushButton("记住此映射")
+        self.btn_save_mapping.setToolTip("确认映射无误后保存，下次加载同样表头的文件直接套用")
+        self.btn_save_mapping.clicked.connect(self.on_save_mapping)
+        grid.addWidget(self.btn_save_mapping, 5, 1)
         map_group.setEnabled(False)
         self.map_group = map_group
         root.addWidget(map_group)
@@ -795,6 +186,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.min_interval = QtWidgets.QDoubleSpinBox(); self.min_interval.setRange(0.1, 10.0); self.min_interval.setSingleStep(0.1); self.min_interval.setValue(1.0)
         self.max_interval = QtWidgets.QDoubleSpinBox(); self.max_interval.setRange(0.1, 10.0); self.max_interval.setSingleStep(0.1); self.max_interval.setValue(1.5)
         self.test_mode = QtWidgets.QCheckBox("测试模式（发送到：末）")
+        self.delta_mode = QtWidgets.QCheckBox("增量模式（只发送上次之后新增的订单，编号接续；列出已取消/退款）")
+        self.shard_mode = QtWidgets.QCheckBox(f"按区域分群发送（规则：{shard_rules_path()}）")
 
         form.addWidget(QtWidgets.QLabel("午餐起始编号："), 0, 0); form.addWidget(self.lunch_start, 0, 1)
         form.addWidget(QtWidgets.QLabel("晚餐起始编号："), 0, 2); form.addWidget(self.dinner_start, 0, 3)
@@ -804,13 +197,17 @@ class MainWindow(QtWidgets.QMainWindow):
         h = QtWidgets.QHBoxLayout(); h.addWidget(QtWidgets.QLabel("最小")); h.addWidget(self.min_interval); h.addSpacing(8); h.addWidget(QtWidgets.QLabel("最大")); h.addWidget(self.max_interval)
         w = QtWidgets.QWidget(); w.setLayout(h); form.addWidget(w, 2, 1, 1, 3)
         form.addWidget(self.test_mode, 3, 0, 1, 4)
+        form.addWidget(self.delta_mode, 4, 0, 1, 4)
+        form.addWidget(self.shard_mode, 5, 0, 1, 4)
         root.addWidget(settings)
 
         actions = QtWidgets.QHBoxLayout()
         self.btn_preview = QtWidgets.QPushButton("预览"); self.btn_preview.clicked.connect(self.on_preview)
         self.btn_send = QtWidgets.QPushButton("发送"); self.btn_send.clicked.connect(self.on_send)
         self.btn_stop = QtWidgets.QPushButton("停止（Ctrl+Shift+S）"); self.btn_stop.clicked.connect(self.on_stop)
-        actions.addWidget(self.btn_preview); actions.addWidget(self.btn_send); actions.addWidget(self.btn_stop); actions.addStretch(1)
+        self.btn_export = QtWidgets.QPushButton("导出表格…"); self.btn_export.clicked.connect(self.on_export)
+        actions.addWidget(self.btn_preview); actions.addWidget(self.btn_send); actions.addWidget(self.btn_stop)
+        actions.addWidget(self.btn_export); actions.addStretch(1)
         root.addLayout(actions)
 
         self.preview = QtWidgets.QPlainTextEdit(); self.preview.setReadOnly(True)
@@ -841,20 +238,25 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def _load_file(self, path: str):
         try:
-            df, _ = load_dataframe(path)
+            df, _ = load_dataframe(path, self.profiles.projection)
             df = normalize_columns(df)
+            self.source_columns = df.attrs.get("source_columns", list(df.columns))
             self.df = df
             self.current_file = path
+            self._fingerprint = file_fingerprint(path)
+            self._stages.invalidate()
             self.file_label.setText(f"已加载：{os.path.basename(path)}")
             self.map_group.setEnabled(True)
             for cmb in [self.cmb_product, self.cmb_pay, self.cmb_status, self.cmb_addr, self.cmb_note]:
-                cmb.clear(); cmb.addItems([str(c) for c in self.df.columns])
-            m = infer_default_mapping(self.df)
+                # 列出完整表头：即使按已存方案只加载了部分列，也能改选其它列
+                cmb.clear(); cmb.addItems([str(c) for c in self.source_columns])
+            m = infer_default_mapping(self.df, self.profiles)
             self.cmb_product.setCurrentText(m["商品信息"])
             self.cmb_pay.setCurrentText(m["支付状态"])
             self.cmb_status.setCurrentText(m["订单状态"])
             self.cmb_addr.setCurrentText(m["收货地址"])
             self.cmb_note.setCurrentText(m["用户备注"])
+            self._seen_before = SeenOrders().snapshot()
             self.status.setText("文件加载成功。")
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "加载失败", f"{e}\n\n{traceback.format_exc()}")
@@ -869,18 +271,68 @@ class MainWindow(QtWidgets.QMainWindow):
         }
 
     def _build_texts(self) -> Tuple[str, str]:
+        """按阶段生成文本；参数未变的阶段直接复用上次结果，发送时拿到的就是预览显示的内容"""
         if self.df is None:
             raise RuntimeError("请先加载 Excel/CSV 文件")
         mp = self._mapping()
-        lunch, dinner = filter_and_order(self.df, mp)
-        lunch_text = build_output(lunch, mp, self.lunch_start.value(), "一、午餐", "明日午餐 x1")
-        dinner_text = build_output(dinner, mp, self.dinner_start.value(), "二、晚餐", "明日晚餐 x1")
+        df = ensure_columns(self.df, self.current_file, list(mp.values()))
+        if df is not self.df:
+            # 映射改到了按方案投影时没加载的列，已完整重新加载
+            self.df = df
+            self._stages.invalidate()
+        filter_key = (self._fingerprint, tuple(sorted(mp.items())))
+        filtered = self._stages.get("filter", filter_key, lambda: filter_orders(self.df, mp, self._seen_before))
+        starts = {"午餐": self.lunch_start.value(), "晚餐": self.dinner_start.value()}
+        rules = tuple(load_shard_rules()) if self.shard_mode.isChecked() else ()
+        if self.shard_mode.isChecked() and not rules:
+            raise RuntimeError(f"未配置分群规则：请编辑 {shard_rules_path()}，填写规则并把 enabled 设为 true")
+        if rules and self.delta_mode.isChecked():
+            raise RuntimeError("按区域分群暂不支持与增量模式同时使用")
+        number_key = (filter_key, tuple(sorted(starts.items())), self.delta_mode.isChecked(), rules)
+        numbered = self._stages.get("number", number_key, lambda: number_orders(
+            self.df, filtered, starts, mp, rules, self.delta_mode.isChecked()))
+        render_key = (number_key, MEAL_TITLES)
+        self._outputs = self._stages.get("render", render_key, lambda: render_orders(numbered, MEAL_TITLES, mp))
+        self._numbered = numbered
+        self.duplicate_report = filtered["duplicate_report"]
+        self.validation_report = numbered["validation_report"]
+        self._pending_deltas = list(numbered["deltas"])
+        # 按本次实际使用的映射求哈希，发送成功后登记为已发送
+        self._pending_seen = order_hashes(numbered["frames"].values(), filtered["key_cols"])
+        self._pending_history = (filtered["groups"], filtered["key_cols"], mp)
+        lunch_text, dinner_text = meal_texts(self._outputs)
         return lunch_text, dinner_text
 
+    def on_save_mapping(self):
+        """用户确认后才把当前映射保存为该表头格式的方案；预览不保存，映射选错不会影响下次加载"""
+        if not self.source_columns:
+            return
+        self.profiles.save(self.source_columns, self._mapping())
+        self.status.setText("已记住当前映射，下次加载同样表头的文件将直接套用。")
+
+    def _record_history(self, groups: Dict[str, pd.DataFrame], key_cols: List[str], mp: Dict[str, str]):
+        """有效订单写入历史库（同一天重复处理不会重复入库）；历史库出错不影响预览和发送"""
+        try:
+            history = OrderHistory()
+            try:
+                history.record_groups(groups, key_cols, mp["收货地址"], mp["商品信息"], mp["用户备注"],
+                                      source=os.path.basename(self.current_file or ""))
+            finally:
+                history.close()
+        except Exception:
+            traceback.print_exc()
+
     def on_preview(self):
         try:
             lunch_text, dinner_text = self._build_texts()
-            self.preview.setPlainText((lunch_text + "\n\n" + dinner_text).strip())
+            text = (lunch_text + "\n\n" + dinner_text).strip()
+            if self.delta_mode.isChecked() and not text:
+                text = "（增量模式）上次发送后没有新增或撤回的订单。"
+            if self.validation_report:
+                text = self.validation_report + "\n\n" + text
+            if self.duplicate_report:
+                text = self.duplicate_report + "\n\n" + text
+            self.preview.setPlainText(text)
             self.status.setText("预览已生成。")
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "预览失败", str(e))
@@ -891,29 +343,83 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "发送失败", str(e))
             return
+        if self.duplicate_report:
+            ok = QtWidgets.QMessageBox.question(
+                self, "发现重复订单", self.duplicate_report + "\n\n是否继续发送其余订单？",
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No)
+            if ok != QtWidgets.QMessageBox.Yes:
+                return
+        if self.validation_report:
+            ok = QtWidgets.QMessageBox.question(
+                self, "发送前检查", self.validation_report + "\n\n是否仍然发送？",
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No)
+            if ok != QtWidgets.QMessageBox.Yes:
+                return
         mi = float(self.min_interval.value()); ma = float(self.max_interval.value())
         if ma < mi:
             QtWidgets.QMessageBox.warning(self, "参数错误", "最大发送间隔不能小于最小发送间隔")
             return
         lunch_group = self.cmb_lunch_group.currentText().strip()
         dinner_group = self.cmb_dinner_group.currentText().strip()
-        items: List[Tuple[str, str]] = []
-        test = self.test_mode.isChecked()
-        items.append((("末" if test else lunch_group), lunch_text))
-        items.append((("末" if test else dinner_group), dinner_text))
-        items = [(g, t) for g, t in items if g]
+        if self.delta_mode.isChecked() and not (lunch_text.strip() or dinner_text.strip()):
+            QtWidgets.QMessageBox.information(self, "无需发送", "上次发送后没有新增或撤回的订单")
+            return
+        # 发送预览时渲染好的消息段；区域群的内容发到对应群，同一个群的内容连续发送以减少切换
+        items = send_items(self._outputs, {"午餐": lunch_group, "晚餐": dinner_group},
+                           "末" if self.test_mode.isChecked() else None)
         if not items:
             QtWidgets.QMessageBox.warning(self, "缺少群聊", "请至少设置一个群聊或开启测试模式")
             return
+        # 台账中有同一任务的完成记录：询问是否从断点继续
+        plan = plan_entries(items)
+        run_id = SendLedger.make_run_id(plan)
+        done = SendLedger().done_count(run_id)
+        if done:
+            if done >= len(plan):
+                prompt = f"这些内容今天已全部发送过（共 {len(plan)} 段）。\n\n是否重新发送？"
+                if QtWidgets.QMessageBox.question(self, "已发送过", prompt) != QtWidgets.QMessageBox.Yes:
+                    return
+                run_id = SendLedger.fresh_run_id(run_id)
+            else:
+                prompt = f"检测到上次未完成的发送（已完成 {done}/{len(plan)} 段）。\n\n是：从第一条未发送的继续\n否：全部重新发送"
+                ans = QtWidgets.QMessageBox.question(
+                    self, "断点续发", prompt,
+                    QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No | QtWidgets.QMessageBox.Cancel)
+                if ans == QtWidgets.QMessageBox.Cancel:
+                    return
+                if ans == QtWidgets.QMessageBox.No:
+                    run_id = SendLedger.fresh_run_id(run_id)
         self.btn_send.setEnabled(False)
         self.sender.progressed.connect(self._on_progress)
         self.sender.finished.connect(self._on_finished)
         self.sender.failed.connect(self._on_failed)
         self.sender._stop.clear()
-        self._send_thread = threading.Thread(target=self.sender.send, args=(items, mi, ma), daemon=True)
+        self._sending_test = self.test_mode.isChecked()
+        self._send_thread = threading.Thread(target=self.sender.send, args=(items, mi, ma, run_id), daemon=True)
         self._send_thread.start()
         self.status.setText("正在发送…")
 
+    def on_export(self):
+        """把当前编号（与预览、发送一致）的订单导出为 xlsx / csv"""
+        try:
+            self._build_texts()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "导出失败", str(e))
+            return
+        start_dir = os.path.dirname(self.current_file) if self.current_file else os.path.expanduser("~")
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "导出订单清单", os.path.join(start_dir, default_export_name(self.current_file)),
+            "Excel 文件 (*.xlsx);;CSV 文件 (*.csv)")
+        if not path:
+            return
+        mp = self._mapping()
+        try:
+            n = export_orders(path, export_sections(self._numbered), mp["收货地址"], mp["用户备注"])
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "导出失败", str(e))
+            return
+        self.status.setText(f"已导出 {n} 条订单：{path}")
+
     def on_stop(self):
         try:
             self.sender.stop()
@@ -926,6 +432,31 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def _on_finished(self):
         self.btn_send.setEnabled(True)
+        if self.sender.unsent:
+            # 有段落没送达：快照和已发送记录都不更新，再次发送时按台账只补发未送达的段落
+            detail = "，".join(f"{group} {n} 段" for group, n in self.sender.unsent.items())
+            self.status.setText(f"发送未完成：{detail} 未送达，可再次点击发送补发。")
+            return
+        if self._pending_deltas and not self.sender._stop.is_set() and not self._sending_test:
+            # 完整发到真实群后才更新快照；中途停止或只发到测试群时下次仍按原快照计算增量
+            snapshot = SentSnapshot()
+            for d in self._pending_deltas:
+                snapshot.commit(d)
+            self._pending_deltas = []
+            # 快照已变，编号阶段及其后的缓存失效
+            self._stages.invalidate("number")
+        if self._pending_seen and not self.sender._stop.is_set() and not self._sending_test:
+            # 测试群里的发送不算已发送；登记后重新加载或再次导出时这些订单按重复排除
+            seen = SeenOrders()
+            source = f"{os.path.basename(self.current_file or '')}（{datetime.now().strftime('%H:%M')}）"
+            seen.register(self._pending_seen, source)
+            self._seen_before = seen.snapshot()
+            self._pending_seen = []
+            self._stages.invalidate()
+        if self._pending_history and not self.sender._stop.is_set() and not self._sending_test:
+            # 预览和导出不写历史库，真正发到群里后才入库
+            self._record_history(*self._pending_history)
+            self._pending_history = None
         self.status.setText("发送完成。")
 
     def _on_failed(self, err: str):
@@ -0,0 +1,156 @@
+"""订单筛选与分类（不依赖 Qt，供 PyQt 版与终极版共用）"""
+
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# 本地状态目录（当天已加载订单、映射方案等）
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".py_wechat_sender")
+
+
+def state_path(name: str) -> str:
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
+
+
+REQUIRED_COLUMNS = ["商品信息", "支付状态", "订单状态", "收货地址", "用户备注"]
+
+# 分类规则：(分类名, 商品关键字, 标题中显示的商品标签)
+# 新增餐别只需追加一条规则，不会增加额外的扫描
+DEFAULT_MEAL_RULES: List[Tuple[str, str, str]] = [
+    ("午餐", "明日午餐", "明日午餐"),
+    ("晚餐", "明日晚餐", "明日晚餐"),
+]
+
+EXCLUDED_ORDER_STATUS = ("已取消", "用户申请退款")
+
+# 商品信息中的数量写法：x2 / X2 / ×2 / *2，取关键字之后出现的第一个
+_QTY_PATTERN = r"(?:.*?[xX×*]\s*(?P<qty>\d+))?"
+# 一行含多个商品时，数量只在本关键字之后、下一个关键字之前查找，不会取到后一个商品的数量
+_BOUNDED_QTY_PATTERN = r"(?:(?:(?!{alternation}).)*?[xX×*]\s*(?P<qty>\d+))?"
+
+
+def keyword_alternation(rules: Sequence[Tuple[str, str, str]]) -> str:
+    """所有商品关键字的正则分支，长关键字在前"""
+    keywords = sorted({kw for _, kw, _ in rules}, key=len, reverse=True)
+    return "|".join(re.escape(kw) for kw in keywords)
+
+
+def compile_rules(rules: Sequence[Tuple[str, str, str]],
+                  qty_pattern: str = _QTY_PATTERN) -> Tuple[re.Pattern, Dict[str, str]]:
+    """把所有规则编译成一个正则，一次 extract 同时取出商品关键字和数量"""
+    alternation = keyword_alternation(rules)
+    qty_pattern = qty_pattern.replace("{alternation}", alternation)
+    pattern = re.compile(rf"(?P<product>{alternation}){qty_pattern}")
+    lookup: Dict[str, str] = {}
+    for category, kw, _ in rules:
+        lookup.setdefault(kw, category)
+    return pattern, lookup
+
+
+def _to_qty(raw: pd.Series) -> np.ndarray:
+    return pd.to_numeric(raw, errors="coerce").fillna(1).astype(int).clip(lower=1).to_numpy()
+
+
+def split_products(texts: Sequence[str], rules: Sequence[Tuple[str, str, str]]
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """逐个解析商品：每出现一次关键字得到一条 (texts 中的位置, 商品关键字, 数量)"""
+    pattern, _ = compile_rules(rules, _BOUNDED_QTY_PATTERN)
+    found = pd.Series(list(texts), dtype=object).str.extractall(pattern)
+    pos = found.index.get_level_values(0).to_numpy(dtype=np.int64)
+    return pos, found["product"].to_numpy(dtype=object), _to_qty(found["qty"])
+
+
+def product_entries(texts: np.ndarray, product: np.ndarray, qty: np.ndarray, multi: np.ndarray,
+                    rules: Sequence[Tuple[str, str, str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """合并整行 extract 的结果与多商品行的逐个解析结果。
+
+    product/qty 为整行 extract 取到的第一个商品及数量，multi 标记含多个商品关键字的行，
+    这些行（通常很少）改用 split_products 逐个解析。返回 (行位置, 分类, 数量)，
+    按行位置、行内出现顺序排列；未命中任何关键字的行不产生条目。
+    """
+    _, lookup = compile_rules(rules)
+    single = np.flatnonzero(~multi)
+    rows = np.flatnonzero(multi)
+    sub_pos, sub_product, sub_qty = split_products(texts[rows], rules)
+    pos = np.concatenate([single, rows[sub_pos]])
+    keyword = np.concatenate([product[single], sub_product])
+    qty = np.concatenate([qty[single], sub_qty])
+    category = pd.Series(keyword, dtype=object).map(lookup).to_numpy(dtype=object)
+    hit = pd.notna(category)
+    order = np.argsort(pos[hit], kind="stable")
+    return pos[hit][order], category[hit][order], qty[hit][order]
+
+
+def bucket_entries(df: pd.DataFrame, pos: np.ndarray, category: np.ndarray, qty: np.ndarray,
+                   rules: Sequence[Tuple[str, str, str]]) -> Dict[str, pd.DataFrame]:
+    """按条目顺序把行分到各分类，数量 N 展开成 N 行；每个规则都有对应键（可能为空表）"""
+    groups: Dict[str, pd.DataFrame] = {}
+    for cat, _, _ in rules:
+        if cat in groups:
+            continue
+        sel = category == cat
+        groups[cat] = df.iloc[np.repeat(pos[sel], qty[sel])]
+    return groups
+
+
+def effective_mask(df: pd.DataFrame, pay_col: str, status_col: Optional[str] = None) -> pd.Series:
+    """已支付且未取消/退款的订单"""
+    pay = df[pay_col].astype(str).str.strip()
+    mask = pay == "已支付"
+    if status_col and status_col in df.columns:
+        st = df[status_col].astype(str).str.strip()
+        mask &= ~st.isin(EXCLUDED_ORDER_STATUS)
+    return mask
+
+
+def classify_orders(df: pd.DataFrame, product_col: str,
+                    rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES) -> Dict[str, pd.DataFrame]:
+    """按规则把订单分到各餐别。
+
+    商品名与数量在一次向量化 extract 中解析；同一行含多个商品（如“明日午餐 x1;明日晚餐 x1”）时
+    每个商品各算一条，分别进入对应餐别。数量 N 会展开成 N 条记录，后续编号时各占一个号。
+    返回 {分类名: DataFrame}，每个规则都有对应键（可能为空表）。
+    """
+    pattern, _ = compile_rules(rules)
+    texts = df[product_col].astype(str).str.strip().reset_index(drop=True)
+    parsed = texts.str.extract(pattern)
+    multi = (texts.str.count(keyword_alternation(rules)) > 1).to_numpy()
+    pos, category, qty = product_entries(texts.to_numpy(dtype=object), parsed["product"].to_numpy(dtype=object),
+                                         _to_qty(parsed["qty"]), multi, rules)
+    return bucket_entries(df, pos, category, qty, rules)
+
+
+def prepare_orders(df: pd.DataFrame, product_col: str, pay_col: str, status_col: Optional[str] = None) -> pd.DataFrame:
+    """副本上补 __row__（原始行号）并把参与筛选/分类的列空值填为空串"""
+    df = df.copy()
+    if "__row__" not in df.columns:
+        df["__row__"] = range(1, len(df) + 1)
+    for col in (product_col, pay_col, status_col):
+        if col and col in df.columns:
+            df[col] = df[col].fillna("")
+    return df
+
+
+def filter_and_classify(df: pd.DataFrame, product_col: str, pay_col: str, status_col: Optional[str] = None,
+                        rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES) -> Dict[str, pd.DataFrame]:
+    """筛选有效订单并分类，每类按原始行号倒序"""
+    df = prepare_orders(df, product_col, pay_col, status_col)
+    eff = df[effective_mask(df, pay_col, status_col)]
+    eff = eff.sort_values("__row__", ascending=False, kind="stable")
+    return classify_orders(eff, product_col, rules)
+
+
+def filter_and_order(df: pd.DataFrame, mapping: Dict[str, str],
+                     rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    df = df.copy()
+    df["__row__"] = range(1, len(df) + 1)
+    for col in mapping.values():
+        if col in df.columns:
+            df[col] = df[col].fillna("")
+    groups = filter_and_classify(df, mapping["商品信息"], mapping["支付状态"], mapping["订单状态"], rules)
+    return groups["午餐"], groups["晚餐"]
@@ -0,0 +1,182 @@
+"""多进程订单处理：把表按行切块，在子进程中完成筛选、分类和地址格式化，再按原顺序拼回
+
+地址格式化和正则解析是纯 Python 的 CPU 密集操作，多门店/整月导出时单核会成为瓶颈。
+子进程只接收映射到的几列：支持 fork 的平台上整表在建池前放入模块全局变量，
+子进程通过写时复制直接读取，任务只传行区间；其他平台（Windows spawn）按块传切片。
+子进程只返回命中的行位置和格式化后的地址，由主进程按位置取回原始行。
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from py_wechat_sender.orders import DEFAULT_MEAL_RULES, classify_orders, effective_mask, prepare_orders
+from py_wechat_sender.address import ADDRESS_COLUMN, split_address
+from py_wechat_sender.engines import get_engine
+
+
+# 少于这个行数时进程池的启动开销大于收益，直接串行
+PARALLEL_MIN_ROWS = 20000
+
+# fork 模式下子进程继承的只读数据
+_SHARED: Optional[pd.DataFrame] = None
+
+
+def _fork_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def _process_chunk(task) -> Dict[str, Tuple[np.ndarray, List[str]]]:
+    """子进程：对一个行区间做筛选+分类+地址格式化，返回 {分类: (行位置, 格式化地址)}"""
+    start, stop, part, product_col, pay_col, status_col, addr_col, rules, formatter = task
+    if part is None:
+        part = _SHARED.iloc[start:stop]
+    eff = part[effective_mask(part, pay_col, status_col)]
+    groups = classify_orders(eff, product_col, rules)
+    out = {}
+    for cat, g in groups.items():
+        addrs = [formatter(a) for a in g[addr_col].tolist()] if addr_col else []
+        out[cat] = (g["__pos__"].to_numpy(), addrs)
+    return out
+
+
+def _chunk_bounds(n: int, workers: int, chunk_size: Optional[int]) -> List[Tuple[int, int]]:
+    size = chunk_size or max(1000, -(-n // (workers * 4)))
+    return [(s, min(s + size, n)) for s in range(0, n, size)]
+
+
+def parallel_filter_and_classify(df: pd.DataFrame, product_col: str, pay_col: str,
+                                 status_col: Optional[str] = None, addr_col: Optional[str] = None,
+                                 rules: Sequence[Tuple[str, str, str]] = DEFAULT_MEAL_RULES,
+                                 formatter: Callable[[str], str] = split_address,
+                                 workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                                 min_rows: int = PARALLEL_MIN_ROWS, engine: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """与 filter_and_classify 结果一致（行、顺序、数量展开、空值填充），并额外带上 __addr__ 列。
+
+    formatter 必须是模块级函数（子进程需要按名字导入）。
+    行数少于 min_rows、workers == 1 或使用自带多线程的 Polars/pyarrow 引擎时在本进程内完成。
+    """
+    # 与串行版相同的预处理（__row__、参与筛选的列空值填空串），进程池拼回时从这张表取行
+    df = prepare_orders(df, product_col, pay_col, status_col)
+    workers = workers or os.cpu_count() or 1
+    eng = get_engine(engine)
+
+    if workers <= 1 or len(df) < min_rows or eng.name != "pandas":
+        groups = eng.filter_and_classify(df, product_col, pay_col, status_col, rules)
+        if addr_col:
+            for cat, g in groups.items():
+                groups[cat] = g.assign(**{ADDRESS_COLUMN: [formatter(a) for a in g[addr_col].tolist()]})
+        return groups
+
+    # 只把用到的列交给子进程
+    cols = [c for c in dict.fromkeys((product_col, pay_col, status_col, addr_col)) if c and c in df.columns]
+    slim = df[cols].fillna("")
+    slim["__pos__"] = np.arange(len(df))
+
+    global _SHARED
+    ctx = _fork_context()
+    bounds = _chunk_bounds(len(slim), workers, chunk_size)
+    common = (product_col, pay_col, status_col, addr_col, list(rules), formatter)
+    if ctx is not None:
+        _SHARED = slim
+        tasks = [(s, e, None) + common for s, e in bounds]
+    else:
+        tasks = [(s, e, slim.iloc[s:e]) + common for s, e in bounds]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            results = list(pool.map(_process_chunk, tasks))
+    finally:
+        _SHARED = None
+
+    # 拼回：各块按原顺序串接，再与串行版一样按 __row__ 倒序（稳定排序，展开的份数保持相邻）
+    rank = df["__row__"].to_numpy()
+    groups: Dict[str, pd.DataFrame] = {}
+    for cat, _, _ in rules:
+        if cat in groups:
+            continue
+        pos = np.concatenate([r[cat][0] for r in results]) if results else np.array([], dtype=int)
+        addrs = [a for r in results for a in r[cat][1]]
+        order = np.argsort(-rank[pos], kind="stable")
+        part = df.iloc[pos[order]]
+        if addr_col:
+            part = part.assign(**{ADDRESS_COLUMN: [addrs[i] for i in order]})
+        groups[cat] = part
+    return groups
+
+
+def make_sample_orders(rows: int, seed: int = 0) -> pd.DataFrame:
+    """生成基准测试用的订单表"""
+    rng = np.random.default_rng(seed)
+    products = np.array(["明日午餐", "明日晚餐 x2", "明日午餐×3 加蛋", "饮料", "明日晚餐"])
+    pays = np.array(["已支付", "已支付", "已支付", "未支付"])
+    statuses = np.array(["已完成", "待配送", "已取消", "用户申请退款", "已完成"])
+    phones = rng.integers(13000000000, 19999999999, size=rows).astype(str)
+    rooms = rng.integers(100, 2000, size=rows).astype(str)
+    return pd.DataFrame({
+        "商品信息": products[rng.integers(0, len(products), size=rows)],
+        "支付状态": pays[rng.integers(0, len(pays), size=rows)],
+        "订单状态": statuses[rng.integers(0, len(statuses), size=rows)],
+        "收货地址": np.char.add(np.char.add("张三", phones), np.char.add(" 幸福小区", rooms)),
+        "用户备注": "",
+    })
+
+
+def _same_groups(a: Dict[str, pd.DataFrame], b: Dict[str, pd.DataFrame]) -> bool:
+    return a.keys() == b.keys() and all(a[k].equals(b[k]) for k in a)
+
+
+def check_parallel(workers: int = 2, rows: int = 20000) -> bool:
+    """边界样例和生成的订单表上，多进程结果与串行结果逐表 equals（含空值填充和 __addr__ 列）"""
+    from py_wechat_sender.engines import edge_case_orders
+
+    same = True
+    for data in (edge_case_orders(), make_sample_orders(rows)):
+        args = (data, "商品信息", "支付状态", "订单状态", "收货地址")
+        same &= _same_groups(parallel_filter_and_classify(*args, workers=workers, min_rows=0, chunk_size=4),
+                             parallel_filter_and_classify(*args, workers=1))
+    return same
+
+
+def benchmark(rows: int = 400000, max_workers: Optional[int] = None, repeat: int = 1) -> List[Tuple[int, float]]:
+    """1..N 核的扩展性测试，返回 [(进程数, 秒)] 并打印加速比，以及结果是否与单进程一致"""
+    df = make_sample_orders(rows)
+    max_workers = max_workers or os.cpu_count() or 1
+    baseline = None
+    reference = None
+    results = []
+    for n in range(1, max_workers + 1):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            groups = parallel_filter_and_classify(df, "商品信息", "支付状态", "订单状态", "收货地址",
+                                                  workers=n, min_rows=0)
+            best = min(best, time.perf_counter() - t0)
+        baseline = baseline or best
+        if reference is None:
+            reference = groups
+        results.append((n, best))
+        same = "一致" if _same_groups(groups, reference) else "不一致"
+        print(f"{n:>3} 进程  {best:8.3f}s  加速比 {baseline / best:5.2f}x  结果{same}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="订单处理多进程扩展性测试")
+    parser.add_argument("--rows", type=int, default=400000)
+    parser.add_argument("--workers", type=int, default=None, help="最多测试到的进程数，默认 CPU 核数")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--check", action="store_true", help="只检查多进程结果与串行结果是否一致")
+    args = parser.parse_args()
+    if args.check:
+        print("一致" if check_parallel(args.workers or 2) else "不一致")
+    else:
+        benchmark(args.rows, args.workers, args.repeat)
@@ -0,0 +1,126 @@
+"""订单流水线（不依赖 Qt）：判重 + 筛选分类 → 编号（增量 / 分群）→ 渲染成消息段 → 发送计划
+
+PyQt 界面的三个缓存阶段和命令行入口都调用这里的函数，同一份表格得到的文本完全一致。
+"""
+
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.orders import DEFAULT_MEAL_RULES, effective_mask
+from py_wechat_sender.address import split_address
+from py_wechat_sender.parallel import parallel_filter_and_classify
+from py_wechat_sender.render import MESSAGE_LIMIT, Payload, as_chunks, header_line, iter_chunks, order_blocks
+from py_wechat_sender.dedupe import find_duplicates, format_duplicate_report, order_key_columns
+from py_wechat_sender.delta import SentSnapshot, format_retractions
+from py_wechat_sender.validate import format_validation_report, validate_orders
+from py_wechat_sender.sharding import group_by_target, shard_orders
+
+
+# (餐别, 标题)，按输出顺序
+MEAL_TITLES: Tuple[Tuple[str, str], ...] = (("午餐", "一、午餐"), ("晚餐", "二、晚餐"))
+
+# 渲染结果：[(餐别, 区域群或 None, 消息段)]
+Outputs = List[Tuple[str, Optional[str], List[str]]]
+
+
+def filter_orders(df: pd.DataFrame, mp: Dict[str, str], seen_before: Optional[Dict[int, str]] = None) -> Dict:
+    """判重 + 筛选分类（含地址格式化），只依赖表格和映射"""
+    eff = df[effective_mask(df, mp["支付状态"], mp["订单状态"])]
+    key_cols = order_key_columns(eff, mp["收货地址"], mp["商品信息"], mp["用户备注"])
+    dup, notes = find_duplicates(eff, key_cols, seen_before)
+    src = df.drop(index=eff.index[dup]).fillna({c: "" for c in set(mp.values())})
+    # 大表自动切块交给多进程完成筛选、分类和地址格式化
+    groups = parallel_filter_and_classify(src, mp["商品信息"], mp["支付状态"], mp["订单状态"], mp["收货地址"])
+    return {"groups": groups, "key_cols": key_cols, "duplicate_report": format_duplicate_report(notes)}
+
+
+def number_orders(df: pd.DataFrame, filtered: Dict, starts: Dict[str, int], mp: Dict[str, str],
+                  rules: Tuple = (), delta: bool = False) -> Dict:
+    """确定各餐别要发的订单和起始编号；增量模式下与已发送快照比较；有分群规则时按区域拆分，各自从起始编号开始"""
+    groups = filtered["groups"]
+    deltas = []
+    if delta:
+        snapshot = SentSnapshot()
+        all_rows = df.fillna("")
+        for cat, _ in MEAL_TITLES:
+            deltas.append(snapshot.compute(cat, groups[cat], all_rows, filtered["key_cols"], starts[cat],
+                                           mp["支付状态"], mp["订单状态"]))
+        frames = {d.category: d.new for d in deltas}
+        starts = {d.category: d.start for d in deltas}
+    else:
+        frames = {cat: groups[cat] for cat, _ in MEAL_TITLES}
+    shards = {cat: (shard_orders(frames[cat], mp["收货地址"], rules, cat) if rules else [(None, frames[cat])])
+              for cat in frames}
+    checked = {(f"{cat}·{group}" if group else cat): part for cat in shards for group, part in shards[cat]}
+    issues = validate_orders(checked, {name: starts[name.split("·")[0]] for name in checked},
+                             mp["收货地址"], mp["用户备注"])
+    return {"frames": frames, "shards": shards, "starts": starts, "deltas": deltas,
+            "validation_report": format_validation_report(issues)}
+
+
+def render_orders(numbered: Dict, titles: Sequence[Tuple[str, str]], mp: Dict[str, str]) -> Outputs:
+    """各餐别（及区域群）渲染成可直接发送的消息段，一条订单不会跨段；各段用换行拼接即为预览文本。
+
+    iter_chunks 本身按需产出，这里整体展开成列表：预览要显示全文，发送前预写台账也需要完整计划，
+    预览和发送共用这份缓存，代价是开始发送前所有段落都已渲染好（命令行 --send 同样如此）。
+    """
+    labels = {cat: label for cat, _, label in DEFAULT_MEAL_RULES}
+    deltas = {d.category: d for d in numbered["deltas"]}
+    outputs: Outputs = []
+    for cat, title in titles:
+        orders, start = numbered["frames"][cat], numbered["starts"][cat]
+        if cat not in deltas:
+            for group, part in numbered["shards"][cat]:
+                head = header_line(f"{title} → {group}" if group else title, labels[cat], start)
+                outputs.append((cat, group, list(iter_chunks(chain([head], order_blocks(part, mp, start))))))
+            continue
+        # 增量模式：只输出上次发送之后的新增订单，并附上已取消/退款的订单（中间空一行）
+        parts = []
+        if not orders.empty:
+            parts.append(chain([header_line(f"{title}（新增）", labels[cat], start)], order_blocks(orders, mp, start)))
+        retract = format_retractions(f"{title}（撤回）", deltas[cat].retracted,
+                                     lambda row: split_address(str(row.get(mp["收货地址"], ""))))
+        if retract:
+            if parts:
+                parts.append([""])
+            parts.append(retract.split("\n"))
+        outputs.append((cat, None, list(iter_chunks(chain.from_iterable(parts)))))
+    return outputs
+
+
+def meal_texts(outputs: Outputs, titles: Sequence[Tuple[str, str]] = MEAL_TITLES) -> List[str]:
+    """各餐别的完整预览文本，顺序同 titles"""
+    return ["\n\n".join("\n".join(chunks) for c, _, chunks in outputs if c == cat) for cat, _ in titles]
+
+
+def export_sections(numbered: Dict) -> List[Tuple[str, Optional[str], pd.DataFrame, int]]:
+    """编号结果转成导出用的 [(餐别, 区域群, 订单, 起始编号)]"""
+    return [(cat, group, part, numbered["starts"][cat])
+            for cat, _ in MEAL_TITLES for group, part in numbered["shards"][cat]]
+
+
+def send_items(outputs: Outputs, default_groups: Dict[str, str],
+               override: Optional[str] = None) -> List[Tuple[str, List[str]]]:
+    """[(群名, 消息段)]：区域群的内容发到对应群（override 非空时全部发到该群），
+    同一个群的内容连续发送，相邻的合并为一项，只进入一次聊天"""
+    items = [((override or group or default_groups.get(cat, "")), chunks) for cat, group, chunks in outputs]
+    items = [(g, c) for g, c in group_by_target(items) if g and "".join(c).strip()]
+    merged: List[Tuple[str, List[str]]] = []
+    for g, c in items:
+        if merged and merged[-1][0] == g:
+            merged[-1] = (g, merged[-1][1] + list(c))
+        else:
+            merged.append((g, list(c)))
+    return merged
+
+
+def plan_entries(items: List[Tuple[str, Payload]], max_len: int = MESSAGE_LIMIT) -> List[Tuple[str, str]]:
+    """发送计划：[(群名, 单段消息)]，与实际发送时的分段一致"""
+    plan: List[Tuple[str, str]] = []
+    for group, payload in items:
+        group = str(group).strip()
+        if group:
+            plan.extend((group, chunk) for chunk in as_chunks(payload, max_len))
+    return plan
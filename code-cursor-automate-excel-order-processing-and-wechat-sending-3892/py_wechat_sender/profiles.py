@@ -0,0 +1,105 @@
+"""字段映射方案：按表头签名缓存用户确认过的映射，同一导出格式下次直接套用"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from py_wechat_sender.orders import REQUIRED_COLUMNS, state_path
+from py_wechat_sender.dedupe import is_order_key_header
+
+
+# 精确匹配不到时按关键字模糊识别，靠前的关键字优先
+MAPPING_KEYWORDS: Dict[str, List[str]] = {
+    "商品信息": ["商品信息", "商品", "产品"],
+    "支付状态": ["支付状态", "付款状态"],
+    "订单状态": ["订单状态"],
+    "收货地址": ["收货地址", "地址", "收货人"],
+    "用户备注": ["用户备注", "备注", "说明"],
+}
+
+
+def _norm(col) -> str:
+    return str(col).replace(" ", "").strip()
+
+
+def header_signature(columns: Sequence) -> str:
+    """规范化后的表头元组的哈希，作为导出格式的标识"""
+    joined = "\x1f".join(_norm(c) for c in columns)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+def infer_mapping(columns: Sequence, targets: Sequence[str] = REQUIRED_COLUMNS) -> Dict[str, Optional[str]]:
+    """模糊识别：先按规范化列名精确查表，再按关键字子串匹配，找不到为 None"""
+    cols = list(columns)
+    by_norm: Dict[str, str] = {}
+    for c in cols:
+        by_norm.setdefault(_norm(c), c)
+    mapping: Dict[str, Optional[str]] = {}
+    for target in targets:
+        found = by_norm.get(_norm(target))
+        if found is None:
+            for word in MAPPING_KEYWORDS.get(target, []):
+                found = next((c for c in cols if word in str(c)), None)
+                if found is not None:
+                    break
+        mapping[target] = found
+    return mapping
+
+
+class MappingProfiles:
+    """表头签名 -> 已确认映射，保存在本地 JSON"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or state_path("mapping_profiles.json")
+        self.profiles: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.profiles = json.load(f)
+            except Exception:
+                self.profiles = {}
+
+    def get(self, columns: Sequence) -> Optional[Dict[str, str]]:
+        """已知格式返回保存的映射（映射的列必须仍在表头中）"""
+        prof = self.profiles.get(header_signature(columns))
+        if not prof:
+            return None
+        names = set(str(c) for c in columns)
+        mapping = prof.get("mapping", {})
+        if not all(v in names for v in mapping.values()):
+            return None
+        return dict(mapping)
+
+    def resolve(self, columns: Sequence, targets: Sequence[str] = REQUIRED_COLUMNS) -> Dict[str, Optional[str]]:
+        """已知格式直接套用，否则回退到模糊识别"""
+        saved = self.get(columns)
+        if saved is not None and all(t in saved for t in targets):
+            return {t: saved[t] for t in targets}
+        return infer_mapping(columns, targets)
+
+    def save(self, columns: Sequence, mapping: Dict[str, str]):
+        sig = header_signature(columns)
+        clean = {k: v for k, v in mapping.items() if v}
+        prof = self.profiles.get(sig)
+        if prof and prof.get("mapping") == clean:
+            return
+        self.profiles[sig] = {
+            "headers": [str(c) for c in columns],
+            "mapping": clean,
+            "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.profiles, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def projection(self, headers: List[str]) -> Optional[List[str]]:
+        """加载时的列投影：已知格式只保留映射列和订单号/下单时间列，未知格式返回 None"""
+        mapping = self.get(headers)
+        if mapping is None:
+            return None
+        keep = list(dict.fromkeys(mapping.values()))
+        keep += [h for h in headers if h not in keep and is_order_key_header(h)]
+        return keep
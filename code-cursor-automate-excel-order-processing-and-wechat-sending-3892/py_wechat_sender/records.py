@@ -0,0 +1,79 @@
+"""紧凑的记录类型：订单与发送任务用 __slots__ 类代替 dict / 元组，群名、类型等重复字符串做驻留"""
+
+import sys
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class OrderRecord:
+    """一条待发订单：编号、格式化后的地址、备注、区域群（未分群为 None）"""
+
+    __slots__ = ("number", "address", "note", "shard")
+
+    def __init__(self, number: int, address: str, note: str = "", shard: Optional[str] = None):
+        self.number = number
+        self.address = address
+        self.note = note
+        self.shard = sys.intern(shard) if shard else None
+
+    def render(self) -> str:
+        text = f"{self.number}\n{self.address}"
+        if self.note:
+            text += f"\n（用户备注：{self.note}）"
+        return text
+
+
+class SendJob:
+    """一条待发消息：目标群、内容、类型（午餐 / 晚餐合并 / 午餐撤回 等）"""
+
+    __slots__ = ("target", "content", "kind")
+
+    def __init__(self, target: str, content: str, kind: str = ""):
+        self.target = sys.intern(str(target))
+        self.content = content
+        self.kind = sys.intern(kind)
+
+
+def _measure(build: Callable[[], list]) -> int:
+    tracemalloc.start()
+    try:
+        data = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del data
+    return size
+
+
+def memory_comparison(n: int = 100000) -> Dict[str, Tuple[int, int]]:
+    """n 条记录下 dict/元组 与 slots 记录的内存（字节），返回 {名称: (旧, 新)} 并打印"""
+    groups = ["午餐群", "晚餐群", "A区配送群", "B区配送群"]
+
+    def address(i: int) -> str:
+        return f"张三-1380000{i % 10000:04d}-幸福小区{i % 50}栋{i % 300}室"
+
+    def order_dicts():
+        return [{"number": i, "shard": "".join(groups[i % 4]), "address": address(i), "user_note": ""}
+                for i in range(n)]
+
+    def order_records():
+        return [OrderRecord(i, address(i), "", "".join(groups[i % 4])) for i in range(n)]
+
+    def job_tuples():
+        return [("".join(groups[i % 4]), address(i), "".join(["午", "餐"])) for i in range(n)]
+
+    def job_records():
+        return [SendJob("".join(groups[i % 4]), address(i), "".join(["午", "餐"])) for i in range(n)]
+
+    # "".join 模拟从表格读出的字符串：每条都是新对象，驻留后才共享
+    result = {
+        "订单": (_measure(order_dicts), _measure(order_records)),
+        "发送任务": (_measure(job_tuples), _measure(job_records)),
+    }
+    for name, (old, new) in result.items():
+        print(f"{name:<6} {n} 条：旧 {old / 1e6:7.2f} MB  新 {new / 1e6:7.2f} MB  节省 {1 - new / old:5.1%}")
+    return result
+
+
+if __name__ == "__main__":
+    memory_comparison()
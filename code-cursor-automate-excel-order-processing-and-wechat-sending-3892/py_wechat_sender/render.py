@@ -0,0 +1,108 @@
+"""订单文本渲染与分段（不依赖 Qt）"""
+
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Union
+
+import pandas as pd
+
+from py_wechat_sender.address import ADDRESS_COLUMN, split_address
+
+
+# 单条微信消息的长度上限（UTF-16 码元）
+MESSAGE_LIMIT = 3500
+
+# 发送内容：整段文本（按行分段）或已分好段的消息序列。
+# 发送前会整体展开一次：预写台账要用完整的发送计划求任务标识，所以发送路径上不做边渲染边发送
+Payload = Union[str, Iterable[str]]
+
+
+def wechat_len(text: str) -> int:
+    """按 UTF-16 码元计长度：微信按此计数，emoji 等 BMP 以外的字符占 2"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def header_line(title: str, product_label: str, start: int) -> str:
+    return f"### {title}（商品信息：{product_label}，编号从{start}开始）"
+
+
+def order_blocks(df: pd.DataFrame, mapping: Dict[str, str], start: int) -> Iterator[str]:
+    """逐条渲染订单，每条为一个不可拆分的块：编号、地址、备注（如有）"""
+    cur = start
+    # 多进程处理过的表已带格式化好的地址列
+    has_addr = ADDRESS_COLUMN in df.columns
+    for _, row in df.iterrows():
+        addr = row[ADDRESS_COLUMN] if has_addr else split_address(str(row.get(mapping["收货地址"], "")))
+        note = str(row.get(mapping["用户备注"], ""))
+        lines = [str(cur), addr]
+        if note.strip():
+            lines.append(f"（用户备注：{note}）")
+        yield "\n".join(lines)
+        cur += 1
+
+
+def build_output(df: pd.DataFrame, mapping: Dict[str, str], start: int, title: str, product_label: str) -> str:
+    return "\n".join(chain([header_line(title, product_label, start)], order_blocks(df, mapping, start)))
+
+
+def _hard_split(line: str, max_len: int) -> Iterator[str]:
+    """单行超长时按码元硬切，不拆开代理对"""
+    piece: List[str] = []
+    size = 0
+    for ch in line:
+        w = 2 if ord(ch) > 0xFFFF else 1
+        if piece and size + w > max_len:
+            yield "".join(piece)
+            piece, size = [], 0
+        piece.append(ch)
+        size += w
+    if piece:
+        yield "".join(piece)
+
+
+def _split_oversized(block: str, max_len: int) -> Iterator[str]:
+    """单个块本身超过上限（极长的地址/备注）：退化为按行、再按码元切分"""
+    lines = chain.from_iterable(
+        _hard_split(line, max_len) if wechat_len(line) > max_len else [line] for line in block.split("\n"))
+    yield from iter_chunks(lines, max_len)
+
+
+def iter_chunks(blocks: Iterable[str], max_len: int = MESSAGE_LIMIT, sep: str = "\n") -> Iterator[str]:
+    """把块流装成消息：块之间用 sep 连接，一个块不会跨两条消息，每条不超过 max_len。
+
+    消费多少渲染多少，第一条消息装满即可产出；所有消息用 sep 拼回即为完整文本。
+    """
+    current: List[str] = []
+    size = 0
+    sep_len = wechat_len(sep)
+    for block in blocks:
+        blen = wechat_len(block)
+        if blen > max_len:
+            if current:
+                yield sep.join(current)
+                current, size = [], 0
+            yield from _split_oversized(block, max_len)
+            continue
+        add = blen + (sep_len if current else 0)
+        if current and size + add > max_len:
+            yield sep.join(current)
+            current, size = [block], blen
+        else:
+            current.append(block)
+            size += add
+    if current:
+        yield sep.join(current)
+
+
+def iter_output_chunks(df: pd.DataFrame, mapping: Dict[str, str], start: int, title: str,
+                       product_label: str, max_len: int = MESSAGE_LIMIT) -> Iterator[str]:
+    """build_output 的流式版本：边渲染边产出可直接发送的消息"""
+    return iter_chunks(chain([header_line(title, product_label, start)], order_blocks(df, mapping, start)), max_len)
+
+
+def split_message_chunks(text: str, max_len: int = MESSAGE_LIMIT) -> List[str]:
+    """已拼好的文本按行分段（每行视为一个块）"""
+    return list(iter_chunks(text.split("\n"), max_len))
+
+
+def as_chunks(payload: Payload, max_len: int = MESSAGE_LIMIT) -> Iterable[str]:
+    return split_message_chunks(payload, max_len) if isinstance(payload, str) else payload
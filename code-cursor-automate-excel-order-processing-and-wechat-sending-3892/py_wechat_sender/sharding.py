@@ -0,0 +1,109 @@
+"""按收货地址区域分群：规则（关键字 / 正则 / 楼栋前缀）一次向量化匹配，每个区域群独立编号
+
+规则保存在本地 shard_rules.json，每条为
+{"group": "A区配送群", "type": "keyword|regex|prefix", "pattern": "...", "meal": "午餐"（可选）}。
+靠前的规则优先；都不匹配的订单仍发到该餐别原来的群。
+"""
+
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from py_wechat_sender.orders import state_path
+from py_wechat_sender.address import address_part
+
+
+# (目标群, 规则类型, 匹配内容, 适用餐别或 None)
+ShardRule = Tuple[str, str, str, Optional[str]]
+
+RULE_TYPES = ("keyword", "regex", "prefix")
+
+EXAMPLE_RULES = [
+    {"group": "A区配送群", "type": "keyword", "pattern": "A座"},
+    {"group": "B区配送群", "type": "regex", "pattern": "B\\d+栋"},
+    {"group": "3号楼配送群", "type": "prefix", "pattern": "3号楼", "meal": "午餐"},
+]
+
+
+def shard_rules_path() -> str:
+    return state_path("shard_rules.json")
+
+
+def load_shard_rules(path: Optional[str] = None, create_example: bool = True) -> List[ShardRule]:
+    """读取分群规则；文件不存在时写一份示例（示例规则不生效，需改成实际的群名和关键字）"""
+    path = path or shard_rules_path()
+    if not os.path.exists(path):
+        if create_example:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"enabled": False, "rules": EXAMPLE_RULES}, f, ensure_ascii=False, indent=1)
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if isinstance(raw, dict):
+        if not raw.get("enabled", True):
+            return []
+        raw = raw.get("rules", [])
+    rules: List[ShardRule] = []
+    for r in raw:
+        kind = str(r.get("type", "keyword")).strip().lower()
+        if kind not in RULE_TYPES:
+            raise ValueError(f"未知的分群规则类型: {kind}（可选: {', '.join(RULE_TYPES)}）")
+        group, pattern = str(r.get("group", "")).strip(), str(r.get("pattern", ""))
+        if kind == "regex":
+            re.compile(pattern)  # 规则写错时在加载阶段就报出来
+        if group and pattern:
+            rules.append((group, kind, pattern, r.get("meal") or None))
+    return rules
+
+
+def compile_shard_rules(rules: Sequence[ShardRule]) -> re.Pattern:
+    """所有规则合成一个锚定在开头的正则：按规则顺序逐个尝试前瞻，第一个命中的规则留下捕获组"""
+    alts = []
+    for i, (_, kind, pattern, _) in enumerate(rules):
+        if kind == "keyword":
+            body = rf".*?(?P<s{i}>{re.escape(pattern)})"
+        elif kind == "prefix":
+            body = rf"(?P<s{i}>{re.escape(pattern)})"
+        else:
+            body = rf".*?(?P<s{i}>(?:{pattern}))"
+        alts.append(f"(?={body})")
+    return re.compile("^(?:" + "|".join(alts) + ")")
+
+
+def assign_shards(df: pd.DataFrame, addr_col: str, rules: Sequence[ShardRule],
+                  meal: Optional[str] = None) -> pd.Series:
+    """每条订单的目标群（未命中为 None），只用适用于该餐别的规则"""
+    active = [r for r in rules if r[3] in (None, meal)]
+    if df.empty or not active:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    areas = pd.Series([address_part(a) for a in df[addr_col].tolist()], index=df.index)
+    parsed = areas.str.extract(compile_shard_rules(active))
+    hits = parsed[[f"s{i}" for i in range(len(active))]].notna()
+    first = hits.to_numpy().argmax(axis=1)
+    groups = pd.Series([active[i][0] for i in first], index=df.index, dtype=object)
+    return groups.where(hits.any(axis=1).to_numpy(), None)
+
+
+def shard_orders(df: pd.DataFrame, addr_col: str, rules: Sequence[ShardRule],
+                 meal: Optional[str] = None) -> List[Tuple[Optional[str], pd.DataFrame]]:
+    """[(目标群或 None, 该群的订单)]，组内保持原顺序；按规则顺序排列，未命中的在最前"""
+    shards = assign_shards(df, addr_col, rules, meal)
+    order: List[Optional[str]] = [None] + list(dict.fromkeys(r[0] for r in rules))
+    out = []
+    for group in order:
+        part = df[shards.isna().to_numpy()] if group is None else df[(shards == group).to_numpy()]
+        if not part.empty:
+            out.append((group, part))
+    return out
+
+
+def group_by_target(items: list, key: Optional[Callable] = None) -> list:
+    """按目标群聚拢发送项（默认取元组第一项），群按首次出现的顺序，群内保持原顺序，减少切换聊天"""
+    key = key or (lambda item: item[0])
+    buckets: Dict[str, list] = {}
+    for item in items:
+        buckets.setdefault(key(item), []).append(item)
+    return [item for bucket in buckets.values() for item in bucket]
@@ -0,0 +1,39 @@
+"""流水线阶段缓存：加载 → 映射 → 筛选分类 → 编号 → 渲染，每个阶段按显式的键记住最近一次结果"""
+
+import os
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple
+
+
+def file_fingerprint(path: str) -> Tuple[str, int, int]:
+    """文件指纹：绝对路径 + 大小 + 修改时间（纳秒）"""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+class StageCache:
+    """按顺序排列的阶段，每个阶段只保留最近一次的 (键, 结果)。
+
+    下游阶段的键应包含上游阶段的键，这样上游参数变化会自然传导到下游；
+    只改下游参数（如起始编号）时上游直接命中缓存。
+    invalidate 某个阶段时，其后的阶段一并失效。
+    """
+
+    def __init__(self, stages: Sequence[str]):
+        self.stages = list(stages)
+        self._entries: Dict[str, Tuple[Hashable, Any]] = {}
+
+    def get(self, stage: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        hit = self._entries.get(stage)
+        if hit is not None and hit[0] == key:
+            return hit[1]
+        value = compute()
+        self._entries[stage] = (key, value)
+        return value
+
+    def invalidate(self, stage: str = None):
+        """不指定阶段时全部失效"""
+        if stage is None:
+            self._entries.clear()
+            return
+        for name in self.stages[self.stages.index(stage):]:
+            self._entries.pop(name, None)
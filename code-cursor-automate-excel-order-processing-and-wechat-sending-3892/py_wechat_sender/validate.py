@@ -0,0 +1,132 @@
+"""发送前检查：对整批待发订单做一次向量化校验，在开始自动化操作之前把问题列出来"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from py_wechat_sender.address import ADDRESS_COLUMN
+from py_wechat_sender.render import MESSAGE_LIMIT
+
+
+# 单条消息的长度上限（与分段发送一致，UTF-16 码元）
+CHUNK_LIMIT = MESSAGE_LIMIT
+# 备注超过这个长度多半是粘贴错了内容
+NOTE_LIMIT = 100
+
+# 格式化后表示“没有地址”的结果
+EMPTY_ADDRESS_FORMS = (" -  - ", "地址信息缺失")
+
+# 先找有效手机号（与 address._MOBILE 一致），找不到时再看有没有像电话的数字串
+_MOBILE_IN = r"(1[3-9]\d{9})"
+_PHONE_LIKE = r"(\d[\d\s-]{5,19}\d)"
+_ASTRAL = "[\U00010000-\U0010FFFF]"
+
+# (问题代码, 说明)，按展示顺序
+ISSUE_KINDS: List[Tuple[str, str]] = [
+    ("empty_address", "地址为空"),
+    ("no_phone", "地址中没有手机号"),
+    ("bad_phone", "手机号不是 11 位有效号码"),
+    ("duplicate", "同一餐别内手机号或地址重复"),
+    ("long_note", f"备注超过 {NOTE_LIMIT} 字"),
+    ("too_long", f"单条订单超过单条消息上限 {CHUNK_LIMIT} 字"),
+]
+
+
+def validate_orders(groups: Dict[str, pd.DataFrame], starts: Dict[str, int], addr_col: str,
+                    note_col: Optional[str] = None, max_len: int = CHUNK_LIMIT,
+                    note_limit: int = NOTE_LIMIT) -> Dict[str, List[str]]:
+    """groups 为 {餐别: 待发订单}（已排序、已展开，可带 __addr__ 列），starts 为各餐别起始编号。
+
+    所有餐别拼成一张表一次性计算各项检查，返回 {问题代码: ["午餐#3", ...]}，只含有问题的项。
+    """
+    parts = []
+    for cat, g in groups.items():
+        if g.empty:
+            continue
+        raw = g[addr_col].fillna("").astype(str) if addr_col in g.columns else pd.Series("", index=g.index)
+        parts.append(pd.DataFrame({
+            "cat": cat,
+            "src": g.index,
+            "number": np.arange(len(g)) + int(starts.get(cat, 1)),
+            "raw": raw.to_numpy(),
+            "addr": (g[ADDRESS_COLUMN] if ADDRESS_COLUMN in g.columns else raw).astype(str).to_numpy(),
+            "note": (g[note_col].fillna("").astype(str).str.strip().to_numpy()
+                     if note_col and note_col in g.columns else ""),
+        }))
+    if not parts:
+        return {}
+    df = pd.concat(parts, ignore_index=True)
+
+    # “姓名-手机号-2号楼” 这类地址里手机号后面的数字不能并进号码，所以先按有效手机号查找
+    mobile = df["raw"].str.extract(_MOBILE_IN, expand=False)
+    phone_like = df["raw"].str.extract(_PHONE_LIKE, expand=False).str.replace(r"\D", "", regex=True)
+    phone = mobile.where(mobile.notna(), phone_like)
+    has_phone = phone.notna()
+    empty = (df["raw"].str.strip() == "") | df["addr"].isin(EMPTY_ADDRESS_FORMS)
+    # 数量 xN 展开出的副本来自同一原始行，不算重复
+    first = ~df.duplicated(["cat", "src"])
+    dup_phone = pd.DataFrame({"cat": df["cat"], "p": phone})[first & has_phone].duplicated(keep=False)
+    dup_addr = df.loc[first & ~empty, ["cat", "addr"]].duplicated(keep=False)
+    duplicate = (dup_phone.reindex(df.index, fill_value=False)
+                 | dup_addr.reindex(df.index, fill_value=False))
+    note_len = df["note"].str.len()
+    # 渲染后的 UTF-16 长度：编号行 + 地址行 + 备注行（“（用户备注：…）”），BMP 以外的字符占 2
+    units = lambda s: s.str.len() + s.str.count(_ASTRAL)  # noqa: E731
+    note_units = units(df["note"])
+    block_len = (df["number"].astype(str).str.len() + 1 + units(df["addr"])
+                 + np.where(note_len > 0, note_units + 8, 0))
+
+    checks = {
+        "empty_address": empty,
+        "no_phone": ~empty & ~has_phone,
+        "bad_phone": mobile.isna() & phone_like.notna(),
+        "duplicate": duplicate,
+        "long_note": note_len > note_limit,
+        "too_long": block_len > max_len,
+    }
+    label = df["cat"] + "#" + df["number"].astype(str)
+    return {code: label[mask].tolist() for code, mask in checks.items() if mask.any()}
+
+
+def format_validation_report(issues: Dict[str, List[str]], limit: int = 10) -> str:
+    if not issues:
+        return ""
+    total = sum(len(v) for v in issues.values())
+    lines = [f"🔎 发送前检查发现 {total} 处问题（建议先修正 Excel 再发送）："]
+    for code, desc in ISSUE_KINDS:
+        labels = issues.get(code)
+        if not labels:
+            continue
+        shown = "、".join(labels[:limit])
+        more = f" 等 {len(labels)} 条" if len(labels) > limit else ""
+        lines.append(f"  {desc}（{len(labels)}）：{shown}{more}")
+    return "\n".join(lines)
+
+
+# (收货地址, 期望的问题代码)，覆盖常见的地址写法
+EXAMPLES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("张三13800000000幸福小区1号", ()),
+    ("李四-13900000000-2号楼", ()),
+    ("张三-13800000000-A座101", ()),
+    ("王五 13700000000 3单元502", ()),
+    ("钱七-1380000000-5号楼", ("bad_phone",)),
+    ("孙八 0571-88886666 文一路", ("bad_phone",)),
+    ("周九 幸福小区", ("no_phone",)),
+    ("", ("empty_address",)),
+]
+
+
+def check_examples(examples: Sequence[Tuple[str, Tuple[str, ...]]] = tuple(EXAMPLES)) -> List[str]:
+    """逐条校验示例地址（每条单独一批，避免互相算作重复），返回与期望不符的说明，全部相符时为空"""
+    mismatches = []
+    for raw, expected in examples:
+        issues = validate_orders({"午餐": pd.DataFrame({"收货地址": [raw]})}, {"午餐": 1}, "收货地址")
+        if tuple(sorted(issues)) != tuple(sorted(expected)):
+            mismatches.append(f"{raw!r}: 期望 {list(expected)}，实际 {sorted(issues)}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    problems = check_examples()
+    print("\n".join(problems) if problems else f"{len(EXAMPLES)} 个示例全部符合")
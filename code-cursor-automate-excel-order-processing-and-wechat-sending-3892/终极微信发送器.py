@@ -10,13 +10,42 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import pandas as pd
 import os
 import sys
-import re
 import time
 import threading
 from datetime import datetime
 import tempfile
 import platform
 
+from py_wechat_sender.orders import effective_mask
+from py_wechat_sender.address import ADDRESS_COLUMN, format_address_compact
+from py_wechat_sender.parallel import parallel_filter_and_classify
+from py_wechat_sender.dedupe import (
+    SeenOrders, find_duplicates, format_duplicate_report, order_hashes, order_key_columns,
+)
+from py_wechat_sender.profiles import MappingProfiles
+from py_wechat_sender.delta import SentSnapshot, format_retractions
+from py_wechat_sender.ledger import LedgerCursor, SendLedger
+from py_wechat_sender.validate import format_validation_report, validate_orders
+from py_wechat_sender.render import iter_chunks, split_message_chunks
+from py_wechat_sender.sharding import group_by_target, load_shard_rules, shard_orders, shard_rules_path
+from py_wechat_sender.records import OrderRecord, SendJob
+from py_wechat_sender.history import OrderHistory
+from py_wechat_sender.export import default_export_name, export_orders
+from py_wechat_sender.driver import DesktopDriver, get_driver
+
+# 本工具的映射键 -> 映射方案中的目标字段
+MAPPING_TARGETS = {
+    'product_info': '商品信息',
+    'payment_status': '支付状态',
+    'order_status': '订单状态',
+    'address': '收货地址',
+    'user_note': '用户备注',
+}
+
+# 发送耗时估算：逐条发送每条消息约需复制、定位输入框、粘贴校验、回车和固定间隔；切换群另计
+SECONDS_PER_MESSAGE = 3.5
+SECONDS_PER_SWITCH = 4.0
+
 # 可选的拖放支持
 try:
     from tkinterdnd2 import DND_FILES, TkinterDnD
@@ -60,6 +89,23 @@ class UltimateWeChatSender:
         self.is_sending = False
         self.stop_sending = False
         self.wechat_hwnd = None
+        # 微信操作驱动：默认 win32 + pyautogui；环境变量 PY_WECHAT_DRIVER=sim 时用模拟微信演练发送流程
+        self.driver = get_driver(progress=self.log) or DesktopDriver(progress=self.log)
+        self.seen_before = {}  # 当天已发送订单的哈希 -> 来源
+        self.pending_seen = {}  # 餐别 -> 本次待发订单的哈希，发送成功后登记
+        self.pending_history = None  # (各餐别有效订单, 键列, 映射)，发送成功后写入历史库
+        self.profiles = MappingProfiles()
+        self.source_columns = []
+        self.source_name = ""
+        # 本次发送的起始编号（增量模式下接续上次）、撤回列表和待提交的增量
+        self.send_starts = {}
+        self.retractions = {}
+        self.pending_deltas = []
+        # 导出用：[(餐别, 区域群, 订单, 起始编号)] 和 (地址列, 备注列)
+        self.export_sections = []
+        self.export_columns = (None, None)
+        self.duplicate_report = ""
+        self.validation_report = ""
         
         # 创建主窗口
         if HAS_DND:
@@ -137,6 +183,18 @@ class UltimateWeChatSender:
         self.test_mode = tk.BooleanVar(value=True)
         ttk.Checkbutton(param_frame, text="测试模式（发送到'末'群）", variable=self.test_mode).grid(row=3, column=0, columnspan=4, sticky=tk.W, pady=(10, 0))
         
+        # 增量模式
+        self.delta_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(param_frame, text="增量模式（只发送上次之后新增的订单，编号接续；列出已取消/退款）", variable=self.delta_mode).grid(row=4, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        
+        # 合并发送：连续编号的订单尽量装进同一条消息（不拆开单条订单）
+        self.pack_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(param_frame, text="合并发送（多条订单合成一条消息，大幅减少发送次数）", variable=self.pack_mode).grid(row=5, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        
+        # 按区域分群：按规则把订单拆到各区域群，各自独立编号
+        self.shard_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(param_frame, text=f"按区域分群发送（规则：{shard_rules_path()}）", variable=self.shard_mode).grid(row=6, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        
         # 预览区域
         preview_frame = ttk.LabelFrame(main_frame, text="📋 订单预览", padding="10")
         preview_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
@@ -154,6 +212,7 @@ class UltimateWeChatSender:
         ttk.Button(preview_frame, text="测试群聊搜索", command=self.test_group_search).grid(row=2, column=0, padx=(0, 5), pady=(5, 0))
         ttk.Button(preview_frame, text="测试发送", command=self.test_send_message).grid(row=2, column=1, padx=5, pady=(5, 0))
         ttk.Button(preview_frame, text="测试输入框定位", command=self.test_input_location).grid(row=2, column=2, padx=(5, 0), pady=(5, 0))
+        ttk.Button(preview_frame, text="导出表格", command=self.export_orders_file).grid(row=2, column=3, padx=(5, 0), pady=(5, 0))
         
         # 状态栏
         self.status_var = tk.StringVar(value="就绪")
@@ -199,8 +258,17 @@ class UltimateWeChatSender:
             # 使用强化的Excel读取方法
             df = self._load_dataframe(file_path)
             
+            # 已知表头格式只保留映射列（及订单号/下单时间列）
+            self.source_columns = [str(c).strip() for c in df.columns]
+            keep = self.profiles.projection(self.source_columns)
+            if keep is not None:
+                keep = set(keep)
+                df = df[[c for c, h in zip(df.columns, self.source_columns) if h in keep]]
+            
             self.data = df.values.tolist()
             self.columns = df.columns.tolist()
+            self.source_name = os.path.basename(file_path)
+            self.seen_before = SeenOrders().snapshot()
             
             self.log(f"✅ 成功加载 {len(self.data)} 行数据，{len(self.columns)} 列")
             self.file_label.config(text=f"已加载: {os.path.basename(file_path)} ({len(self.data)}行)")
@@ -356,8 +424,12 @@ class UltimateWeChatSender:
             self.dinner_order_list = dinner_orders
             
             # 生成输出文本用于预览
-            self.lunch_orders = self._generate_output(lunch_orders, int(self.lunch_start.get()), "午餐", "明日午餐 x1")
-            self.dinner_orders = self._generate_output(dinner_orders, int(self.dinner_start.get()), "晚餐", "明日晚餐 x1")
+            self.lunch_orders = self._generate_output(lunch_orders, self.send_starts['午餐'], "午餐", "明日午餐 x1")
+            self.dinner_orders = self._generate_output(dinner_orders, self.send_starts['晚餐'], "晚餐", "明日晚餐 x1")
+            if self.retractions.get('午餐'):
+                self.lunch_orders = (self.lunch_orders + "\n\n" + self.retractions['午餐']).strip()
+            if self.retractions.get('晚餐'):
+                self.dinner_orders = (self.dinner_orders + "\n\n" + self.retractions['晚餐']).strip()
             
             # 显示预览 - 根据选择显示对应订单
             self.preview_text.delete(1.0, tk.END)
@@ -378,6 +450,11 @@ class UltimateWeChatSender:
             else:
                 self.preview_text.insert(tk.END, "【未选择发送任何订单】\n\n")
             
+            if self.duplicate_report:
+                self.preview_text.insert(tk.END, self.duplicate_report + "\n\n")
+            if self.validation_report:
+                self.preview_text.insert(tk.END, self.validation_report + "\n\n")
+            
             # 显示午餐订单（如果选中）
             if self.send_lunch.get() and self.lunch_orders.strip():
                 target_group = "末" if self.test_mode.get() else self.lunch_group.get()
@@ -411,22 +488,27 @@ class UltimateWeChatSender:
             messagebox.showerror("错误", error_msg)
             self.status_var.set("处理失败")
     
+    def _record_history(self, groups, key_cols, mapping):
+        """有效订单写入历史库，便于跨天查询；写入失败只记日志"""
+        try:
+            history = OrderHistory()
+            try:
+                added = history.record_groups(groups, key_cols, mapping['address'], mapping['product_info'],
+                                              mapping.get('user_note'), source=self.source_name)
+            finally:
+                history.close()
+            if added:
+                self.log(f"🗂️ 历史订单库新增 {added} 条")
+        except Exception as e:
+            self.log(f"⚠️ 写入历史订单库失败: {e}")
+    
     def _detect_columns(self):
         """自动检测列名"""
-        mapping = {}
-        keywords = {
-            'product_info': ['商品信息', '商品', '产品'],
-            'payment_status': ['支付状态', '付款状态'],
-            'order_status': ['订单状态'],
-            'address': ['收货地址', '地址', '收货人'],
-            'user_note': ['用户备注', '备注', '说明']
-        }
-        
-        for key, words in keywords.items():
-            for col in self.columns:
-                if any(word in str(col) for word in words):
-                    mapping[key] = col
-                    break
+        # 已保存过该表头格式的映射则直接套用，否则按关键字识别
+        found = self.profiles.resolve(self.source_columns or self.columns)
+        names = set(self.columns)
+        mapping = {key: found[target] for key, target in MAPPING_TARGETS.items()
+                   if found.get(target) in names}
         
         required = ['product_info', 'payment_status', 'address']
         for req in required:
@@ -441,65 +523,94 @@ class UltimateWeChatSender:
         df = df.fillna("")
         df['__row__'] = range(len(df))
         
-        # 筛选已支付订单
-        payment_col = mapping['payment_status']
-        paid_orders = df[df[payment_col].astype(str).str.strip() == '已支付']
-        
-        # 排除无效订单
-        def is_valid_order(row):
-            payment_status = str(row[payment_col]).strip()
-            order_status = str(row.get(mapping.get('order_status', ''), '')).strip()
-            
-            if payment_status in ['未支付', '已退款']:
-                return False
-            if order_status in ['已取消', '用户申请退款']:
-                return False
-            return True
-        
-        valid_orders = paid_orders[paid_orders.apply(is_valid_order, axis=1)]
-        
-        # 按商品信息分类
-        product_col = mapping['product_info']
-        lunch_orders = valid_orders[valid_orders[product_col].astype(str).str.contains('明日午餐', na=False)]
-        dinner_orders = valid_orders[valid_orders[product_col].astype(str).str.contains('明日晚餐', na=False)]
-        
-        # 按行号倒序排列
-        lunch_orders = lunch_orders.sort_values('__row__', ascending=False)
-        dinner_orders = dinner_orders.sort_values('__row__', ascending=False)
-        
-        # 转换为列表格式
-        def to_order_list(orders_df):
+        # 排除重复订单（同一文件内重复、或今日已发送过）
+        eff = df[effective_mask(df, mapping['payment_status'], mapping.get('order_status'))]
+        key_cols = order_key_columns(eff, mapping['address'], mapping['product_info'], mapping.get('user_note'))
+        dup, notes = find_duplicates(eff, key_cols, self.seen_before)
+        self.duplicate_report = format_duplicate_report(notes)
+        if notes:
+            self.log(f"⚠️ 排除重复订单 {len(notes)} 条")
+        df = df.drop(index=eff.index[dup])
+        
+        # 一次筛选+分类（支付/订单状态过滤、商品与数量解析、按餐别分组）并格式化地址，大表自动多进程
+        groups = parallel_filter_and_classify(
+            df,
+            product_col=mapping['product_info'],
+            pay_col=mapping['payment_status'],
+            status_col=mapping.get('order_status'),
+            addr_col=mapping['address'],
+            formatter=format_address_compact,
+        )
+        self.pending_history = (groups, key_cols, mapping)
+        lunch_orders = groups['午餐']
+        dinner_orders = groups['晚餐']
+        
+        self.send_starts = {'午餐': int(self.lunch_start.get()), '晚餐': int(self.dinner_start.get())}
+        self.retractions = {}
+        self.pending_deltas = []
+        if self.delta_mode.get():
+            # 增量模式：只保留上次发送之后的新增订单，编号接续，并列出已取消/退款的订单
+            snapshot = SentSnapshot()
+            frames = {'午餐': lunch_orders, '晚餐': dinner_orders}
+            for meal, orders in frames.items():
+                d = snapshot.compute(meal, orders, df, key_cols, self.send_starts[meal],
+                                     mapping['payment_status'], mapping.get('order_status'))
+                self.pending_deltas.append(d)
+                frames[meal] = d.new
+                self.send_starts[meal] = d.start
+                self.retractions[meal] = format_retractions(
+                    f"{meal}撤回", d.retracted, lambda row: self._format_address(str(row[mapping['address']])))
+                self.log(f"📈 {meal}增量: 新增{len(d.new)}条, 撤回{len(d.retracted)}条, 编号从{d.start}开始")
+            lunch_orders, dinner_orders = frames['午餐'], frames['晚餐']
+        # 按本次使用的映射求哈希，发送成功后才登记为已发送
+        self.pending_seen = {'午餐': order_hashes([lunch_orders], key_cols),
+                             '晚餐': order_hashes([dinner_orders], key_cols)}
+        
+        # 按区域分群：每个区域群一份，各自从起始编号开始；未命中规则的仍发原群
+        rules = []
+        if self.shard_mode.get():
+            if self.delta_mode.get():
+                raise RuntimeError("按区域分群暂不支持与增量模式同时使用")
+            rules = load_shard_rules()
+            if not rules:
+                raise RuntimeError(f"未配置分群规则：请编辑 {shard_rules_path()}，填写规则并把 enabled 设为 true")
+        shards = {}
+        for meal, orders in (('午餐', lunch_orders), ('晚餐', dinner_orders)):
+            shards[meal] = shard_orders(orders, mapping['address'], rules, meal) if rules else [(None, orders)]
+            for group, part in shards[meal]:
+                if group:
+                    self.log(f"🗺️ {meal} → {group}: {len(part)}条")
+        
+        # 发送前检查：整批待发订单一次校验
+        checked = {(f"{meal}·{group}" if group else meal): part for meal in shards for group, part in shards[meal]}
+        issues = validate_orders(checked, {name: self.send_starts[name.split("·")[0]] for name in checked},
+                                 mapping['address'], mapping.get('user_note'))
+        self.validation_report = format_validation_report(issues)
+        if issues:
+            self.log(f"🔎 发送前检查发现 {sum(len(v) for v in issues.values())} 处问题")
+        
+        self.export_sections = [(meal, group, part, self.send_starts[meal])
+                                for meal in shards for group, part in shards[meal]]
+        self.export_columns = (mapping['address'], mapping.get('user_note'))
+        
+        # 转换为列表格式（编号在各区域群内独立）
+        def to_order_list(meal):
             order_list = []
-            for _, row in orders_df.iterrows():
-                order_list.append({
-                    'address': self._format_address(str(row[mapping['address']])),
-                    'user_note': str(row.get(mapping.get('user_note', ''), '')).strip()
-                })
+            for group, part in shards[meal]:
+                for i, (_, row) in enumerate(part.iterrows()):
+                    order_list.append(OrderRecord(
+                        self.send_starts[meal] + i,
+                        row[ADDRESS_COLUMN],
+                        str(row.get(mapping.get('user_note', ''), '')).strip(),
+                        group,
+                    ))
             return order_list
         
-        return to_order_list(lunch_orders), to_order_list(dinner_orders)
+        return to_order_list('午餐'), to_order_list('晚餐')
     
     def _format_address(self, address):
         """格式化地址"""
-        address = str(address).strip()
-        if not address:
-            return "地址信息缺失"
-        
-        if re.match(r'^[^-]+-[^-]+-', address):
-            return address
-        
-        phone_pattern = r'1[3-9]\d{9}'
-        phone_match = re.search(phone_pattern, address)
-        
-        if phone_match:
-            phone = phone_match.group()
-            parts = address.split(phone)
-            if len(parts) >= 2:
-                name = parts[0].strip(' -')
-                addr = phone.join(parts[1:]).strip(' -')
-                return f"{name}-{phone}-{addr}"
-        
-        return address
+        return format_address_compact(address)
     
     def _generate_output(self, orders, start_num, title, product_label):
         """生成输出文本"""
@@ -509,10 +620,9 @@ class UltimateWeChatSender:
         lines = []
         
         for i, order in enumerate(orders):
-            lines.append(str(start_num + i))
-            lines.append(order['address'])
-            if order['user_note']:
-                lines.append(f"（用户备注：{order['user_note']}）")
+            if order.shard and (i == 0 or orders[i - 1].shard != order.shard):
+                lines.append(f"【→ {order.shard}】")
+            lines.append(order.render())
             if i < len(orders) - 1:  # 不是最后一个订单时添加空行
                 lines.append("")
         
@@ -520,7 +630,7 @@ class UltimateWeChatSender:
     
     def test_wechat_window(self):
         """测试微信窗口"""
-        if not HAS_WIN32:
+        if self.driver.requires_windows and not HAS_WIN32:
             messagebox.showerror("错误", "需要安装 pywin32 包")
             return
         
@@ -531,7 +641,7 @@ class UltimateWeChatSender:
             hwnd = self._find_wechat_window()
             if hwnd:
                 self.wechat_hwnd = hwnd
-                window_title = win32gui.GetWindowText(hwnd)
+                window_title = self.driver.read_title()
                 self.log(f"✅ 找到微信窗口: {window_title}")
                 messagebox.showinfo("测试成功", f"微信窗口已找到!\n窗口标题: {window_title}")
                 self.status_var.set("微信窗口正常")
@@ -547,74 +657,14 @@ class UltimateWeChatSender:
             self.status_var.set("测试失败")
     
     def _find_wechat_window(self):
-        """查找微信窗口 - 改进版"""
-        if not HAS_WIN32:
-            return None
-        
-        def enum_windows_callback(hwnd, windows):
-            try:
-                if not win32gui.IsWindowVisible(hwnd):
-                    return True
-                
-                window_text = win32gui.GetWindowText(hwnd)
-                class_name = win32gui.GetClassName(hwnd)
-                
-                # 更准确的微信窗口识别
-                wechat_indicators = [
-                    ("WeChatMainWndForPC" in class_name, "主窗口类名"),
-                    ("微信" in window_text and len(window_text) < 10, "窗口标题"),
-                    ("WeChat" in window_text and "PC" not in window_text, "英文标题"),
-                    (class_name.startswith("Qt") and "微信" in window_text, "Qt框架窗口"),
-                    (class_name == "Chrome_WidgetWin_1" and "微信" in window_text, "Chrome内核窗口")
-                ]
-                
-                # 计算匹配度
-                match_score = 0
-                match_reasons = []
-                for condition, reason in wechat_indicators:
-                    if condition:
-                        match_score += 1
-                        match_reasons.append(reason)
-                
-                if match_score > 0:
-                    # 排除一些明显不是主窗口的
-                    if any(keyword in window_text.lower() for keyword in ['update', 'installer', 'setup']):
-                        return True
-                    
-                    windows.append((hwnd, window_text, class_name, match_score, match_reasons))
-                    
-            except Exception:
-                pass  # 忽略获取窗口信息时的异常
-            
-            return True
-        
-        windows = []
-        win32gui.EnumWindows(enum_windows_callback, windows)
-        
-        if not windows:
-            self.log("❌ 未找到任何微信窗口")
+        """查找微信窗口，返回窗口句柄（模拟驱动没有句柄，返回 True）；找不到返回 None"""
+        if not self.driver.find_window():
             return None
-        
-        # 按匹配度排序，选择最佳匹配
-        windows.sort(key=lambda x: x[3], reverse=True)
-        
-        for hwnd, title, class_name, score, reasons in windows:
-            try:
-                # 验证窗口是否真的可用
-                if win32gui.IsWindow(hwnd) and win32gui.IsWindowEnabled(hwnd):
-                    self.log(f"✅ 找到微信窗口: {title}")
-                    self.log(f"   类名: {class_name}")
-                    self.log(f"   匹配度: {score} ({', '.join(reasons)})")
-                    return hwnd
-            except Exception:
-                continue
-        
-        self.log("❌ 找到微信窗口但都不可用")
-        return None
+        return getattr(self.driver, "hwnd", None) or True
     
     def test_group_search(self):
         """测试群聊搜索功能"""
-        if not HAS_AUTO:
+        if self.driver.requires_windows and not HAS_AUTO:
             messagebox.showerror("错误", "需要安装 pyautogui 和 pyperclip 包")
             return
         
@@ -661,7 +711,7 @@ class UltimateWeChatSender:
     
     def test_send_message(self):
         """测试发送消息功能"""
-        if not HAS_AUTO:
+        if self.driver.requires_windows and not HAS_AUTO:
             messagebox.showerror("错误", "需要安装 pyautogui 和 pyperclip 包")
             return
         
@@ -715,7 +765,7 @@ class UltimateWeChatSender:
     
     def test_input_location(self):
         """测试输入框定位功能"""
-        if not HAS_AUTO:
+        if self.driver.requires_windows and not HAS_AUTO:
             messagebox.showerror("错误", "需要安装 pyautogui 和 pyperclip 包")
             return
         
@@ -820,7 +870,7 @@ class UltimateWeChatSender:
             messagebox.showwarning("警告", "请先处理订单数据")
             return
         
-        if not HAS_AUTO:
+        if self.driver.requires_windows and not HAS_AUTO:
             messagebox.showerror("错误", "需要安装 pyautogui 和 pyperclip 包")
             return
         
@@ -831,11 +881,11 @@ class UltimateWeChatSender:
         
         # 生成确认信息
         send_items = []
-        if self.send_lunch.get() and hasattr(self, 'lunch_order_list') and self.lunch_order_list:
+        if self.send_lunch.get() and hasattr(self, 'lunch_order_list') and (self.lunch_order_list or self.retractions.get('午餐')):
             target = "末" if self.test_mode.get() else self.lunch_group.get()
             send_items.append(f"午餐订单({len(self.lunch_order_list)}条) → {target}")
         
-        if self.send_dinner.get() and hasattr(self, 'dinner_order_list') and self.dinner_order_list:
+        if self.send_dinner.get() and hasattr(self, 'dinner_order_list') and (self.dinner_order_list or self.retractions.get('晚餐')):
             target = "末" if self.test_mode.get() else self.dinner_group.get()
             send_items.append(f"晚餐订单({len(self.dinner_order_list)}条) → {target}")
         
@@ -843,7 +893,15 @@ class UltimateWeChatSender:
             messagebox.showwarning("警告", "没有可发送的订单数据")
             return
         
+        items = self._build_send_items()
+        messages, seconds = self._estimate_send(items)
+        send_items.append(f"\n预计发送 {messages} 条消息，约 {seconds / 60:.1f} 分钟"
+                          + ("（合并发送）" if self.pack_mode.get() else "（逐条发送，可勾选“合并发送”加快）"))
         send_info = "\n".join(send_items)
+        if self.duplicate_report:
+            send_info += "\n\n" + self.duplicate_report
+        if self.validation_report:
+            send_info += "\n\n" + self.validation_report
         
         result = messagebox.askyesno("确认发送", 
             f"即将发送以下订单：\n\n{send_info}\n\n"
@@ -857,45 +915,75 @@ class UltimateWeChatSender:
         if not result:
             return
         
+        # 台账中有同一任务的完成记录：询问是否从断点继续
+        plan = [(job.target, job.content) for job in items]
+        run_id = SendLedger.make_run_id(plan)
+        done = SendLedger().done_count(run_id)
+        if done >= len(plan) > 0:
+            if not messagebox.askyesno("已发送过", f"这些订单今天已全部发送过（共 {len(plan)} 条）。\n\n是否重新发送？"):
+                return
+            run_id = SendLedger.fresh_run_id(run_id)
+        elif done:
+            ans = messagebox.askyesnocancel("断点续发",
+                f"检测到上次未完成的发送（已完成 {done}/{len(plan)} 条）。\n\n"
+                "是：从第一条未发送的继续\n否：全部重新发送")
+            if ans is None:
+                return
+            if not ans:
+                run_id = SendLedger.fresh_run_id(run_id)
+        
         # 在新线程中执行发送
         self.is_sending = True
         self.stop_sending = False
-        thread = threading.Thread(target=self._send_orders_thread, daemon=True)
+        thread = threading.Thread(target=self._send_orders_thread, args=(items, run_id), daemon=True)
         thread.start()
     
-    def _send_orders_thread(self):
+    def _build_send_items(self):
+        """按用户选择生成发送任务 [SendJob]，同一个群的任务排在一起以减少切换"""
+        items = []
+        if self.send_lunch.get() and hasattr(self, 'lunch_order_list'):
+            items.extend(self._meal_send_items('午餐', self.lunch_order_list, self.lunch_group.get()))
+        if self.send_dinner.get() and hasattr(self, 'dinner_order_list'):
+            items.extend(self._meal_send_items('晚餐', self.dinner_order_list, self.dinner_group.get()))
+        return group_by_target(items, key=lambda job: job.target)
+    
+    def _meal_send_items(self, meal, order_list, meal_group):
+        """单个餐别的发送项目：按目标群（区域群或餐别群）归集，逐条或合并成消息"""
+        items = []
+        default_target = "末" if self.test_mode.get() else meal_group
+        self.log(f"📋 准备{meal}订单: {len(order_list)}条 → {default_target}")
+        by_target = {}
+        for order in order_list:
+            target = default_target if self.test_mode.get() else (order.shard or meal_group)
+            by_target.setdefault(target, []).append(order.render())
+        for target, order_texts in by_target.items():
+            if self.pack_mode.get():
+                items.extend(SendJob(target, chunk, f"{meal}合并") for chunk in iter_chunks(order_texts, sep="\n\n"))
+            else:
+                items.extend(SendJob(target, text, meal) for text in order_texts)
+        if self.retractions.get(meal):
+            items.extend(SendJob(default_target, chunk, f"{meal}撤回")
+                         for chunk in split_message_chunks(self.retractions[meal]))
+        return items
+    
+    def _estimate_send(self, items):
+        """预计消息条数和耗时（秒）"""
+        switches = sum(1 for i, job in enumerate(items) if i == 0 or job.target != items[i - 1].target)
+        return len(items), len(items) * SECONDS_PER_MESSAGE + switches * SECONDS_PER_SWITCH
+    
+    def _send_orders_thread(self, items, run_id):
         """发送订单的线程函数"""
         try:
             self.log("🚀 开始直接发送到微信...")
             self.status_var.set("正在直接发送到微信...")
             
-            # 准备发送项目 - 根据用户选择发送
-            items = []
-            
-            # 处理午餐订单（如果选中）
-            if self.send_lunch.get() and hasattr(self, 'lunch_order_list') and self.lunch_order_list:
-                target_group = "末" if self.test_mode.get() else self.lunch_group.get()
-                self.log(f"📋 准备午餐订单: {len(self.lunch_order_list)}条 → {target_group}")
-                for i, order in enumerate(self.lunch_order_list):
-                    order_text = str(int(self.lunch_start.get()) + i) + "\n" + order['address']
-                    if order['user_note']:
-                        order_text += f"\n（用户备注：{order['user_note']}）"
-                    items.append((target_group, order_text, "午餐"))
-            
-            # 处理晚餐订单（如果选中）
-            if self.send_dinner.get() and hasattr(self, 'dinner_order_list') and self.dinner_order_list:
-                target_group = "末" if self.test_mode.get() else self.dinner_group.get()
-                self.log(f"📋 准备晚餐订单: {len(self.dinner_order_list)}条 → {target_group}")
-                for i, order in enumerate(self.dinner_order_list):
-                    order_text = str(int(self.dinner_start.get()) + i) + "\n" + order['address']
-                    if order['user_note']:
-                        order_text += f"\n（用户备注：{order['user_note']}）"
-                    items.append((target_group, order_text, "晚餐"))
-            
             if not items:
                 self.status_var.set("没有订单需要发送")
                 return
             
+            # 写入发送计划（预写台账），已完成的条目在下面跳过
+            cursor = LedgerCursor(SendLedger(), run_id, [(job.target, job.content) for job in items])
+            
             # 确保微信窗口激活
             if not self._activate_wechat():
                 self.log("❌ 无法激活微信窗口")
@@ -904,20 +992,21 @@ class UltimateWeChatSender:
             
             # 一条一条发送
             current_group = None
-            lunch_count = 0
-            dinner_count = 0
+            counts = {}
+            failed = 0
             
-            for i, (group, content, meal_type) in enumerate(items):
+            for i, job in enumerate(items):
+                group, content, meal_type = job.target, job.content, job.kind
                 if self.stop_sending:
                     break
                 
-                # 统计发送数量
-                if meal_type == "午餐":
-                    lunch_count += 1
-                    order_num = lunch_count
-                else:
-                    dinner_count += 1
-                    order_num = dinner_count
+                # 统计发送数量（按类型分别计数：逐条订单、合并消息、撤回列表）
+                counts[meal_type] = counts.get(meal_type, 0) + 1
+                order_num = counts[meal_type]
+                
+                if not cursor.should_send(group, content):
+                    self.log(f"⏭️ {meal_type}第{order_num}条此前已发送，跳过")
+                    continue
                 
                 # 如果切换群，需要重新搜索
                 if current_group != group:
@@ -926,6 +1015,7 @@ class UltimateWeChatSender:
                     success = self._switch_to_group(group)
                     if not success:
                         self.log(f"❌ 切换群失败: {group}")
+                        failed += 1
                         continue
                     current_group = group
                     time.sleep(0.5)
@@ -936,8 +1026,10 @@ class UltimateWeChatSender:
                 success = self._send_single_order(content)
                 
                 if success:
+                    cursor.done(group, content)
                     self.log(f"✅ {meal_type}第{order_num}条发送成功")
                 else:
+                    failed += 1
                     self.log(f"❌ {meal_type}第{order_num}条发送失败")
                 
                 # 间隔1-1.5秒
@@ -945,8 +1037,20 @@ class UltimateWeChatSender:
                     time.sleep(1.2)
             
             if not self.stop_sending:
-                self.log("✅ 所有订单发送完成!")
-                self.status_var.set("发送完成")
+                # 全部发到真实群后才更新增量快照；有失败、只发到测试群或中途停止时下次仍按原快照计算
+                if self.pending_deltas and not failed and not self.test_mode.get():
+                    snapshot = SentSnapshot()
+                    for d in self.pending_deltas:
+                        if (d.category == '午餐' and self.send_lunch.get()) or (d.category == '晚餐' and self.send_dinner.get()):
+                            snapshot.commit(d)
+                    self.pending_deltas = []
+                self._register_sent_orders(failed)
+                if failed:
+                    self.log(f"⚠️ 发送结束，{failed} 条失败，可再次发送补发（已发送的按台账跳过）")
+                    self.status_var.set(f"发送结束，{failed} 条失败")
+                else:
+                    self.log("✅ 所有订单发送完成!")
+                    self.status_var.set("发送完成")
             else:
                 self.log("⏹️ 发送已停止")
                 self.status_var.set("发送已停止")
@@ -958,344 +1062,84 @@ class UltimateWeChatSender:
         finally:
             self.is_sending = False
     
+    def _register_sent_orders(self, failed):
+        """全部发送成功后登记本次发出的订单，之后的导出中再出现按重复排除，并把发出餐别的有效订单写入历史库；
+        测试群发送不登记也不入库"""
+        if failed or self.test_mode.get():
+            return
+        meals = [meal for meal, on in (('午餐', self.send_lunch.get()), ('晚餐', self.send_dinner.get())) if on]
+        hashes = [h for meal in meals for h in self.pending_seen.get(meal, [])]
+        if hashes:
+            seen = SeenOrders()
+            seen.register(hashes, f"{self.source_name}（{datetime.now().strftime('%H:%M')}）")
+            self.seen_before = seen.snapshot()
+        self.pending_seen = {}
+        if self.pending_history:
+            groups, key_cols, mapping = self.pending_history
+            self._record_history({meal: groups[meal] for meal in meals}, key_cols, mapping)
+            self.pending_history = None
+    
     def _activate_wechat(self):
-        """激活微信窗口 - 改进版"""
+        """找到并激活微信窗口（窗口查找、置顶和前台切换由驱动完成）"""
         try:
-            # 重新查找微信窗口，确保窗口仍然有效
             self.wechat_hwnd = self._find_wechat_window()
-            
             if not self.wechat_hwnd:
                 self.log("❌ 未找到微信窗口")
                 return False
-            
-            # 检查窗口是否仍然有效
-            try:
-                if not win32gui.IsWindow(self.wechat_hwnd):
-                    self.log("⚠️ 微信窗口句柄无效，重新查找")
-                    self.wechat_hwnd = self._find_wechat_window()
-                    if not self.wechat_hwnd:
-                        return False
-            except:
-                self.wechat_hwnd = self._find_wechat_window()
-                if not self.wechat_hwnd:
-                    return False
-            
-            # 多步骤激活窗口
-            try:
-                # 1. 先恢复窗口（如果被最小化）
-                win32gui.ShowWindow(self.wechat_hwnd, win32con.SW_RESTORE)
-                time.sleep(0.3)
-                
-                # 2. 将窗口置顶
-                win32gui.SetWindowPos(self.wechat_hwnd, win32con.HWND_TOP, 0, 0, 0, 0, 
-                                    win32con.SWP_NOMOVE | win32con.SWP_NOSIZE | win32con.SWP_SHOWWINDOW)
-                time.sleep(0.3)
-                
-                # 3. 设置为前台窗口
-                win32gui.SetForegroundWindow(self.wechat_hwnd)
-                time.sleep(0.5)
-                
-                # 4. 验证窗口是否真的在前台
-                current_window = win32gui.GetForegroundWindow()
-                if current_window != self.wechat_hwnd:
-                    self.log("⚠️ 微信窗口可能未完全激活，但继续尝试")
-                else:
-                    self.log("✅ 微信窗口已成功激活")
-                
-            except Exception as e:
-                self.log(f"⚠️ 窗口激活过程中出现异常: {e}")
-                # 尝试备用方法
-                try:
-                    win32gui.SetForegroundWindow(self.wechat_hwnd)
-                    time.sleep(0.5)
-                except:
-                    pass
-            
-            return True
-            
+            return self.driver.activate()
         except Exception as e:
             self.log(f"❌ 激活微信窗口失败: {str(e)}")
             return False
     
     def _switch_to_group(self, group):
-        """切换到指定群 - 改进版"""
+        """切换到指定群"""
         try:
-            self.log(f"🔍 搜索群聊: {group}")
-            
-            # 多次尝试打开搜索框
-            for attempt in range(3):
-                try:
-                    pyautogui.hotkey('ctrl', 'f')
-                    time.sleep(0.8)
-                    break
-                except Exception as e:
-                    if attempt == 2:
-                        raise e
-                    time.sleep(0.5)
-            
-            # 确保搜索框激活并清空
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.3)
-            pyautogui.press('delete')
-            time.sleep(0.2)
-            
-            # 输入群名 - 分步骤确保准确
-            pyperclip.copy(group)
-            time.sleep(0.2)
-            pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.8)
-            
-            # 验证输入内容
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.2)
-            pyautogui.hotkey('ctrl', 'c')
-            time.sleep(0.2)
-            
-            # 检查剪贴板内容是否正确
-            try:
-                clipboard_content = pyperclip.paste()
-                if clipboard_content != group:
-                    self.log(f"⚠️ 剪贴板内容不匹配，重新输入")
-                    pyautogui.hotkey('ctrl', 'a')
-                    time.sleep(0.2)
-                    pyperclip.copy(group)
-                    time.sleep(0.2)
-                    pyautogui.hotkey('ctrl', 'v')
-                    time.sleep(0.5)
-            except:
-                pass
-            
-            # 按回车进入群聊
-            pyautogui.press('enter')
-            time.sleep(2.0)  # 增加等待时间确保进入
-            
-            self.log(f"✅ 成功切换到群: {group}")
-            return True
-            
+            return self.driver.enter_chat(group)
         except Exception as e:
             self.log(f"❌ 切换到群 {group} 失败: {str(e)}")
             return False
     
     def _send_single_order(self, content):
-        """发送单条订单 - 智能输入框识别版"""
+        """发送单条订单：定位输入框 → 粘贴 → 回车"""
         try:
-            # 复制内容到剪贴板并验证
-            pyperclip.copy(content)
-            time.sleep(0.3)
-            
-            # 验证剪贴板内容
-            try:
-                clipboard_check = pyperclip.paste()
-                if clipboard_check != content:
-                    self.log("⚠️ 剪贴板验证失败，重新复制")
-                    pyperclip.copy(content)
-                    time.sleep(0.3)
-            except:
-                pass
-            
-            # 尝试找到输入框位置
-            input_position = self._find_input_box_position()
-            
-            if input_position:
-                x, y = input_position
-                self.log(f"🎯 找到输入框位置: ({x}, {y})")
-                pyautogui.click(x, y)
-                time.sleep(0.4)
-            else:
-                self.log("⚠️ 未找到输入框，使用智能点击策略")
-                # 使用智能点击策略
-                success = self._smart_click_input_area()
-                if not success:
-                    self.log("⚠️ 智能点击也失败，使用默认位置")
-                    screen_width, screen_height = pyautogui.size()
-                    pyautogui.click(screen_width // 2, int(screen_height * 0.85))
-                    time.sleep(0.4)
-            
-            # 清空输入框 - 多次尝试确保清空
-            for attempt in range(2):
-                try:
-                    pyautogui.hotkey('ctrl', 'a')
-                    time.sleep(0.2)
-                    pyautogui.press('delete')
-                    time.sleep(0.2)
-                    break
-                except:
-                    time.sleep(0.3)
-            
-            # 粘贴内容
-            pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.5)
-            
-            # 验证粘贴是否成功
-            try:
-                pyautogui.hotkey('ctrl', 'a')
-                time.sleep(0.2)
-                pyautogui.hotkey('ctrl', 'c')
-                time.sleep(0.2)
-                pasted_content = pyperclip.paste()
-                if content not in pasted_content:
-                    self.log("⚠️ 粘贴验证失败，但继续发送")
-            except:
-                pass
-            
-            # 发送消息
-            pyautogui.press('enter')
-            time.sleep(0.3)
-            
-            return True
-            
+            return self.driver.send_text(content)
         except Exception as e:
             self.log(f"❌ 发送单条订单失败: {str(e)}")
             return False
     
-    def _find_input_box_position(self):
-        """查找微信输入框的实际位置"""
-        try:
-            # 方法1: 尝试使用控件识别（如果可用）
-            position = self._find_input_by_control()
-            if position:
-                return position
-            
-            # 方法2: 基于窗口位置的智能估算
-            position = self._find_input_by_window_calc()
-            if position:
-                return position
-            
-            return None
-            
-        except Exception as e:
-            self.log(f"⚠️ 查找输入框位置失败: {e}")
-            return None
-    
     def _find_input_by_control(self):
-        """通过控件识别查找输入框"""
-        try:
-            # 尝试导入uiautomation
-            try:
-                import uiautomation as auto
-            except:
-                return None
-            
-            if not self.wechat_hwnd:
-                return None
-            
-            # 通过句柄创建窗口控件
-            main_window = auto.WindowControl(handle=self.wechat_hwnd)
-            if not main_window.Exists():
-                return None
-            
-            # 查找编辑控件（输入框）
-            edit_controls = main_window.EditControls()
-            if not edit_controls:
-                return None
-            
-            # 通常最后一个编辑控件是消息输入框
-            for edit_ctrl in reversed(edit_controls):
-                try:
-                    rect = edit_ctrl.BoundingRectangle
-                    if rect.width() > 100 and rect.height() > 20:  # 输入框应该有一定大小
-                        center_x = rect.left + rect.width() // 2
-                        center_y = rect.top + rect.height() // 2
-                        self.log(f"🎯 通过控件找到输入框: ({center_x}, {center_y})")
-                        return (center_x, center_y)
-                except Exception:
-                    continue
-            
-            return None
-            
-        except Exception as e:
-            self.log(f"⚠️ 控件识别输入框失败: {e}")
-            return None
+        """通过控件识别查找输入框（仅桌面驱动）"""
+        return self.driver.find_input_by_control() if isinstance(self.driver, DesktopDriver) else None
     
     def _find_input_by_window_calc(self):
-        """通过窗口计算查找输入框位置"""
-        try:
-            if not HAS_WIN32 or not self.wechat_hwnd:
-                return None
-            
-            # 获取微信窗口的位置和大小
-            rect = win32gui.GetWindowRect(self.wechat_hwnd)
-            left, top, right, bottom = rect
-            window_width = right - left
-            window_height = bottom - top
-            
-            self.log(f"🔍 微信窗口位置: ({left}, {top}) 大小: {window_width}x{window_height}")
-            
-            # 根据窗口大小动态调整输入框位置
-            if window_height < 400:  # 小窗口
-                input_offset = 30
-            elif window_height < 600:  # 中等窗口
-                input_offset = 50
-            else:  # 大窗口
-                input_offset = 70
-            
-            # 输入框位置计算
-            input_x = left + window_width // 2
-            input_y = bottom - input_offset
-            
-            # 验证位置是否合理
-            screen_width, screen_height = pyautogui.size()
-            if (0 <= input_x <= screen_width and 
-                0 <= input_y <= screen_height and 
-                input_y > top + 100):  # 确保不在窗口标题栏
-                
-                self.log(f"🎯 计算得出输入框位置: ({input_x}, {input_y})")
-                return (input_x, input_y)
-            
-            return None
-            
-        except Exception as e:
-            self.log(f"⚠️ 窗口计算输入框位置失败: {e}")
-            return None
+        """通过窗口计算查找输入框位置（仅桌面驱动）"""
+        return self.driver.find_input_by_window_calc() if isinstance(self.driver, DesktopDriver) else None
     
     def _smart_click_input_area(self):
-        """智能点击输入区域"""
+        """智能点击输入区域（仅桌面驱动）"""
+        return self.driver.smart_click_input_area() if isinstance(self.driver, DesktopDriver) else False
+    
+    def export_orders_file(self):
+        """把处理后的订单（编号与预览一致）导出为 xlsx / csv"""
+        if not self.export_sections:
+            messagebox.showwarning("警告", "请先处理订单")
+            return
+        path = filedialog.asksaveasfilename(
+            title="导出订单清单",
+            initialfile=default_export_name(self.source_name),
+            defaultextension=".xlsx",
+            filetypes=[("Excel文件", "*.xlsx"), ("CSV文件", "*.csv")]
+        )
+        if not path:
+            return
         try:
-            if not HAS_WIN32 or not self.wechat_hwnd:
-                return False
-            
-            # 获取微信窗口信息
-            rect = win32gui.GetWindowRect(self.wechat_hwnd)
-            left, top, right, bottom = rect
-            
-            # 在窗口底部区域尝试多个点击位置
-            click_positions = [
-                (left + (right - left) // 2, bottom - 60),  # 窗口中下部
-                (left + (right - left) // 2, bottom - 80),  # 稍微往上一点
-                (left + (right - left) // 2, bottom - 40),  # 更靠近底部
-                (left + (right - left) * 3 // 4, bottom - 60),  # 右侧区域
-                (left + (right - left) // 4, bottom - 60),   # 左侧区域
-            ]
-            
-            for i, (x, y) in enumerate(click_positions):
-                try:
-                    # 确保点击位置在屏幕范围内
-                    screen_width, screen_height = pyautogui.size()
-                    if 0 <= x <= screen_width and 0 <= y <= screen_height:
-                        pyautogui.click(x, y)
-                        time.sleep(0.3)
-                        
-                        # 测试是否点击成功（尝试输入测试字符）
-                        test_char = "t"
-                        pyautogui.typewrite(test_char)
-                        time.sleep(0.2)
-                        
-                        # 如果能删除测试字符，说明点击成功
-                        pyautogui.press('backspace')
-                        time.sleep(0.2)
-                        
-                        self.log(f"✅ 智能点击成功: 位置 {i+1} ({x}, {y})")
-                        return True
-                        
-                except Exception:
-                    continue
-            
-            return False
-            
+            addr_col, note_col = self.export_columns
+            count = export_orders(path, self.export_sections, addr_col, note_col)
+            self.log(f"📤 已导出 {count} 条订单: {path}")
+            self.status_var.set(f"已导出 {count} 条订单")
         except Exception as e:
-            self.log(f"⚠️ 智能点击失败: {e}")
-            return False
-    
+            self.log(f"❌ 导出失败: {e}")
+            messagebox.showerror("错误", f"导出失败: {e}")
     
     def stop_sending_orders(self):
         """停止发送订单"""
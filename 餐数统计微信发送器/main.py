@@ -13,12 +13,23 @@ import threading
 import platform
 import traceback
 import tempfile
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Sequence, Tuple, Dict
 from datetime import datetime, date
 
 import pandas as pd
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from send_ledger import LedgerCursor, SendLedger
+from state import state_path
+from records import MemberMessage
+from templates import DEFAULT_TEMPLATES, TemplateError, load_templates, templates_path
+from meal_stats import DinerIndex, LazyMessages, analyze_meal_data, export_month_report, format_month_report, group_summary, month_report
+from meal_store import MealStore, month_from_filename, month_key
+from member_search import MemberIndex
+from wechat_driver import DesktopDriver, get_driver
+from meal_delta import (day_snapshot, filter_messages, load_snapshot, message_key, processed_snapshot,
+                        save_snapshot, snapshot_delta, snapshot_path)
+
 
 def detect_csv_encoding(file_path: str) -> str:
     """检测CSV文件编码"""
@@ -82,74 +93,6 @@ def load_excel_file(file_path: str) -> Tuple[pd.DataFrame, List[str]]:
         raise RuntimeError(f"不支持的文件格式: {ext}")
 
 
-def analyze_meal_data(df: pd.DataFrame, target_date: int) -> Tuple[List[Dict], str]:
-    """分析餐数数据，返回今日用餐人员信息"""
-    
-    # 清理数据
-    df_clean = df.dropna(subset=['会员姓名']).copy()
-    df_clean = df_clean[df_clean['会员姓名'].astype(str) != 'nan'].copy()
-    
-    # 检查是否有目标日期列
-    if target_date not in df_clean.columns:
-        available_dates = [col for col in df_clean.columns if isinstance(col, int) and 1 <= col <= 31]
-        raise RuntimeError(f"未找到{target_date}号的数据列。可用日期: {available_dates}")
-    
-    # 筛选今日用餐人员
-    today_diners = df_clean[
-        df_clean[target_date].notna() & 
-        (df_clean[target_date].astype(str).str.strip() != '') &
-        (df_clean[target_date].astype(str).str.strip() != 'nan')
-    ].copy()
-    
-    # 构建发送列表
-    messages_to_send = []
-    stats_summary = f"今日({target_date}号)用餐统计:\n"
-    stats_summary += f"用餐人数: {len(today_diners)}\n\n"
-    
-    for idx, row in today_diners.iterrows():
-        name = str(row['会员姓名']).strip()
-        phone = str(row['电话']) if pd.notna(row['电话']) else '无电话'
-        
-        # 计算餐数
-        initial_meals = row['剩余餐数'] if pd.notna(row['剩余餐数']) else 0
-        remaining_meals = row['剩余'] if pd.notna(row['剩余']) else 0
-        used_meals = initial_meals - remaining_meals if pd.notna(initial_meals) and pd.notna(remaining_meals) else 0
-        
-        # 今天的用餐信息
-        today_meal_info = str(row[target_date]) if pd.notna(row[target_date]) else ''
-        
-        # 处理负数情况（可能是充值了餐数）
-        if used_meals < 0:
-            used_meals = "计算中"
-            display_used = "计算中"
-        else:
-            display_used = f"{int(used_meals)}"
-        
-        # 生成个人消息
-        personal_message = f"""亲爱的{name}，您好！
-
-今天您已用餐，餐数统计如下：
-📊 今日用餐：已记录
-🍽️ 本月已用餐：{display_used}次  
-💰 剩余餐数：{int(remaining_meals) if isinstance(remaining_meals, (int, float)) else remaining_meals}次
-
-感谢您选择简知轻食！祝您用餐愉快！😊"""
-        
-        messages_to_send.append({
-            'name': name,
-            'phone': phone,
-            'message': personal_message,
-            'today_meal': today_meal_info,
-            'used_meals': display_used,
-            'remaining_meals': int(remaining_meals) if isinstance(remaining_meals, (int, float)) else remaining_meals
-        })
-        
-        # 添加到统计摘要
-        stats_summary += f"• {name}: 已用{display_used}次, 剩余{int(remaining_meals) if isinstance(remaining_meals, (int, float)) else remaining_meals}次\n"
-    
-    return messages_to_send, stats_summary
-
-
 class DropArea(QtWidgets.QFrame):
     """文件拖拽区域"""
     fileDropped = QtCore.pyqtSignal(str)
@@ -186,32 +129,12 @@ class WeChatPersonalSender(QtCore.QObject):
     def __init__(self):
         super().__init__()
         self._stop = threading.Event()
-        self.wechat_path: Optional[str] = None
-        self.wechat_hwnd = None
-        
-        # 检查依赖
-        self.HAS_WIN32 = False
-        self.HAS_AUTO = False
-        self.HAS_PYAUTOGUI = False
-        
-        try:
-            import win32gui, win32con
-            self.HAS_WIN32 = True
-        except ImportError:
-            pass
-            
-        try:
-            import uiautomation
-            self.HAS_AUTO = True
-        except ImportError:
-            pass
-            
-        try:
-            import pyautogui
-            import pyperclip
-            self.HAS_PYAUTOGUI = True
-        except ImportError:
-            pass
+        # 群汇总消息使用的模板
+        self.templates: Dict[str, str] = dict(DEFAULT_TEMPLATES)
+        # 本次已送达的会员（含台账中此前已发送的），增量模式据此保存快照
+        self.delivered: List[MemberMessage] = []
+        # 微信操作驱动：默认 win32 + pyautogui；环境变量 PY_WECHAT_DRIVER=sim 时用模拟微信演练发送流程
+        self.driver = get_driver(progress=self.progressed.emit)
 
     def stop(self):
         self._stop.set()
@@ -225,529 +148,110 @@ class WeChatPersonalSender(QtCore.QObject):
             time.sleep(0.05)
         return True
 
-    def _ensure_wechat(self):
-        """确保微信已启动"""
-        import uiautomation as auto
-        main = auto.WindowControl(searchDepth=1, ClassName="WeChatMainWndForPC")
-        if not main.Exists(0.5):
-            try:
-                exe = self._get_wechat_exe_path()
-                if exe:
-                    os.startfile(exe)
-            except Exception:
-                pass
-            # 等待微信启动
-            start = time.time()
-            while time.time() - start < 20:
-                if main.Exists(0.5):
-                    break
-                time.sleep(0.5)
-        if not main.Exists(0.5):
-            raise RuntimeError("未找到微信窗口，请先登录微信")
-        return main
-
-    def _get_wechat_exe_path(self) -> Optional[str]:
-        """获取微信可执行文件路径"""
-        candidates = [
-            'WeChat.exe',
-            r'C:\Program Files (x86)\Tencent\WeChat\WeChat.exe',
-            r'C:\Program Files\Tencent\WeChat\WeChat.exe',
-            r'D:\Program Files (x86)\Tencent\WeChat\WeChat.exe',
-            r'D:\Program Files\Tencent\WeChat\WeChat.exe',
-        ]
-        
-        if self.wechat_path:
-            candidates.insert(0, self.wechat_path)
-        
-        for p in candidates:
-            try:
-                if os.path.isabs(p) and os.path.exists(p):
-                    return p
-                if p.lower().endswith('.exe') and not os.path.isabs(p):
-                    return p
-            except Exception:
-                continue
-        return None
+    def _activate_wechat(self) -> bool:
+        """找到并激活微信窗口"""
+        return self.driver.find_window() and self.driver.activate()
 
     def _search_and_enter_chat(self, contact_name: str) -> bool:
         """搜索并进入聊天窗口"""
-        try:
-            if not self.HAS_PYAUTOGUI:
-                return False
-                
-            import pyautogui
-            import pyperclip
-            
-            self.progressed.emit(f"🔍 搜索联系人: {contact_name}")
-            
-            # 多次尝试打开搜索框
-            search_attempts = 0
-            max_attempts = 3
-            
-            while search_attempts < max_attempts:
-                try:
-                    pyautogui.hotkey('ctrl', 'f')
-                    time.sleep(0.5)
-                    search_attempts += 1
-                    
-                    # 清空搜索框
-                    pyautogui.hotkey('ctrl', 'a')
-                    time.sleep(0.2)
-                    pyautogui.press('delete')
-                    time.sleep(0.2)
-                    
-                    # 复制联系人姓名到剪贴板并验证
-                    pyperclip.copy(contact_name)
-                    time.sleep(0.1)
-                    
-                    # 验证剪贴板内容
-                    clipboard_content = pyperclip.paste()
-                    if clipboard_content != contact_name:
-                        self.progressed.emit(f"⚠️ 剪贴板验证失败，重试...")
-                        continue
-                    
-                    # 粘贴联系人姓名
-                    pyautogui.hotkey('ctrl', 'v')
-                    time.sleep(0.5)
-                    
-                    # 按回车进入聊天
-                    pyautogui.press('enter')
-                    time.sleep(1.5)  # 等待聊天窗口加载
-                    
-                    self.progressed.emit(f"✅ 已进入与 {contact_name} 的聊天")
-                    return True
-                    
-                except Exception as e:
-                    self.progressed.emit(f"⚠️ 搜索尝试 {search_attempts} 失败: {e}")
-                    if search_attempts < max_attempts:
-                        time.sleep(0.5)
-                        continue
-                    else:
-                        break
-            
-            return False
-            
-        except Exception as e:
-            self.progressed.emit(f"❌ 搜索联系人失败: {e}")
-            return False
-
-    def _find_input_box_position(self):
-        """查找微信输入框的实际位置"""
-        try:
-            # 方法1: 尝试使用控件识别（如果可用）
-            position = self._find_input_by_control()
-            if position:
-                return position
-            
-            # 方法2: 基于窗口计算
-            position = self._find_input_by_window_calc()
-            if position:
-                return position
-                
-            return None
-            
-        except Exception as e:
-            self.progressed.emit(f"查找输入框位置失败: {e}")
-            return None
+        return self.driver.enter_chat(contact_name)
 
     def _find_input_by_control(self):
-        """通过控件识别查找输入框"""
-        try:
-            if not self.HAS_AUTO or not self.wechat_hwnd:
-                return None
-                
-            import uiautomation as auto
-            import win32gui
-            
-            # 获取微信窗口的控制对象
-            main_window = auto.WindowControl(Handle=self.wechat_hwnd)
-            if not main_window.Exists(0.5):
-                return None
-            
-            # 查找所有编辑框控件
-            edit_controls = main_window.EditControls()
-            if not edit_controls:
-                return None
-            
-            # 从后往前遍历，找到最适合的输入框
-            for edit_control in reversed(edit_controls):
-                try:
-                    rect = edit_control.BoundingRectangle
-                    if rect.width() > 100 and rect.height() > 20:  # 合理的输入框尺寸
-                        center_x = rect.left + rect.width() // 2
-                        center_y = rect.top + rect.height() // 2
-                        self.progressed.emit(f"通过控件找到输入框: ({center_x}, {center_y})")
-                        return (center_x, center_y)
-                except Exception:
-                    continue
-            
-            return None
-            
-        except Exception as e:
-            self.progressed.emit(f"控件识别查找输入框失败: {e}")
-            return None
+        """通过控件识别查找输入框（仅桌面驱动）"""
+        return self.driver.find_input_by_control() if isinstance(self.driver, DesktopDriver) else None
 
     def _find_input_by_window_calc(self):
-        """通过窗口计算估算输入框位置"""
-        try:
-            if not self.HAS_WIN32 or not self.wechat_hwnd:
-                return None
-                
-            import win32gui
-            
-            # 获取微信窗口位置和尺寸
-            rect = win32gui.GetWindowRect(self.wechat_hwnd)
-            window_width = rect[2] - rect[0]
-            window_height = rect[3] - rect[1]
-            
-            # 基于窗口尺寸动态计算输入框位置
-            # 输入框通常在窗口底部，距离底部约60-100像素
-            base_offset = 80
-            if window_height > 800:
-                y_offset = 100
-            elif window_height > 600:
-                y_offset = 85
-            else:
-                y_offset = 70
-            
-            # 计算输入框中心位置
-            center_x = rect[0] + window_width // 2
-            center_y = rect[3] - y_offset
-            
-            self.progressed.emit(f"通过窗口计算输入框位置: ({center_x}, {center_y})")
-            return (center_x, center_y)
-            
-        except Exception as e:
-            self.progressed.emit(f"窗口计算查找输入框失败: {e}")
-            return None
+        """通过窗口计算估算输入框位置（仅桌面驱动）"""
+        return self.driver.find_input_by_window_calc() if isinstance(self.driver, DesktopDriver) else None
 
-    def _smart_click_input_area(self):
-        """智能点击输入区域并验证"""
-        try:
-            if not self.HAS_PYAUTOGUI or not self.wechat_hwnd:
-                return False
-                
-            import pyautogui
-            import win32gui
-            
-            # 获取微信窗口位置
-            rect = win32gui.GetWindowRect(self.wechat_hwnd)
-            window_width = rect[2] - rect[0]
-            
-            # 尝试多个可能的输入区域位置
-            base_y = rect[3] - 80  # 距离底部80像素
-            
-            click_positions = [
-                (rect[0] + window_width // 2, base_y),  # 中央
-                (rect[0] + window_width // 3, base_y),  # 左侧1/3
-                (rect[0] + window_width * 2 // 3, base_y),  # 右侧2/3
-            ]
-            
-            for pos_x, pos_y in click_positions:
-                try:
-                    self.progressed.emit(f"尝试点击输入区域: ({pos_x}, {pos_y})")
-                    pyautogui.click(pos_x, pos_y)
-                    time.sleep(0.3)
-                    
-                    # 验证点击是否成功：尝试输入一个字符然后删除
-                    pyautogui.type('a')
-                    time.sleep(0.1)
-                    pyautogui.press('backspace')
-                    time.sleep(0.1)
-                    
-                    self.progressed.emit(f"✅ 输入区域点击成功")
-                    return True
-                    
-                except Exception as e:
-                    self.progressed.emit(f"点击位置 ({pos_x}, {pos_y}) 失败: {e}")
-                    continue
-            
-            return False
-            
-        except Exception as e:
-            self.progressed.emit(f"智能点击输入区域失败: {e}")
-            return False
+    def _smart_click_input_area(self) -> bool:
+        """智能点击输入区域（仅桌面驱动）"""
+        return self.driver.smart_click_input_area() if isinstance(self.driver, DesktopDriver) else False
 
-    def _send_to_person(self, name: str, message: str, interval_min: float, interval_max: float):
-        """发送消息给个人 - 增强版"""
+    def _send_to_person(self, name: str, message: str, interval_min: float, interval_max: float) -> bool:
+        """发送消息给个人 - 增强版，返回是否发出"""
         try:
-            # 确保微信窗口激活
             if not self._activate_wechat():
                 raise RuntimeError("无法激活微信窗口")
-            
-            # 搜索并进入聊天
             if not self._search_and_enter_chat(name):
                 raise RuntimeError(f"无法找到或进入与{name}的聊天")
-            
-            # 查找输入框位置
-            input_position = self._find_input_box_position()
-            
-            if input_position:
-                # 使用找到的精确位置
-                import pyautogui
-                pyautogui.click(input_position[0], input_position[1])
-                time.sleep(0.3)
-            else:
-                # 使用智能点击
-                if not self._smart_click_input_area():
-                    self.progressed.emit("⚠️ 无法定位输入框，使用默认位置")
-            
-            # 发送消息
-            if self._send_message_content(message):
-                self.progressed.emit(f"✅ 已发送给 {name}")
-            else:
+            if not self.driver.send_text(message):
                 raise RuntimeError("消息发送失败")
-            
-        except Exception as e:
-            self.progressed.emit(f"❌ 发送给 {name} 失败: {e}")
-            # 尝试备用方法
-            self._send_via_hotkeys(name, message, interval_min, interval_max)
-
-    def _send_message_content(self, message: str) -> bool:
-        """发送消息内容"""
-        try:
-            if not self.HAS_PYAUTOGUI:
-                return False
-                
-            import pyautogui
-            import pyperclip
-            
-            # 复制消息到剪贴板并验证
-            pyperclip.copy(message)
-            time.sleep(0.2)
-            
-            # 验证剪贴板内容
-            clipboard_content = pyperclip.paste()
-            if clipboard_content != message:
-                self.progressed.emit("⚠️ 剪贴板内容验证失败")
-                return False
-            
-            # 清空输入框
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.1)
-            pyautogui.press('delete')
-            time.sleep(0.1)
-            
-            # 粘贴消息
-            pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.5)
-            
-            # 发送消息
-            pyautogui.press('enter')
-            time.sleep(0.3)
-            
+            self.progressed.emit(f"✅ 已发送给 {name}")
             return True
-            
-        except Exception as e:
-            self.progressed.emit(f"发送消息内容失败: {e}")
-            return False
 
-    def _send_via_hotkeys(self, name: str, message: str, interval_min: float, interval_max: float):
-        """使用热键方式发送"""
-        try:
-            import pyautogui
-            import pyperclip
-            
-            pyautogui.FAILSAFE = True
-            pyautogui.PAUSE = 0.1
-            
-            # 确保微信窗口激活
-            self._focus_wechat_window()
-            time.sleep(1.0)
-            
-            # 搜索联系人
-            pyautogui.hotkey('ctrl', 'f')
-            time.sleep(0.5)
-            pyperclip.copy(name)
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.2)
-            pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.5)
-            pyautogui.press('enter')
-            time.sleep(1.5)
-            
-            # 发送消息
-            pyperclip.copy(message)
-            pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.1)
-            pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.3)
-            pyautogui.press('enter')
-            
-            self.progressed.emit(f"✅ 已发送给 {name} (热键方式)")
-            
         except Exception as e:
-            self.progressed.emit(f"❌ 发送给 {name} 完全失败: {e}")
-
-    def _find_wechat_window(self):
-        """查找微信窗口 - 改进版"""
-        if not self.HAS_WIN32:
-            return None
-        
-        import win32gui
-        
-        def enum_windows_callback(hwnd, windows):
-            if not win32gui.IsWindowVisible(hwnd) or not win32gui.IsWindowEnabled(hwnd):
-                return True
-                
-            window_text = win32gui.GetWindowText(hwnd)
-            class_name = win32gui.GetClassName(hwnd)
-            
-            # 计算匹配得分
-            match_score = 0
-            
-            # 主要匹配条件
-            if class_name == "WeChatMainWndForPC":
-                match_score += 50
-            elif "WeChat" in class_name:
-                match_score += 30
-            elif "Wnd" in class_name and "PC" in class_name:
-                match_score += 20
-                
-            # 窗口标题匹配
-            if "微信" in window_text:
-                match_score += 30
-            elif "WeChat" in window_text:
-                match_score += 25
-                
-            # Qt框架提示
-            if "Qt5" in class_name or "Chrome_WidgetWin_1" in class_name:
-                match_score += 10
-                
-            if match_score >= 30:  # 设定阈值
-                windows.append((hwnd, match_score, window_text, class_name))
-            
-            return True
-        
-        windows = []
-        try:
-            win32gui.EnumWindows(enum_windows_callback, windows)
-        except Exception as e:
-            self.progressed.emit(f"枚举窗口失败: {e}")
-            return None
-        
-        if not windows:
-            return None
-        
-        # 按匹配得分排序，选择最佳匹配
-        windows.sort(key=lambda x: x[1], reverse=True)
-        best_match = windows[0]
-        
-        self.progressed.emit(f"找到微信窗口: {best_match[2]} (类名: {best_match[3]}, 得分: {best_match[1]})")
-        return best_match[0]
-
-    def _activate_wechat(self):
-        """激活微信窗口 - 改进版"""
-        try:
-            if not self.HAS_WIN32:
-                return False
-                
-            import win32gui, win32con
-            
-            # 重新查找微信窗口，确保窗口仍然有效
-            self.wechat_hwnd = self._find_wechat_window()
-            
-            if not self.wechat_hwnd:
-                self.progressed.emit("❌ 未找到微信窗口")
-                return False
-            
-            # 检查窗口是否仍然有效
-            try:
-                if not win32gui.IsWindow(self.wechat_hwnd):
-                    self.progressed.emit("❌ 微信窗口句柄无效")
-                    return False
-            except Exception:
-                self.progressed.emit("❌ 无法验证微信窗口")
-                return False
-            
-            # 多步骤激活窗口
-            try:
-                # 步骤1: 恢复窗口（如果最小化）
-                win32gui.ShowWindow(self.wechat_hwnd, win32con.SW_RESTORE)
-                time.sleep(0.2)
-                
-                # 步骤2: 设置为顶层窗口
-                win32gui.SetWindowPos(self.wechat_hwnd, win32con.HWND_TOP, 0, 0, 0, 0, 
-                                    win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                time.sleep(0.2)
-                
-                # 步骤3: 设置为前台窗口
-                win32gui.SetForegroundWindow(self.wechat_hwnd)
-                time.sleep(0.3)
-                
-                # 验证激活是否成功
-                try:
-                    current_fg = win32gui.GetForegroundWindow()
-                    if current_fg == self.wechat_hwnd:
-                        self.progressed.emit("✅ 微信窗口已激活")
-                        return True
-                    else:
-                        self.progressed.emit("⚠️ 微信窗口激活可能不完整")
-                        return True  # 仍然尝试继续
-                except Exception:
-                    self.progressed.emit("⚠️ 无法验证窗口激活状态，继续尝试")
-                    return True
-                    
-            except Exception as e:
-                self.progressed.emit(f"❌ 激活微信窗口失败: {e}")
-                return False
-                
-        except Exception as e:
-            self.progressed.emit(f"❌ 激活微信窗口异常: {e}")
+            self.progressed.emit(f"❌ 发送给 {name} 失败: {e}")
+            # 桌面驱动再用纯热键方式试一次
+            if isinstance(self.driver, DesktopDriver):
+                return self.driver.send_via_hotkeys(name, message)
             return False
 
-    def _focus_wechat_window(self):
-        """激活微信窗口（兼容方法）"""
-        return self._activate_wechat()
-
-    def send_messages(self, messages: List[Dict], interval_min: float, interval_max: float, 
+    def send_messages(self, messages: Sequence[MemberMessage], interval_min: float, interval_max: float, 
                      send_to_groups: bool = False, group_targets: List[str] = None,
-                     test_mode: bool = False, test_target: str = "末"):
+                     test_mode: bool = False, test_target: str = "末", run_id: Optional[str] = None):
         """发送消息 - 支持个人和群聊"""
         try:
-            if platform.system().lower() != "windows":
+            if self.driver.requires_windows and platform.system().lower() != "windows":
                 raise RuntimeError("仅支持 Windows 平台")
             
             total_count = len(messages)
+            self.delivered = []
             
             if send_to_groups and group_targets:
                 # 群聊模式：将所有消息汇总发送到指定群
                 self._send_to_groups(messages, interval_min, interval_max, group_targets, test_mode, test_target)
             else:
                 # 个人模式：逐一发送给个人
-                self._send_to_individuals(messages, interval_min, interval_max, test_mode, test_target)
+                self._send_to_individuals(messages, interval_min, interval_max, test_mode, test_target, run_id)
             
             self.finished.emit()
             
         except Exception as e:
             self.failed.emit(str(e))
 
-    def _send_to_individuals(self, messages: List[Dict], interval_min: float, interval_max: float, 
-                           test_mode: bool = False, test_target: str = "末"):
+    @staticmethod
+    def individual_plan(messages: Sequence[MemberMessage], test_mode: bool = False, test_target: str = "末") -> List[Tuple[str, str]]:
+        """个人发送计划 [(收件人, 台账键)]：按需渲染的消息用内容指纹作键（不必先渲染正文），否则用消息正文；
+        测试模式下收件人为测试目标，键上注明原收件人"""
+        if isinstance(messages, LazyMessages):
+            names = messages.values["姓名"].tolist()
+            keys = messages.signatures()
+        else:
+            names = [m.name for m in messages]
+            keys = [m.message for m in messages]
+        if test_mode:
+            return [(test_target, f"[测试消息 - 原收件人: {name}]\n\n{key}") for name, key in zip(names, keys)]
+        return list(zip(names, keys))
+
+    def _send_to_individuals(self, messages: Sequence[MemberMessage], interval_min: float, interval_max: float, 
+                           test_mode: bool = False, test_target: str = "末", run_id: Optional[str] = None):
         """发送给个人"""
         total_count = len(messages)
         self.progressed.emit(f"开始个人发送，共 {total_count} 条消息")
         
-        for i, msg_info in enumerate(messages):
+        # 写入发送计划（预写台账），重启同一任务时跳过已完成的收件人
+        plan = self.individual_plan(messages, test_mode, test_target)
+        cursor = LedgerCursor(SendLedger(state_path=state_path), run_id or SendLedger.make_run_id(plan), plan)
+        
+        # 逐条取消息：按需渲染的消息轮到谁才生成谁的正文
+        for i, (msg_info, (target_name, key)) in enumerate(zip(messages, plan)):
             if self._stop.is_set():
                 break
             
-            original_name = msg_info['name']
-            message = msg_info['message']
-            
-            # 测试模式处理
-            if test_mode:
-                target_name = test_target
-                # 在消息前添加原始姓名信息
-                test_message = f"[测试消息 - 原收件人: {original_name}]\n\n{message}"
-            else:
-                target_name = original_name
-                test_message = message
+            original_name = msg_info.name
+            if not cursor.should_send(target_name, key):
+                self.progressed.emit(f"⏭️ ({i+1}/{total_count}) {original_name} 此前已发送，跳过")
+                self.delivered.append(msg_info)
+                continue
             
             self.progressed.emit(f"正在发送 ({i+1}/{total_count}): {original_name}")
+            text = f"[测试消息 - 原收件人: {original_name}]\n\n{msg_info.message}" if test_mode else msg_info.message
             
             try:
-                self._send_to_person(target_name, test_message, interval_min, interval_max)
+                if self._send_to_person(target_name, text, interval_min, interval_max):
+                    cursor.done(target_name, key)
+                    self.delivered.append(msg_info)
             except Exception as e:
                 self.progressed.emit(f"❌ 发送失败: {e}")
             
@@ -758,23 +262,15 @@ class WeChatPersonalSender(QtCore.QObject):
                 if not self._sleep(interval):
                     break
 
-    def _send_to_groups(self, messages: List[Dict], interval_min: float, interval_max: float,
+    def _send_to_groups(self, messages: Sequence[MemberMessage], interval_min: float, interval_max: float,
                        group_targets: List[str], test_mode: bool = False, test_target: str = "末"):
         """发送到群聊"""
         # 汇总所有消息为一条群消息
-        summary_message = f"📊 今日用餐统计报告 ({datetime.now().strftime('%Y-%m-%d')})\n\n"
-        summary_message += f"用餐人数：{len(messages)} 人\n\n"
-        
-        for i, msg_info in enumerate(messages, 1):
-            name = msg_info['name']
-            used_meals = msg_info['used_meals']
-            remaining_meals = msg_info['remaining_meals']
-            summary_message += f"{i}. {name}：已用{used_meals}次，剩余{remaining_meals}次\n"
-        
-        summary_message += f"\n💡 详细信息请查看餐数统计表"
+        summary_message = group_summary(messages, datetime.now().strftime('%Y-%m-%d'), self.templates)
         
         # 发送到每个选中的群
         targets = [test_target] if test_mode else group_targets
+        sent_groups = 0
         
         for group_name in targets:
             if self._stop.is_set():
@@ -785,6 +281,7 @@ class WeChatPersonalSender(QtCore.QObject):
             try:
                 self._send_to_group(group_name, summary_message)
                 self.progressed.emit(f"✅ 已发送到群: {group_name}")
+                sent_groups += 1
             except Exception as e:
                 self.progressed.emit(f"❌ 发送到群 {group_name} 失败: {e}")
             
@@ -794,44 +291,31 @@ class WeChatPersonalSender(QtCore.QObject):
                 self.progressed.emit(f"等待 {interval:.1f} 秒...")
                 if not self._sleep(interval):
                     break
+        if sent_groups == len(targets):
+            self.delivered = list(messages)
 
     def _send_to_group(self, group_name: str, message: str):
         """发送消息到群聊"""
         try:
-            # 确保微信窗口激活
             if not self._activate_wechat():
                 raise RuntimeError("无法激活微信窗口")
-            
-            # 搜索并进入群聊
             if not self._search_and_enter_chat(group_name):
                 raise RuntimeError(f"无法找到或进入群 {group_name}")
-            
-            # 查找输入框位置
-            input_position = self._find_input_box_position()
-            
-            if input_position:
-                # 使用找到的精确位置
-                import pyautogui
-                pyautogui.click(input_position[0], input_position[1])
-                time.sleep(0.3)
-            else:
-                # 使用智能点击
-                if not self._smart_click_input_area():
-                    self.progressed.emit("⚠️ 无法定位输入框，使用默认位置")
-            
-            # 发送消息
-            if not self._send_message_content(message):
+            if not self.driver.send_text(message):
                 raise RuntimeError("消息发送失败")
-                
         except Exception as e:
             raise RuntimeError(f"发送到群 {group_name} 失败: {e}")
 
     # 保持向后兼容
-    def send_personal_messages(self, messages: List[Dict], interval_min: float, interval_max: float, test_mode: bool = False, test_target: str = "末"):
+    def send_personal_messages(self, messages: Sequence[MemberMessage], interval_min: float, interval_max: float, test_mode: bool = False, test_target: str = "末"):
         """发送个人消息（向后兼容方法）"""
         return self.send_messages(messages, interval_min, interval_max, False, None, test_mode, test_target)
 
 
+# 分析后预览里展示的个人消息条数
+PREVIEW_MESSAGES = 5
+
+
 class MainWindow(QtWidgets.QMainWindow):
     """主窗口"""
     
@@ -842,9 +326,26 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.df: Optional[pd.DataFrame] = None
         self.current_file: Optional[str] = None
-        self.messages_to_send: List[Dict] = []
+        # 分析结果：按需渲染的消息，发送时逐条生成
+        self.messages_to_send: Sequence[MemberMessage] = []
+        self.month_report: Optional[Dict] = None
+        # 加载时建好的 日期 → 当天用餐会员 索引，切换日期不再重扫整表
+        self.diner_index: Optional[DinerIndex] = None
+        # 会员查找索引（姓名 / 电话 / 拼音首字母），重新加载时复用已算好的首字母
+        self.member_index = MemberIndex()
+        # 本地台账库：加载的扣餐表按月导入，没打开 Excel 时也能按月份/日期取用餐名单、查会员历史
+        try:
+            self.store: Optional[MealStore] = MealStore()
+        except Exception:
+            self.store = None
+        # 增量模式：本次分析的快照 (路径, 上次快照, 当前快照, 需通知的会员键)，发送完成后保存
+        self._delta_state: Optional[Tuple] = None
+        self._sending_delta: Optional[Tuple] = None
         
         self.sender = WeChatPersonalSender()
+        self.templates: Dict[str, str] = dict(DEFAULT_TEMPLATES)
+        self._template_error = ""
+        self._reload_templates()
         self._send_thread: Optional[threading.Thread] = None
         
         self._init_ui()
@@ -877,11 +378,34 @@ class MainWindow(QtWidgets.QMainWindow):
         self.date_spin = QtWidgets.QSpinBox()
         self.date_spin.setRange(1, 31)
         self.date_spin.setValue(datetime.now().day)  # 默认今天
+        self.date_spin.valueChanged.connect(self._on_date_changed)
         date_layout.addWidget(self.date_spin)
         date_layout.addWidget(QtWidgets.QLabel("号"))
+        date_layout.addWidget(QtWidgets.QLabel("月份(YYYY-MM):"))
+        self.month_edit = QtWidgets.QLineEdit(month_key())
+        self.month_edit.setMaximumWidth(90)
+        date_layout.addWidget(self.month_edit)
+        self.delta_mode = QtWidgets.QCheckBox("只通知有变化的会员")
+        self.delta_mode.setToolTip("与上次发送时的表对比，只发给当天新打标记或餐数有变化的会员")
+        self.delta_mode.toggled.connect(self._on_date_changed)
+        date_layout.addWidget(self.delta_mode)
         date_layout.addStretch()
         root.addWidget(date_group)
 
+        # 会员查找：输入即查
+        search_row = QtWidgets.QHBoxLayout()
+        search_row.addWidget(QtWidgets.QLabel("查找会员:"))
+        self.search_edit = QtWidgets.QLineEdit()
+        self.search_edit.setPlaceholderText("姓名、电话或拼音首字母（如 zs）")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.on_search_member)
+        search_row.addWidget(self.search_edit, 1)
+        root.addLayout(search_row)
+        self.search_results = QtWidgets.QListWidget()
+        self.search_results.setMaximumHeight(110)
+        self.search_results.setVisible(False)
+        root.addWidget(self.search_results)
+
         # 发送设置
         settings = QtWidgets.QGroupBox("发送设置")
         form = QtWidgets.QGridLayout(settings)
@@ -974,10 +498,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_send.clicked.connect(self.on_send)
         self.btn_stop = QtWidgets.QPushButton("停止发送")
         self.btn_stop.clicked.connect(self.on_stop)
+        self.btn_month = QtWidgets.QPushButton("月度报表")
+        self.btn_month.clicked.connect(self.on_month_report)
+        self.btn_month_export = QtWidgets.QPushButton("导出月报...")
+        self.btn_month_export.clicked.connect(self.on_export_month_report)
+        self.btn_member = QtWidgets.QPushButton("会员历史...")
+        self.btn_member.clicked.connect(self.on_member_history)
         
         actions.addWidget(self.btn_analyze)
         actions.addWidget(self.btn_send)
         actions.addWidget(self.btn_stop)
+        actions.addWidget(self.btn_month)
+        actions.addWidget(self.btn_month_export)
+        actions.addWidget(self.btn_member)
         actions.addStretch(1)
         root.addLayout(actions)
         
@@ -1049,8 +582,21 @@ class MainWindow(QtWidgets.QMainWindow):
             df = normalize_columns(df)
             self.df = df
             self.current_file = path
+            self.month_report = None
+            self.messages_to_send = []
+            try:
+                self.diner_index = DinerIndex(df)
+            except Exception:
+                # 缺少必要列时不建索引，分析时再给出具体错误
+                self.diner_index = None
+            try:
+                self.member_index.rebuild(df)
+            except Exception:
+                self.member_index = MemberIndex()
+            self.on_search_member(self.search_edit.text())
             self.file_label.setText(f"已加载：{os.path.basename(path)}")
             self.status.setText("文件加载成功，请点击'分析数据'")
+            self._import_to_store(df, path)
             
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "加载失败", f"{e}\n\n{traceback.format_exc()}")
@@ -1058,14 +604,41 @@ class MainWindow(QtWidgets.QMainWindow):
     def on_analyze(self):
         """分析数据"""
         try:
-            if self.df is None:
-                raise RuntimeError("请先加载扣餐表文件")
-            
             target_date = self.date_spin.value()
-            messages, summary = analyze_meal_data(self.df, target_date)
+            # 每次分析都重读模板，改了 templates.json 不用重启
+            self._reload_templates()
+            if self._template_error:
+                raise TemplateError(self._template_error)
+            month = month_key(self.month_edit.text().strip() or None)
+            if self.df is None:
+                # 没有打开 Excel：从台账库取这个月当天的用餐名单
+                if self.store is None or month not in self.store.months():
+                    raise RuntimeError(f"请先加载扣餐表文件（台账库中没有 {month} 的数据）")
+                source = self.store.day_frame(month, target_date)
+                messages, summary = analyze_meal_data(source, target_date, self.templates)
+            else:
+                source = self.df
+                if self.diner_index is not None:
+                    messages, summary = self.diner_index.analyze(target_date, self.templates)
+                else:
+                    messages, summary = analyze_meal_data(self.df, target_date, self.templates)
+            
+            self._delta_state = None
+            if self.delta_mode.isChecked():
+                path = snapshot_path(month, target_date)
+                previous = load_snapshot(path)
+                current = day_snapshot(source, target_date)
+                keys = snapshot_delta(previous, current)
+                self._delta_state = (path, previous, current, keys)
+                total = len(messages)
+                messages = filter_messages(messages, keys)
+                note = ("增量模式：还没有发送记录，本次全部通知" if previous is None
+                        else f"增量模式：与上次发送相比 {len(messages)} 位会员有变化（当天共 {total} 位用餐）")
+                names = messages.values["姓名"] if isinstance(messages, LazyMessages) else [m.name for m in messages]
+                summary = note + "\n" + "".join(f"• {name}\n" for name in names) + "\n" + summary
             
             self.messages_to_send = messages
-            self.preview.setPlainText(summary)
+            self.preview.setPlainText(summary + self._message_preview(messages))
             
             if messages:
                 self.btn_send.setEnabled(True)
@@ -1077,6 +650,107 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "分析失败", str(e))
 
+    def _message_preview(self, messages: Sequence[MemberMessage]) -> str:
+        """预览只渲染前 PREVIEW_MESSAGES 条个人消息"""
+        shown = messages.head(PREVIEW_MESSAGES) if isinstance(messages, LazyMessages) else messages[:PREVIEW_MESSAGES]
+        if not shown:
+            return ""
+        parts = [f"\n—— 个人消息预览（前 {len(shown)} 条，共 {len(messages)} 条）——"]
+        parts += [f"\n[{m.name}]\n{m.message}" for m in shown]
+        return "\n".join(parts)
+
+    def on_search_member(self, text: str):
+        """按输入内容即时查找会员，显示姓名、电话和餐数"""
+        self.search_results.clear()
+        text = text.strip()
+        if not text:
+            self.search_results.setVisible(False)
+            return
+        hits = self.member_index.search(text)
+        self.search_results.addItems(self.member_index.describe(hits) or ["未找到匹配的会员"])
+        self.search_results.setVisible(True)
+
+    def _import_to_store(self, df: pd.DataFrame, path: str):
+        """把刚加载的扣餐表导入台账库；月份取文件名中的年月，没有时用界面上填的月份。导入失败不影响本次使用"""
+        if self.store is None:
+            return
+        try:
+            month = month_from_filename(path) or month_key(self.month_edit.text().strip() or None)
+            self.month_edit.setText(month)
+            result = self.store.import_sheet(df, month, os.path.basename(path))
+            self.status.setText(f"{self.status.text()}（已导入台账 {month}：{result['members']} 位会员，"
+                                f"{result['meals']} 条用餐记录）")
+        except Exception as e:
+            self.status.setText(f"{self.status.text()}（导入台账失败：{e}）")
+
+    def on_member_history(self):
+        """按姓名或手机号查询会员在台账库中各月的余额和用餐记录"""
+        try:
+            if self.store is None:
+                raise RuntimeError("台账库不可用")
+            text, ok = QtWidgets.QInputDialog.getText(self, "会员历史", "会员姓名或手机号:")
+            text = text.strip()
+            if not ok or not text:
+                return
+            key = {"phone": text} if text.isdigit() else {"name": text}
+            balances = self.store.member_balances(**key)
+            if balances.empty:
+                self.status.setText(f"台账库中没有 {text} 的记录")
+                return
+            meals = self.store.member_meals(**key)
+            days = meals.groupby("月份")["日期"].apply(lambda s: "、".join(map(str, s)))
+            lines = [f"{text} 的用餐历史（台账月份: {', '.join(self.store.months())}）", "",
+                     balances.to_string(index=False), ""]
+            lines += [f"{month} 用餐日期: {d}" for month, d in days.items()]
+            self.preview.setPlainText("\n".join(lines))
+            self.status.setText(f"{text}：{len(balances)} 个月的记录")
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "查询失败", str(e))
+
+    def _reload_templates(self):
+        """读取消息模板（~/.meal_count_sender/templates.json）；有误时保留上次可用的模板并记下错误"""
+        try:
+            self.templates = load_templates()
+            self._template_error = ""
+        except TemplateError as e:
+            self._template_error = f"{e}\n\n请修改 {templates_path()}"
+        self.sender.templates = self.templates
+
+    def _on_date_changed(self, _day: int):
+        """已分析过时切换日期直接刷新预览（走索引，不重扫整表）"""
+        if self.diner_index is not None and self.messages_to_send:
+            self.on_analyze()
+
+    def on_month_report(self):
+        """整月统计：每位会员用餐天数、每日用餐人数和总计"""
+        try:
+            if self.df is None:
+                raise RuntimeError("请先加载扣餐表文件")
+            self.month_report = month_report(self.df)
+            self.preview.setPlainText(format_month_report(self.month_report))
+            totals = self.month_report["totals"]
+            self.status.setText(f"月度报表：{totals['会员数']} 位会员，共 {totals['总用餐人次']} 人次")
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "统计失败", str(e))
+
+    def on_export_month_report(self):
+        """导出月度报表（xlsx：会员 / 每日 / 总计 三张表；csv：会员表 + 每日表）"""
+        try:
+            if self.month_report is None:
+                self.on_month_report()
+            if self.month_report is None:
+                return
+            stem = os.path.splitext(os.path.basename(self.current_file or "扣餐表"))[0]
+            start = os.path.join(os.path.dirname(self.current_file or os.path.expanduser("~")), f"{stem}_月度报表.xlsx")
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self, "导出月度报表", start, "Excel文件 (*.xlsx);;CSV文件 (*.csv)")
+            if not path:
+                return
+            export_month_report(self.month_report, path)
+            self.status.setText(f"月度报表已导出：{path}")
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "导出失败", str(e))
+
     def on_send(self):
         """开始发送"""
         try:
@@ -1141,6 +815,30 @@ class MainWindow(QtWidgets.QMainWindow):
             if result != QtWidgets.QMessageBox.Yes:
                 return
             
+            # 个人模式：台账中有同一任务的完成记录时询问是否从断点继续
+            run_id = None
+            if not send_to_groups:
+                plan = self.sender.individual_plan(self.messages_to_send, test_mode, test_target)
+                run_id = SendLedger.make_run_id(plan)
+                done = SendLedger(state_path=state_path).done_count(run_id)
+                if done >= len(plan):
+                    ans = QtWidgets.QMessageBox.question(
+                        self, "已发送过", f"这些消息今天已全部发送过（共 {len(plan)} 条）。\n\n是否重新发送？")
+                    if ans != QtWidgets.QMessageBox.Yes:
+                        return
+                    run_id = SendLedger.fresh_run_id(run_id)
+                elif done:
+                    ans = QtWidgets.QMessageBox.question(
+                        self, "断点续发",
+                        f"检测到上次未完成的发送（已完成 {done}/{len(plan)} 条）。\n\n是：从第一条未发送的继续\n否：全部重新发送",
+                        QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No | QtWidgets.QMessageBox.Cancel)
+                    if ans == QtWidgets.QMessageBox.Cancel:
+                        return
+                    if ans == QtWidgets.QMessageBox.No:
+                        run_id = SendLedger.fresh_run_id(run_id)
+            
+            # 测试发送不算处理过，不更新增量快照
+            self._sending_delta = None if test_mode else self._delta_state
             self.btn_send.setEnabled(False)
             self.sender.progressed.connect(self._on_progress)
             self.sender.finished.connect(self._on_finished)
@@ -1149,7 +847,7 @@ class MainWindow(QtWidgets.QMainWindow):
             
             self._send_thread = threading.Thread(
                 target=self.sender.send_messages,
-                args=(self.messages_to_send, mi, ma, send_to_groups, group_targets, test_mode, test_target),
+                args=(self.messages_to_send, mi, ma, send_to_groups, group_targets, test_mode, test_target, run_id),
                 daemon=True
             )
             self._send_thread.start()
@@ -1178,10 +876,19 @@ class MainWindow(QtWidgets.QMainWindow):
         """发送完成"""
         self.btn_send.setEnabled(True)
         self.status.setText("发送完成！")
+        if self._sending_delta is not None:
+            path, previous, current, keys = self._sending_delta
+            self._sending_delta = None
+            delivered = {message_key(m) for m in self.sender.delivered}
+            try:
+                save_snapshot(processed_snapshot(previous, current, [k for k in keys if k not in delivered]), path)
+            except Exception as e:
+                self.status.setText(f"发送完成！（增量快照保存失败：{e}）")
 
     def _on_failed(self, err: str):
         """发送失败"""
         self.btn_send.setEnabled(True)
+        self._sending_delta = None
         QtWidgets.QMessageBox.critical(self, "发送失败", err)
 
     def _on_send_method_changed(self):
@@ -0,0 +1,99 @@
+"""增量通知：白天扣餐表会多次重新导出，与上次发送时的快照对比，只通知有变化的会员
+
+快照是某一天的会员表：索引为会员键（有电话用电话，没有电话用“姓名:xxx”），
+列 mark（当天格子内容，空为未用餐）、initial（剩余餐数）、remaining（剩余）。
+对比按会员键整列对齐后逐列比较，不逐行循环。
+"""
+
+import os
+from typing import Iterable, Optional, Sequence
+
+import pandas as pd
+
+from meal_stats import LazyMessages, coerce_count, day_columns, members
+from records import MemberMessage
+from state import state_path
+
+
+SNAPSHOT_COLUMNS = ["mark", "initial", "remaining"]
+
+
+def member_keys(names: pd.Series, phones: pd.Series) -> pd.Series:
+    """会员键：有电话用电话（去掉 Excel 数字的 .0），没有电话用姓名"""
+    phone = phones.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    missing = phones.isna() | phone.isin(["", "nan", "无电话"])
+    return phone.where(~missing, "姓名:" + names.astype(str).str.strip())
+
+
+def message_key(message: MemberMessage) -> str:
+    return message.phone if message.phone and message.phone != "无电话" else f"姓名:{message.name.strip()}"
+
+
+def day_snapshot(df: pd.DataFrame, day: int) -> pd.DataFrame:
+    """某天的会员快照（全部会员，不只当天用餐的），同一会员键出现多行时以最后一行为准"""
+    rows = members(df)
+    days = day_columns(rows)
+    if day not in days:
+        raise RuntimeError(f"未找到{day}号的数据列。可用日期: {sorted(days)}")
+    cell = rows[days[day]]
+    mark = cell.astype(str).str.strip().where(cell.notna(), "")
+    snapshot = pd.DataFrame({
+        "key": member_keys(rows["会员姓名"], rows["电话"]),
+        "mark": mark.where(mark != "nan", ""),
+        "initial": coerce_count(rows["剩余餐数"]).astype(float),
+        "remaining": coerce_count(rows["剩余"]).astype(float),
+    })
+    return snapshot.drop_duplicates("key", keep="last").set_index("key")
+
+
+def snapshot_delta(previous: Optional[pd.DataFrame], current: pd.DataFrame) -> pd.Index:
+    """当天用餐的会员中需要通知的会员键：新打了标记、标记内容变了，或餐数有变化。
+    没有上次快照时全部需要通知"""
+    diners = current[current["mark"] != ""]
+    if previous is None:
+        return diners.index
+    before = previous.reindex(diners.index)
+    changed = before["mark"].fillna("").ne(diners["mark"])
+    for col in ("initial", "remaining"):
+        changed |= before[col].ne(diners[col])  # 上次没有的会员为 NaN，比较结果为 True
+    return diners.index[changed.to_numpy()]
+
+
+def processed_snapshot(previous: Optional[pd.DataFrame], current: pd.DataFrame,
+                       pending: Iterable[str]) -> pd.DataFrame:
+    """发送结束后要保存的快照：没发出去的会员（pending）保持上次的状态，下次增量时仍会被选中"""
+    pending = current.index.intersection(pd.Index(list(pending)))
+    if not len(pending):
+        return current
+    result = current.drop(index=pending)
+    if previous is not None:
+        kept = previous.loc[previous.index.intersection(pending)]
+        result = pd.concat([result, kept])
+    return result
+
+
+def filter_messages(messages: Sequence[MemberMessage], keys: Iterable[str]) -> Sequence[MemberMessage]:
+    """只保留 keys 中的会员；按需渲染的消息整列比对会员键后取子集，仍不渲染"""
+    if isinstance(messages, LazyMessages):
+        values = messages.values
+        return messages.select(member_keys(values["姓名"], values["电话"]).isin(list(keys)).to_numpy())
+    wanted = set(keys)
+    return [m for m in messages if message_key(m) in wanted]
+
+
+def snapshot_path(month: str, day: int) -> str:
+    return state_path(f"snapshot_{month}_{int(day):02d}.csv")
+
+
+def load_snapshot(path: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    frame = pd.read_csv(path, encoding="utf-8", dtype={"key": str, "mark": str}, keep_default_na=False)
+    frame[["initial", "remaining"]] = frame[["initial", "remaining"]].apply(pd.to_numeric, errors="coerce")
+    return frame.set_index("key")[SNAPSHOT_COLUMNS]
+
+
+def save_snapshot(snapshot: pd.DataFrame, path: str):
+    tmp = path + ".tmp"
+    snapshot[SNAPSHOT_COLUMNS].rename_axis("key").to_csv(tmp, encoding="utf-8")
+    os.replace(tmp, path)
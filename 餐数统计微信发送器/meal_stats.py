@@ -0,0 +1,417 @@
+"""扣餐表统计（不依赖 Qt）：按整列计算已用/剩余餐数，整列生成个人消息和统计摘要，最后一次性拼接"""
+
+import os
+import re
+import time
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from records import MemberMessage
+from send_ledger import content_hash
+from templates import DEFAULT_TEMPLATES, compile_template
+
+
+_NUMBER = r"(-?\d+(?:\.\d+)?)"
+_DAY_HEADER = re.compile(r"^(\d{1,2})(?:\.0+)?\s*[号日]?$")
+# 10月15日、2024-10-15、2024/10/15、10-15（可带时间部分），取最后的日
+_DATE_HEADER = re.compile(r"^(?:\d{4}\s*[-/.年]\s*)?\d{1,2}\s*[-/.月]\s*(\d{1,2})\s*[日号]?(?:[\sT]\d{1,2}:\d{2}(?::\d{2})?)?$")
+_FULLWIDTH = str.maketrans("０１２３４５６７８９－．", "0123456789-.")
+
+
+def coerce_count(values: pd.Series) -> pd.Series:
+    """餐数列转成数值：数字原样；“12次”、“ 5 ”、全角数字等文本取其中的数字；空值和无法识别的记为 0"""
+    num = pd.to_numeric(values, errors="coerce")
+    bad = num.isna() & values.notna()
+    if bad.any():
+        text = values[bad].astype(str).str.translate(_FULLWIDTH)
+        num[bad] = pd.to_numeric(text.str.extract(_NUMBER, expand=False), errors="coerce")
+    return num.fillna(0)
+
+
+def header_day(col) -> Optional[int]:
+    """表头对应的日期（几号）：15、15.0、"15"、"15号"、"15日"、日期/时间对象、"10月15日"、"2024-10-15"；不是日期列返回 None"""
+    if isinstance(col, bool):
+        return None
+    if isinstance(col, (date, pd.Timestamp)):
+        return col.day
+    if isinstance(col, (int, float, np.integer, np.floating)):
+        return int(col) if float(col).is_integer() else None
+    text = str(col).strip()
+    m = _DAY_HEADER.match(text) or _DATE_HEADER.match(text)
+    return int(m.group(1)) if m else None
+
+
+def day_columns(df: pd.DataFrame) -> Dict[int, object]:
+    """{日期: 列名}，同一天有多列时取第一列（读表后列名可能已转成文本）"""
+    days: Dict[int, object] = {}
+    for col in df.columns:
+        day = header_day(col)
+        if day is not None and 1 <= day <= 31:
+            days.setdefault(day, col)
+    return days
+
+
+def members(df: pd.DataFrame) -> pd.DataFrame:
+    """有会员姓名的行"""
+    names = df["会员姓名"]
+    return df[names.notna() & (names.astype(str) != "nan")]
+
+
+def today_diners(df: pd.DataFrame, target_date: int) -> pd.DataFrame:
+    """有会员姓名、且当天格子有内容的行"""
+    df = members(df)
+    days = day_columns(df)
+    if target_date not in days:
+        raise RuntimeError(f"未找到{target_date}号的数据列。可用日期: {sorted(days)}")
+    col = days[target_date]
+    cell = df[col].astype(str).str.strip()
+    return df[df[col].notna() & (cell != "") & (cell != "nan")]
+
+
+def member_fields(rows: pd.DataFrame) -> pd.DataFrame:
+    """每位会员与日期无关的字段：姓名、电话、已用（负数显示“计算中”）、剩余，整列计算"""
+    initial = coerce_count(rows["剩余餐数"])
+    remaining = coerce_count(rows["剩余"])
+    used = initial - remaining
+    remaining_int = np.trunc(remaining).astype(np.int64)
+    return pd.DataFrame({
+        "name": rows["会员姓名"].astype(str).str.strip(),
+        # 纯数字的电话被 Excel 读成浮点数时去掉结尾的 .0
+        "phone": (rows["电话"].astype(str).str.replace(r"\.0$", "", regex=True)
+                  .where(rows["电话"].notna(), "无电话")),
+        # 负数多半是中途充值了餐数，暂不显示
+        "used": np.where(used < 0, "计算中", np.trunc(used).astype(np.int64).astype(str)),
+        "remaining": remaining_int,
+        "remaining_text": remaining_int.astype(str),
+    }, index=rows.index)
+
+
+class LazyMessages:
+    """当天用餐会员的个人消息，按需渲染：len() 直接是行数，迭代 / 下标取一条才渲染一条。
+    发送时每位收件人的消息在发出前一刻才生成，中途停止也不浪费后面的渲染；预览只取前几条。"""
+
+    def __init__(self, values: pd.DataFrame, remaining: Sequence[int], template_text: str):
+        # values：模板占位符对应的列（均已转成文本），每行一位收件人
+        self.values = values.reset_index(drop=True)
+        self.remaining = list(remaining)
+        self.template_text = template_text
+        self.template = compile_template(template_text)
+        self._columns = {c: self.values[c].tolist() for c in self.values.columns}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _render(self, i: int) -> MemberMessage:
+        row = {c: col[i] for c, col in self._columns.items()}
+        return MemberMessage(row["姓名"], row["电话"], self.template.render(row), row["当天"], row["已用"],
+                             self.remaining[i])
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[MemberMessage, "LazyMessages"]:
+        if isinstance(i, slice):
+            return self.select(range(len(self))[i])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._render(i)
+
+    def __iter__(self) -> Iterator[MemberMessage]:
+        for i in range(len(self)):
+            yield self._render(i)
+
+    def head(self, n: int) -> List[MemberMessage]:
+        return [self._render(i) for i in range(min(n, len(self)))]
+
+    def select(self, positions) -> "LazyMessages":
+        """按位置（或布尔掩码）取子集，仍然按需渲染"""
+        positions = np.asarray(positions)
+        positions = np.flatnonzero(positions) if positions.dtype == bool else positions.astype(np.int64)
+        return LazyMessages(self.values.iloc[positions], [self.remaining[i] for i in positions], self.template_text)
+
+    def render_all(self) -> List[MemberMessage]:
+        """一次整列渲染全部消息（需要完整列表时用，比逐条渲染快）"""
+        personal = self.template.render_frame(self.values).tolist()
+        return [MemberMessage(*v) for v in zip(self._columns["姓名"], self._columns["电话"], personal,
+                                                self._columns["当天"], self._columns["已用"], self.remaining)]
+
+    def summary_frame(self) -> pd.DataFrame:
+        """群汇总要用的字段，不渲染个人消息"""
+        frame = self.values[["姓名", "电话", "已用", "当天"]].copy()
+        frame["剩余"] = self.remaining
+        return frame
+
+    def signatures(self) -> List[str]:
+        """每条消息的内容指纹：由模板和渲染用到的数据决定，和渲染后的正文一一对应，不用先渲染"""
+        sig = pd.Series(content_hash(self.template_text), index=self.values.index, dtype=object)
+        for field in self.template.fields:
+            sig = sig + "\x1f" + self.values[field]
+        return sig.tolist()
+
+
+def render_day(fields: pd.DataFrame, today_meal: pd.Series, target_date: int,
+               rows: Optional[pd.DataFrame] = None,
+               templates: Optional[Dict[str, str]] = None) -> Tuple[LazyMessages, str]:
+    """当天用餐会员的个人消息（按需渲染）和统计摘要，摘要整列拼接后一次 join。
+    rows 为这些会员的原始行，个人消息模板可引用其中的列"""
+    name, used, remaining_text = fields["name"], fields["used"], fields["remaining_text"]
+    template_text = (templates or DEFAULT_TEMPLATES)["personal"]
+    template = compile_template(template_text)
+    values = pd.DataFrame({"姓名": name, "电话": fields["phone"], "已用": used, "剩余": remaining_text,
+                           "日期": str(target_date), "当天": today_meal.astype(str)}, index=fields.index)
+    if rows is not None:
+        by_name = {str(c).strip(): c for c in rows.columns}
+        for field in template.fields:
+            if field not in values.columns and field in by_name:
+                values[field] = rows[by_name[field]].fillna("").astype(str).to_numpy()
+    # 占位符缺列时在这里就报错，不要等到发送时
+    template.check(values.columns)
+    lines = "• " + name + ": 已用" + used + "次, 剩余" + remaining_text + "次\n"
+
+    messages = LazyMessages(values.astype(str), fields["remaining"].tolist(), template_text)
+    stats_summary = "".join([f"今日({target_date}号)用餐统计:\n", f"用餐人数: {len(fields)}\n\n", *lines.tolist()])
+    return messages, stats_summary
+
+
+def analyze_meal_data(df: pd.DataFrame, target_date: int,
+                      templates: Optional[Dict[str, str]] = None) -> Tuple[LazyMessages, str]:
+    """分析餐数数据，返回今日用餐人员的消息（按需渲染）和统计摘要"""
+    diners = today_diners(df, target_date)
+    return render_day(member_fields(diners), diners[day_columns(diners)[target_date]], target_date,
+                      diners, templates)
+
+
+class DinerIndex:
+    """加载文件时建一次的索引：日期 → 列名、日期 → 当天用餐的会员行位置，以及与日期无关的会员字段。
+    切换日期 / 重新分析只需按位置取行再渲染，结果按日期缓存。"""
+
+    def __init__(self, df: pd.DataFrame):
+        rows, order, ate = attendance_matrix(df)
+        self.rows = rows
+        self.columns = day_columns(rows)
+        self.fields = member_fields(rows)
+        self.positions: Dict[int, np.ndarray] = {d: np.flatnonzero(ate[:, i]) for i, d in enumerate(order)}
+        self._rendered: Dict[Tuple, Tuple[LazyMessages, str]] = {}
+
+    @property
+    def days(self) -> List[int]:
+        return sorted(self.columns)
+
+    def count(self, day: int) -> int:
+        return len(self.positions.get(day, ()))
+
+    def analyze(self, day: int, templates: Optional[Dict[str, str]] = None) -> Tuple[LazyMessages, str]:
+        if day not in self.columns:
+            raise RuntimeError(f"未找到{day}号的数据列。可用日期: {self.days}")
+        key = (day, tuple(sorted((templates or DEFAULT_TEMPLATES).items())))
+        if key not in self._rendered:
+            pos = self.positions[day]
+            rows = self.rows.iloc[pos]
+            self._rendered[key] = render_day(self.fields.iloc[pos], rows[self.columns[day]], day, rows, templates)
+        return self._rendered[key]
+
+
+def group_summary(messages: Sequence[MemberMessage], day: str, templates: Optional[Dict[str, str]] = None) -> str:
+    """发到群里的汇总消息：表头 + 每人一行 + 结尾，每行整列渲染后一次 join"""
+    templates = templates or DEFAULT_TEMPLATES
+    head = {"日期": day, "人数": len(messages)}
+    if isinstance(messages, LazyMessages):
+        frame = messages.summary_frame()
+    else:
+        frame = pd.DataFrame({
+            "姓名": [m.name for m in messages],
+            "电话": [m.phone for m in messages],
+            "已用": [m.used_meals for m in messages],
+            "剩余": [m.remaining_meals for m in messages],
+            "当天": [m.today_meal for m in messages],
+        })
+    frame.insert(0, "序号", range(1, len(messages) + 1))
+    lines = compile_template(templates["group_line"]).render_frame(frame).tolist()
+    return "".join([compile_template(templates["group_header"]).render(head),
+                    *(line + "\n" for line in lines),
+                    compile_template(templates["group_footer"]).render(head)])
+
+
+# ---- 月度报表 ----
+
+def attendance_matrix(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[int], np.ndarray]:
+    """会员 × 日期 的用餐布尔矩阵：所有日期列摊平后 factorize 一次，格子里不同的取值只有几种，
+    只对这几种判断是否为空白，再按编码取回并还原成 (会员数, 天数)"""
+    df = members(df)
+    days = day_columns(df)
+    order = sorted(days)
+    if not order:
+        return df, [], np.zeros((len(df), 0), dtype=bool)
+    codes, uniques = pd.factorize(df[[days[d] for d in order]].to_numpy(dtype=object).ravel())
+    filled = np.array([str(v).strip() not in ("", "nan") for v in uniques], dtype=bool)
+    ate = np.where(codes < 0, False, filled[codes]) if len(uniques) else np.zeros(len(codes), dtype=bool)
+    return df, order, ate.reshape(len(df), len(order))
+
+
+def month_report(df: pd.DataFrame) -> Dict[str, object]:
+    """整月统计，一次计算得到：
+    members — 每位会员的用餐天数、首次/最近用餐日、已用/剩余餐数（按用餐天数降序）
+    days    — 每天的用餐人数
+    totals  — 会员数、有用餐的会员数、总人次、日均人次、最忙的一天
+    """
+    rows, order, ate = attendance_matrix(df)
+    day_arr = np.asarray(order, dtype=np.int64)
+    eaten = ate.sum(axis=1)
+    any_day = eaten > 0
+    first = np.where(any_day, day_arr[ate.argmax(axis=1)] if order else 0, 0)
+    last = np.where(any_day, day_arr[len(order) - 1 - ate[:, ::-1].argmax(axis=1)] if order else 0, 0)
+    initial = coerce_count(rows["剩余餐数"]) if "剩余餐数" in rows.columns else pd.Series(0, index=rows.index)
+    remaining = coerce_count(rows["剩余"]) if "剩余" in rows.columns else pd.Series(0, index=rows.index)
+    per_member = pd.DataFrame({
+        "会员姓名": rows["会员姓名"].astype(str).str.strip().to_numpy(),
+        "电话": (rows["电话"].astype(str).str.replace(r"\.0$", "", regex=True).where(rows["电话"].notna(), "")
+               .to_numpy() if "电话" in rows.columns else ""),
+        "用餐天数": eaten,
+        "首次用餐": first,
+        "最近用餐": last,
+        "已用餐数": np.trunc(initial - remaining).astype(np.int64).to_numpy(),
+        "剩余餐数": np.trunc(remaining).astype(np.int64).to_numpy(),
+    }).sort_values(["用餐天数", "会员姓名"], ascending=[False, True], kind="stable", ignore_index=True)
+    per_day = pd.DataFrame({"日期": day_arr, "用餐人数": ate.sum(axis=0)})
+
+    served = per_day[per_day["用餐人数"] > 0]
+    busiest = per_day.loc[per_day["用餐人数"].idxmax()] if len(served) else None
+    totals = {
+        "会员数": len(per_member),
+        "有用餐会员数": int(any_day.sum()),
+        "总用餐人次": int(eaten.sum()),
+        "有用餐天数": len(served),
+        "日均用餐人数": round(float(served["用餐人数"].mean()), 1) if len(served) else 0.0,
+        "最忙的一天": int(busiest["日期"]) if busiest is not None else None,
+        "最忙一天人数": int(busiest["用餐人数"]) if busiest is not None else 0,
+    }
+    return {"members": per_member, "days": per_day, "totals": totals}
+
+
+def format_month_report(report: Dict[str, object], top: int = 20) -> str:
+    """预览文本：总计 + 每日人数 + 用餐天数最多的 top 位会员"""
+    totals, per_day, per_member = report["totals"], report["days"], report["members"]
+    lines = ["📅 本月用餐统计", ""]
+    lines += [f"{k}: {v}" for k, v in totals.items() if v is not None]
+    lines += ["", "每日用餐人数:"]
+    lines += (per_day["日期"].astype(str) + "号: " + per_day["用餐人数"].astype(str) + " 人").tolist()
+    shown = per_member.head(top)
+    lines += ["", f"用餐天数前 {len(shown)} 位:"]
+    lines += ("• " + shown["会员姓名"] + ": " + shown["用餐天数"].astype(str) + " 天, 剩余"
+              + shown["剩余餐数"].astype(str) + "次").tolist()
+    return "\n".join(lines)
+
+
+def export_month_report(report: Dict[str, object], path: str) -> str:
+    """导出月度报表：xlsx 为 会员 / 每日 / 总计 三张表；csv 写会员表，每日人数另存为 *_每日.csv。返回写入的路径"""
+    ext = os.path.splitext(path)[1].lower()
+    totals = pd.DataFrame(list(report["totals"].items()), columns=["项目", "数值"])
+    if ext == ".csv":
+        stem = os.path.splitext(path)[0]
+        report["members"].to_csv(path, index=False, encoding="utf-8-sig")
+        report["days"].to_csv(stem + "_每日.csv", index=False, encoding="utf-8-sig")
+        return path
+    if ext != ".xlsx":
+        raise RuntimeError(f"不支持的导出格式: {ext}（可选 .xlsx / .csv）")
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        report["members"].to_excel(writer, sheet_name="会员", index=False)
+        report["days"].to_excel(writer, sheet_name="每日", index=False)
+        totals.to_excel(writer, sheet_name="总计", index=False)
+    return path
+
+
+def _month_report_per_day(df: pd.DataFrame) -> Dict[int, int]:
+    """逐日调用 today_diners 的做法（31 次清洗），仅供基准测试对照"""
+    return {day: len(today_diners(df, day)) for day in sorted(day_columns(df))}
+
+
+def make_sample_sheet(count: int, seed: int = 0) -> pd.DataFrame:
+    """生成基准测试用的扣餐表：会员姓名、电话、剩余餐数、剩余、1..31 号"""
+    rng = np.random.default_rng(seed)
+    initial = rng.integers(10, 60, size=count)
+    data = {
+        "会员姓名": [f"会员{i}" for i in range(count)],
+        "电话": rng.integers(13000000000, 19999999999, size=count).astype(str),
+        "剩余餐数": initial,
+        "剩余": initial - rng.integers(-2, 30, size=count),
+    }
+    marks = np.array(["午餐", "晚餐", "午晚", None, None])
+    for day in range(1, 32):
+        data[day] = marks[rng.integers(0, len(marks), size=count)]
+    return pd.DataFrame(data)
+
+
+def _analyze_rowwise(df: pd.DataFrame, target_date: int) -> Tuple[List[MemberMessage], str]:
+    """逐行 iterrows + 字符串 += 的旧实现，仅供基准测试和结果对照"""
+    diners = today_diners(df, target_date)
+    col = day_columns(df)[target_date]
+    messages = []
+    summary = f"今日({target_date}号)用餐统计:\n"
+    summary += f"用餐人数: {len(diners)}\n\n"
+    for _, row in diners.iterrows():
+        name = str(row['会员姓名']).strip()
+        phone = str(row['电话']) if pd.notna(row['电话']) else '无电话'
+        initial = row['剩余餐数'] if pd.notna(row['剩余餐数']) else 0
+        remaining = row['剩余'] if pd.notna(row['剩余']) else 0
+        used = initial - remaining
+        display_used = "计算中" if used < 0 else f"{int(used)}"
+        text = (f"亲爱的{name}，您好！\n\n今天您已用餐，餐数统计如下：\n📊 今日用餐：已记录\n"
+                f"🍽️ 本月已用餐：{display_used}次  \n💰 剩余餐数：{int(remaining)}次\n\n"
+                "感谢您选择简知轻食！祝您用餐愉快！😊")
+        messages.append(MemberMessage(name, phone, text, str(row[col]), display_used, int(remaining)))
+        summary += f"• {name}: 已用{display_used}次, 剩余{int(remaining)}次\n"
+    return messages, summary
+
+
+def benchmark(sizes=(1000, 5000, 20000), target_date: int = 15) -> List[Tuple[int, float, float]]:
+    """旧实现与整列实现的耗时对比，并核对两者输出一致；返回 [(会员数, 旧秒数, 新秒数)]"""
+    results = []
+    for n in sizes:
+        df = make_sample_sheet(n)
+        t0 = time.perf_counter()
+        old_msgs, old_summary = _analyze_rowwise(df, target_date)
+        t1 = time.perf_counter()
+        new_msgs, new_summary = analyze_meal_data(df, target_date)
+        new_msgs = new_msgs.render_all()
+        t2 = time.perf_counter()
+        same = old_summary == new_summary and all(
+            (a.name, a.phone, a.message, a.today_meal, a.used_meals, a.remaining_meals)
+            == (b.name, b.phone, b.message, b.today_meal, b.used_meals, b.remaining_meals)
+            for a, b in zip(old_msgs, new_msgs)) and len(old_msgs) == len(new_msgs)
+        results.append((n, t1 - t0, t2 - t1))
+        print(f"{n:>6} 会员  旧 {t1 - t0:7.3f}s  新 {t2 - t1:7.3f}s  "
+              f"加速 {(t1 - t0) / max(t2 - t1, 1e-9):6.1f}x  {'一致' if same else '不一致'}")
+    return results
+
+
+def benchmark_month(sizes=(1000, 5000, 20000)) -> List[Tuple[int, float, float]]:
+    """逐日 31 次统计与一次性月度报表的耗时对比，并核对每日人数一致"""
+    results = []
+    for n in sizes:
+        df = make_sample_sheet(n)
+        t0 = time.perf_counter()
+        old = _month_report_per_day(df)
+        t1 = time.perf_counter()
+        report = month_report(df)
+        t2 = time.perf_counter()
+        same = old == dict(zip(report["days"]["日期"].tolist(), report["days"]["用餐人数"].tolist()))
+        results.append((n, t1 - t0, t2 - t1))
+        print(f"{n:>6} 会员  逐日 {t1 - t0:7.3f}s  月报 {t2 - t1:7.3f}s  "
+              f"加速 {(t1 - t0) / max(t2 - t1, 1e-9):6.1f}x  {'一致' if same else '不一致'}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="餐数统计基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--day", type=int, default=15)
+    parser.add_argument("--month", action="store_true", help="测试月度报表")
+    args = parser.parse_args()
+    if args.month:
+        benchmark_month(args.sizes)
+    else:
+        benchmark(args.sizes, args.day)
@@ -0,0 +1,208 @@
+"""本地餐数台账库：每次加载的扣餐表整月导入 SQLite，按会员 / 手机号 / 月份 / 日期建索引
+
+跨月查询某位会员的用餐记录、余额变化，或直接取某天的用餐名单，都不必再打开各月的 Excel。
+同一个月重复导入会整体替换该月数据，结果与只导入一次相同。
+"""
+
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from state import state_path
+from meal_stats import attendance_matrix, coerce_count, day_columns, member_fields
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id     INTEGER PRIMARY KEY,
+    name   TEXT NOT NULL,
+    phone  TEXT NOT NULL DEFAULT '',
+    UNIQUE (name, phone)
+);
+CREATE INDEX IF NOT EXISTS ix_members_phone ON members(phone);
+CREATE TABLE IF NOT EXISTS months (
+    month        TEXT PRIMARY KEY,      -- YYYY-MM
+    source       TEXT,
+    imported_at  TEXT
+);
+CREATE TABLE IF NOT EXISTS balances (
+    member_id  INTEGER NOT NULL REFERENCES members(id),
+    month      TEXT NOT NULL,
+    initial    REAL,                    -- 表中“剩余餐数”（月初）
+    remaining  REAL,                    -- 表中“剩余”
+    PRIMARY KEY (member_id, month)
+);
+CREATE TABLE IF NOT EXISTS meals (
+    member_id  INTEGER NOT NULL REFERENCES members(id),
+    month      TEXT NOT NULL,
+    day        INTEGER NOT NULL,
+    mark       TEXT,                    -- 当天格子里的内容（午餐 / 晚餐 …）
+    PRIMARY KEY (member_id, month, day)
+);
+CREATE INDEX IF NOT EXISTS ix_meals_day ON meals(month, day);
+"""
+
+_MONTH_IN_NAME = re.compile(r"(20\d{2})\s*[年._-]?\s*(1[0-2]|0?[1-9])\s*月?")
+
+
+def month_key(value=None) -> str:
+    """统一成 YYYY-MM；None 为当月"""
+    if value is None:
+        return date.today().strftime("%Y-%m")
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m")
+    m = _MONTH_IN_NAME.search(str(value))
+    if not m:
+        raise ValueError(f"无法识别的月份: {value}（应为 YYYY-MM）")
+    return f"{m.group(1)}-{int(m.group(2)):02d}"
+
+
+def month_from_filename(path: str) -> Optional[str]:
+    """从文件名里找月份，如 “2024年10月扣餐表.xlsx”、“扣餐表2024-10.xlsx”；找不到返回 None"""
+    m = _MONTH_IN_NAME.search(str(path).replace("\\", "/").rsplit("/", 1)[-1])
+    return f"{m.group(1)}-{int(m.group(2)):02d}" if m else None
+
+
+class MealStore:
+    """餐数台账库（单文件 SQLite，WAL 模式）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or state_path("meal_ledger.sqlite3")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---- 导入 ----
+
+    def _member_ids(self, names: List[str], phones: List[str]) -> List[int]:
+        self.conn.executemany("INSERT OR IGNORE INTO members (name, phone) VALUES (?, ?)", zip(names, phones))
+        ids: Dict[Tuple[str, str], int] = {}
+        pairs = list(dict.fromkeys(zip(names, phones)))
+        # 分批按名字取回 id，避免超出 SQLite 的参数个数上限
+        for i in range(0, len(pairs), 500):
+            batch = pairs[i:i + 500]
+            marks = ", ".join("?" * len(batch))
+            cur = self.conn.execute(f"SELECT id, name, phone FROM members WHERE name IN ({marks})",
+                                    [n for n, _ in batch])
+            ids.update({(n, p): mid for mid, n, p in cur})
+        return [ids[(n, p)] for n, p in zip(names, phones)]
+
+    def import_sheet(self, df: pd.DataFrame, month=None, source: str = "") -> Dict[str, int]:
+        """整张扣餐表导入为一个月的数据（先删后写，同一事务），返回 {会员数, 用餐记录数}"""
+        month = month_key(month)
+        rows, order, ate = attendance_matrix(df)
+        fields = member_fields(rows)
+        names = fields["name"].tolist()
+        phones = fields["phone"].where(fields["phone"] != "无电话", "").tolist()
+        initial = coerce_count(rows["剩余餐数"]).to_numpy(dtype=float)
+        remaining = coerce_count(rows["剩余"]).to_numpy(dtype=float)
+
+        member_pos, day_pos = np.nonzero(ate)
+        if order:
+            columns = day_columns(rows)
+            day_cols = [columns[d] for d in order]
+            values = rows[day_cols].to_numpy(dtype=object)
+            marks = [str(v).strip() for v in values[member_pos, day_pos]]
+        else:
+            marks = []
+        days = np.asarray(order, dtype=np.int64)[day_pos].tolist() if order else []
+
+        with self.conn:
+            ids = self._member_ids(names, phones)
+            self.conn.execute("DELETE FROM meals WHERE month = ?", (month,))
+            self.conn.execute("DELETE FROM balances WHERE month = ?", (month,))
+            # 同名同电话出现多行时以最后一行为准
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO balances (member_id, month, initial, remaining) VALUES (?, ?, ?, ?)",
+                zip(ids, [month] * len(ids), initial.tolist(), remaining.tolist()))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meals (member_id, month, day, mark) VALUES (?, ?, ?, ?)",
+                zip([ids[i] for i in member_pos.tolist()], [month] * len(days), days, marks))
+            self.conn.execute("INSERT OR REPLACE INTO months (month, source, imported_at) VALUES (?, ?, ?)",
+                              (month, source, datetime.now().isoformat(timespec="seconds")))
+        return {"members": len(set(ids)), "meals": len(days)}
+
+    # ---- 查询 ----
+
+    def _query(self, sql: str, params=()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.conn, params=list(params))
+
+    def months(self) -> List[str]:
+        return [m for (m,) in self.conn.execute("SELECT month FROM months ORDER BY month")]
+
+    def _member_filter(self, name: Optional[str], phone: Optional[str]) -> Tuple[str, List]:
+        if not name and not phone:
+            raise ValueError("请提供会员姓名或手机号")
+        clauses, params = [], []
+        if name:
+            clauses.append("m.name = ?")
+            params.append(str(name).strip())
+        if phone:
+            clauses.append("m.phone = ?")
+            params.append(re.sub(r"\D", "", str(phone)))
+        return " AND ".join(clauses), params
+
+    def member_meals(self, name: Optional[str] = None, phone: Optional[str] = None,
+                     start_month=None, end_month=None) -> pd.DataFrame:
+        """某位会员各月每天的用餐记录"""
+        where, params = self._member_filter(name, phone)
+        sql = f"""SELECT m.name AS 会员姓名, m.phone AS 电话, x.month AS 月份, x.day AS 日期, x.mark AS 用餐
+                  FROM meals x JOIN members m ON m.id = x.member_id WHERE {where}"""
+        if start_month:
+            sql += " AND x.month >= ?"
+            params.append(month_key(start_month))
+        if end_month:
+            sql += " AND x.month <= ?"
+            params.append(month_key(end_month))
+        return self._query(sql + " ORDER BY x.month, x.day", params)
+
+    def member_balances(self, name: Optional[str] = None, phone: Optional[str] = None) -> pd.DataFrame:
+        """某位会员每个月的月初餐数、剩余、当月用餐天数，看余额怎么变化"""
+        where, params = self._member_filter(name, phone)
+        sql = f"""SELECT m.name AS 会员姓名, m.phone AS 电话, b.month AS 月份,
+                         b.initial AS 剩余餐数, b.remaining AS 剩余,
+                         (SELECT COUNT(*) FROM meals x WHERE x.member_id = b.member_id AND x.month = b.month) AS 用餐天数
+                  FROM balances b JOIN members m ON m.id = b.member_id WHERE {where}
+                  ORDER BY b.month"""
+        return self._query(sql, params)
+
+    def month_counts(self, month=None) -> pd.DataFrame:
+        """某个月每天的用餐人数"""
+        return self._query("SELECT day AS 日期, COUNT(*) AS 用餐人数 FROM meals WHERE month = ? "
+                           "GROUP BY day ORDER BY day", [month_key(month)])
+
+    def day_frame(self, month, day: int) -> pd.DataFrame:
+        """某天的用餐名单，列与扣餐表一致（会员姓名、电话、剩余餐数、剩余、当天的日期列），可直接交给 analyze_meal_data"""
+        frame = self._query(
+            """SELECT m.name AS 会员姓名, NULLIF(m.phone, '') AS 电话, b.initial AS 剩余餐数,
+                      b.remaining AS 剩余, x.mark AS mark
+               FROM meals x JOIN members m ON m.id = x.member_id
+               LEFT JOIN balances b ON b.member_id = x.member_id AND b.month = x.month
+               WHERE x.month = ? AND x.day = ? ORDER BY x.rowid""", [month_key(month), int(day)])
+        return frame.rename(columns={"mark": int(day)})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="餐数台账查询")
+    parser.add_argument("--name", help="会员姓名")
+    parser.add_argument("--phone", help="手机号")
+    parser.add_argument("--month", help="月份 YYYY-MM，查看每天的用餐人数")
+    parser.add_argument("--db", help="数据库路径，默认 ~/.meal_count_sender/meal_ledger.sqlite3")
+    args = parser.parse_args()
+
+    store = MealStore(args.db)
+    if args.name or args.phone:
+        print(store.member_balances(args.name, args.phone).to_string(index=False))
+    else:
+        print(store.month_counts(args.month).to_string(index=False))
+    store.close()
@@ -0,0 +1,173 @@
+"""会员查找索引：加载时对 会员姓名 / 电话 建一次，支持前缀、包含和拼音首字母（如 zs → 张三）
+
+前缀查找在排好序的键上二分；包含查找把所有键用分隔符拼成一个长字符串后用 str.find 跳着找，
+都不逐个会员比较。拼音首字母优先用 pypinyin，没装时按 GB2312 一级汉字的区位范围取首字母
+（二级汉字保持原字，仍可按汉字查找）。重新加载表格时，已算过的首字母直接复用。
+"""
+
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from meal_stats import member_fields, members
+
+try:
+    from pypinyin import Style, lazy_pinyin
+    HAS_PYPINYIN = True
+except ImportError:
+    HAS_PYPINYIN = False
+
+
+# GB2312 一级汉字按拼音排序，各首字母的起始区位码
+_GB_INITIALS = [
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z"),
+]
+_GB_STARTS = [code for code, _ in _GB_INITIALS]
+_GB_END = 0xD7F9
+_SEP = "\x00"
+
+
+def _char_initial(ch: str) -> str:
+    if ch.isascii():
+        return ch.lower() if ch.isalnum() else ""
+    try:
+        raw = ch.encode("gb2312")
+    except UnicodeEncodeError:
+        return ch
+    if len(raw) != 2:
+        return ch
+    code = raw[0] << 8 | raw[1]
+    if not _GB_STARTS[0] <= code <= _GB_END:
+        return ch
+    return _GB_INITIALS[bisect_right(_GB_STARTS, code) - 1][1]
+
+
+def pinyin_initials(text: str) -> str:
+    """拼音首字母（小写）；字母数字原样保留，其它符号去掉"""
+    text = str(text).strip()
+    if HAS_PYPINYIN:
+        return "".join(p[:1].lower() for p in lazy_pinyin(text, style=Style.FIRST_LETTER, errors="default")
+                       if p[:1].isalnum())
+    return "".join(_char_initial(ch) for ch in text)
+
+
+class _KeyIndex:
+    """一组字符串键（每个键对应一个会员位置）上的前缀与包含查找"""
+
+    def __init__(self, keys: List[str]):
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.sorted_keys = [keys[i] for i in order]
+        self.sorted_pos = order
+        # 拼接串里第 i 个键从 starts[i] 开始
+        self.blob = _SEP.join(keys)
+        self.starts: List[int] = []
+        offset = 0
+        for key in keys:
+            self.starts.append(offset)
+            offset += len(key) + 1
+
+    def prefix(self, query: str, limit: int) -> List[int]:
+        lo = bisect_left(self.sorted_keys, query)
+        hi = bisect_left(self.sorted_keys, query + "\uffff", lo)
+        return self.sorted_pos[lo:min(hi, lo + limit)]
+
+    def contains(self, query: str, limit: int) -> List[int]:
+        found: List[int] = []
+        at = self.blob.find(query)
+        while at >= 0 and len(found) < limit:
+            i = bisect_right(self.starts, at) - 1
+            found.append(i)
+            # 跳到下一个键，同一个键里多次出现只算一次
+            at = self.blob.find(query, self.starts[i + 1] if i + 1 < len(self.starts) else len(self.blob))
+        return found
+
+
+class MemberIndex:
+    """会员查找索引。rebuild(df) 在加载 / 重新加载表格时调用，首字母按姓名缓存，只为新出现的姓名计算"""
+
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        self._initials: Dict[str, str] = {}
+        self.fields = pd.DataFrame(columns=["name", "phone", "used", "remaining", "remaining_text"])
+        self._names = self._phones = self._abbr = _KeyIndex([])
+        if df is not None:
+            self.rebuild(df)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def rebuild(self, df: pd.DataFrame) -> int:
+        """重建索引，返回本次新计算首字母的姓名数"""
+        fields = member_fields(members(df)).reset_index(drop=True)
+        names = fields["name"].tolist()
+        new = [n for n in dict.fromkeys(names) if n not in self._initials]
+        self._initials.update((n, pinyin_initials(n)) for n in new)
+        self.fields = fields
+        self._names = _KeyIndex([n.lower() for n in names])
+        self._phones = _KeyIndex([p if p != "无电话" else "" for p in fields["phone"].tolist()])
+        self._abbr = _KeyIndex([self._initials[n] for n in names])
+        return len(new)
+
+    def search(self, query: str, limit: int = 20) -> List[int]:
+        """返回匹配的会员位置（对应 self.fields 的行），完全匹配 > 前缀 > 包含"""
+        query = str(query).strip().lower()
+        if not query or not len(self):
+            return []
+        if query.isdigit():
+            indexes: Tuple[_KeyIndex, ...] = (self._phones,)
+        elif query.isascii():
+            indexes = (self._abbr, self._names)
+        else:
+            indexes = (self._names,)
+        result: Dict[int, None] = {}
+        for index in indexes:
+            for pos in index.prefix(query, limit):
+                result.setdefault(pos)
+        for index in indexes:
+            if len(result) >= limit:
+                break
+            for pos in index.contains(query, limit):
+                result.setdefault(pos)
+        ranked = sorted(result, key=lambda p: self.fields.at[p, "name"].lower() != query)
+        return ranked[:limit]
+
+    def describe(self, positions: List[int]) -> List[str]:
+        rows = self.fields.iloc[positions]
+        return [f"{r.name}  {r.phone}  已用{r.used}次  剩余{r.remaining_text}次" for r in rows.itertuples()]
+
+
+def benchmark(count: int = 5000, queries=("hy", "hy12", "会员12", "138", "0001", "员3")) -> Dict[str, float]:
+    """建索引耗时与每次查询的平均耗时（毫秒）"""
+    from meal_stats import make_sample_sheet
+
+    df = make_sample_sheet(count)
+    t0 = time.perf_counter()
+    index = MemberIndex(df)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index.rebuild(df)
+    rebuild = time.perf_counter() - t0
+    result = {"build_ms": build * 1000, "rebuild_ms": rebuild * 1000}
+    print(f"{count} 位会员  建索引 {build * 1000:.1f}ms  重新加载 {rebuild * 1000:.1f}ms"
+          f"  （{'pypinyin' if HAS_PYPINYIN else 'GB2312 首字母表'}）")
+    for q in queries:
+        t0 = time.perf_counter()
+        for _ in range(100):
+            hits = index.search(q)
+        ms = (time.perf_counter() - t0) * 10
+        result[q] = ms
+        print(f"  {q!r:<10} {len(hits):3d} 条  {ms:.3f}ms/次")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="会员查找索引测试")
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args()
+    benchmark(args.count)
@@ -0,0 +1,51 @@
+"""紧凑的记录类型：每位会员的待发消息用 __slots__ 类代替 6 个键的 dict，重复的状态字符串做驻留"""
+
+import sys
+import tracemalloc
+from typing import Tuple, Union
+
+
+class MemberMessage:
+    """一位今日用餐会员的待发消息"""
+
+    __slots__ = ("name", "phone", "message", "today_meal", "used_meals", "remaining_meals")
+
+    def __init__(self, name: str, phone: str, message: str, today_meal: str,
+                 used_meals: str, remaining_meals: Union[int, str]):
+        self.name = name
+        self.phone = sys.intern(phone) if phone == "无电话" else phone
+        self.message = message
+        self.today_meal = sys.intern(today_meal)  # 当天格子里的内容只有少数几种
+        self.used_meals = sys.intern(used_meals)
+        self.remaining_meals = remaining_meals
+
+
+def memory_comparison(n: int = 100000) -> Tuple[int, int]:
+    """n 条记录下 dict 与 slots 记录的内存（字节），返回 (旧, 新) 并打印"""
+
+    def build(make):
+        tracemalloc.start()
+        try:
+            data = [make(i) for i in range(n)]
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del data
+        return size
+
+    # "".join / str() 模拟从表格读出的字符串：每条都是新对象，驻留后才共享
+    def as_dict(i):
+        return {"name": f"会员{i}", "phone": f"1380000{i % 10000:04d}", "message": f"亲爱的会员{i}，您好！",
+                "today_meal": "".join(["午", "餐"]), "used_meals": str(i % 30), "remaining_meals": 30 - i % 30}
+
+    def as_record(i):
+        return MemberMessage(f"会员{i}", f"1380000{i % 10000:04d}", f"亲爱的会员{i}，您好！",
+                             "".join(["午", "餐"]), str(i % 30), 30 - i % 30)
+
+    old, new = build(as_dict), build(as_record)
+    print(f"{n} 条：dict {old / 1e6:7.2f} MB  slots {new / 1e6:7.2f} MB  节省 {1 - new / old:5.1%}")
+    return old, new
+
+
+if __name__ == "__main__":
+    memory_comparison()
@@ -0,0 +1,11 @@
+"""本地状态目录（台账库、快照、模板、发送台账）"""
+
+import os
+
+
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".meal_count_sender")
+
+
+def state_path(name: str) -> str:
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
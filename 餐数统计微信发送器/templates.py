@@ -0,0 +1,165 @@
+"""消息模板：个人消息和群汇总的文案放在 ~/.meal_count_sender/templates.json，改措辞不用改代码
+
+模板用 {占位符}，例如 "亲爱的{姓名}，您好！"。每个模板只解析一次（带小缓存），
+渲染时先核对占位符都有对应的列，再对所有收件人整列拼接字符串，一次得到全部消息。
+"""
+
+import json
+import os
+import string
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from state import state_path
+
+
+DEFAULT_TEMPLATES: Dict[str, str] = {
+    "personal": ("亲爱的{姓名}，您好！\n\n今天您已用餐，餐数统计如下：\n📊 今日用餐：已记录\n"
+                 "🍽️ 本月已用餐：{已用}次  \n💰 剩余餐数：{剩余}次\n\n感谢您选择简知轻食！祝您用餐愉快！😊"),
+    "group_header": "📊 今日用餐统计报告 ({日期})\n\n用餐人数：{人数} 人\n\n",
+    "group_line": "{序号}. {姓名}：已用{已用}次，剩余{剩余}次",
+    "group_footer": "\n💡 详细信息请查看餐数统计表",
+}
+
+# 各模板可用的占位符；个人消息还可以引用扣餐表中的任意列名（如 {备注}）
+PLACEHOLDERS: Dict[str, Tuple[str, ...]] = {
+    "personal": ("姓名", "电话", "已用", "剩余", "日期", "当天"),
+    "group_header": ("日期", "人数"),
+    "group_line": ("序号", "姓名", "电话", "已用", "剩余", "当天"),
+    "group_footer": ("日期", "人数"),
+}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class CompiledTemplate:
+    """解析后的模板：文字片段与占位符交替，parts[i] 为 (前面的文字, 占位符或 None)"""
+
+    __slots__ = ("text", "parts", "fields")
+
+    def __init__(self, text: str):
+        self.text = text
+        parts: List[Tuple[str, Optional[str]]] = []
+        try:
+            for literal, field, spec, conv in string.Formatter().parse(text):
+                if field is not None and (spec or conv):
+                    raise TemplateError(f"占位符 {{{field}}} 不支持格式说明，请只写 {{{field.split('!')[0]}}}")
+                if field is not None and not field.strip():
+                    raise TemplateError("模板中有空的 {}，字面的花括号请写成 {{ 和 }}")
+                parts.append((literal, field.strip() if field is not None else None))
+        except ValueError as e:
+            if isinstance(e, TemplateError):
+                raise
+            raise TemplateError(f"模板格式错误: {e}") from None
+        self.parts = tuple(parts)
+        self.fields = tuple(dict.fromkeys(f for _, f in parts if f is not None))
+
+    def check(self, available) -> None:
+        missing = [f for f in self.fields if f not in available]
+        if missing:
+            raise TemplateError(f"模板中的占位符没有对应的数据: {', '.join(missing)}（可用: {', '.join(map(str, available))}）")
+
+    def render(self, values: Dict[str, object]) -> str:
+        """单条渲染（表头、结尾这类只出现一次的模板）"""
+        self.check(values)
+        return "".join(lit + (str(values[f]) if f is not None else "") for lit, f in self.parts)
+
+    def render_frame(self, frame: pd.DataFrame) -> pd.Series:
+        """整列渲染：frame 的每一行是一位收件人，返回与 frame 同索引的消息列"""
+        self.check(frame.columns)
+        out = pd.Series("", index=frame.index, dtype=object)
+        for lit, field in self.parts:
+            if lit:
+                out = out + lit
+            if field is not None:
+                out = out + frame[field].astype(str)
+        return out
+
+
+@lru_cache(maxsize=32)
+def compile_template(text: str) -> CompiledTemplate:
+    return CompiledTemplate(text)
+
+
+def templates_path() -> str:
+    return state_path("templates.json")
+
+
+def load_templates(path: Optional[str] = None, create_default: bool = True) -> Dict[str, str]:
+    """读取模板配置；文件不存在时写出默认模板方便修改。缺的项用默认值补齐，每一项都先编译检查一遍"""
+    path = path or templates_path()
+    data: Dict[str, str] = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise TemplateError(f"模板文件读取失败（{path}）: {e}") from None
+        if not isinstance(data, dict):
+            raise TemplateError(f"模板文件格式错误（{path}）：应为 {{\"personal\": \"...\", ...}}")
+    elif create_default:
+        save_templates(DEFAULT_TEMPLATES, path)
+    templates = {key: str(data.get(key, default)) for key, default in DEFAULT_TEMPLATES.items()}
+    for key, text in templates.items():
+        try:
+            compiled = compile_template(text)
+            if key != "personal":
+                compiled.check(PLACEHOLDERS[key])
+        except TemplateError as e:
+            raise TemplateError(f"模板 {key} 有误: {e}") from None
+    return templates
+
+
+def save_templates(templates: Dict[str, str], path: Optional[str] = None):
+    path = path or templates_path()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(templates, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def benchmark(count: int = 20000, repeat: int = 3) -> Dict[str, float]:
+    """个人消息渲染吞吐（条/秒）：逐条 str.format 与整列渲染对比"""
+    template = DEFAULT_TEMPLATES["personal"]
+    frame = pd.DataFrame({
+        "姓名": [f"会员{i}" for i in range(count)],
+        "电话": [f"1380000{i % 10000:04d}" for i in range(count)],
+        "已用": [str(i % 30) for i in range(count)],
+        "剩余": [str(30 - i % 30) for i in range(count)],
+        "日期": "15",
+        "当天": "午餐",
+    })
+    compiled = compile_template(template)
+
+    def per_row():
+        return [template.format(**row) for row in frame.to_dict("records")]
+
+    def batch():
+        return compiled.render_frame(frame).tolist()
+
+    assert per_row() == batch()
+    result = {}
+    for name, fn in (("逐条 format", per_row), ("整列渲染", batch)):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        result[name] = count / best
+        print(f"{name:<10} {count} 条  {best:7.3f}s  {count / best:12,.0f} 条/秒")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="消息模板渲染吞吐测试")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.count, args.repeat)
@@ -0,0 +1,663 @@
+"""微信操作驱动：发送拆成 找窗口 → 激活 → 搜索进入聊天 → 定位输入框 → 粘贴 → 发送 → 读标题 几步
+
+发送器只调用这几步，不直接碰 pyautogui / pyperclip / win32gui：
+    DesktopDriver    Windows，win32 找窗口 + pyautogui 热键搜索 / 点击输入框（发送器原来的做法）
+    SimulatedWeChat  进程内模拟，任何平台可用：模拟联系人列表、焦点、每步耗时与失败率，并记录实际“发出”的内容
+选择驱动：环境变量 PY_WECHAT_DRIVER（desktop / sim，与订单发送器共用），不设置或取值为本工具没有的驱动时用 DesktopDriver。
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+DRIVER_ENV = "PY_WECHAT_DRIVER"
+SIM_LATENCY_ENV = "PY_WECHAT_SIM_LATENCY"
+
+STEPS = ("find_window", "activate", "search_chat", "focus_input", "paste", "send", "read_title")
+
+
+class WeChatDriver:
+    """驱动接口。每一步返回是否成功（read_title 返回标题文本），出错时尽量返回 False 而不是抛异常"""
+
+    name = ""
+    label = ""
+    # 是否只能在 Windows 上运行
+    requires_windows = False
+    # read_title 能否读到当前聊天名；能读到时 open_chat 会核对是否进错了聊天
+    title_reliable = False
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None):
+        self.progress: Callable[[str], None] = progress or (lambda msg: None)
+
+    def find_window(self) -> bool:
+        raise NotImplementedError
+
+    def activate(self) -> bool:
+        raise NotImplementedError
+
+    def search_chat(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def focus_input(self) -> bool:
+        raise NotImplementedError
+
+    def paste(self, text: str) -> bool:
+        raise NotImplementedError
+
+    def send(self) -> bool:
+        raise NotImplementedError
+
+    def read_title(self) -> str:
+        raise NotImplementedError
+
+    def enter_chat(self, name: str) -> bool:
+        """窗口已激活时搜索并进入指定聊天；能读到聊天名时核对是否进对了"""
+        if not self.search_chat(name):
+            return False
+        if self.title_reliable and self.read_title() != name:
+            self.progress(f"⚠️ 进入的聊天不是 {name}")
+            return False
+        return True
+
+    def open_chat(self, name: str) -> bool:
+        """找到并激活窗口，进入指定聊天"""
+        return self.find_window() and self.activate() and self.enter_chat(name)
+
+    def send_text(self, text: str) -> bool:
+        """在当前聊天中发送一条消息"""
+        return self.focus_input() and self.paste(text) and self.send()
+
+
+class DesktopDriver(WeChatDriver):
+    """win32 + pyautogui 方式：按类名 / 标题打分找微信窗口，Ctrl+F 搜索进入聊天，按控件 / 窗口位置估算输入框后点击粘贴"""
+
+    name = "desktop"
+    label = "热键"
+    requires_windows = True
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None):
+        super().__init__(progress)
+        self.hwnd = None
+
+        # 检查依赖
+        self.HAS_WIN32 = False
+        self.HAS_AUTO = False
+        self.HAS_PYAUTOGUI = False
+
+        try:
+            import win32gui, win32con
+            self.HAS_WIN32 = True
+        except ImportError:
+            pass
+
+        try:
+            import uiautomation
+            self.HAS_AUTO = True
+        except ImportError:
+            pass
+
+        try:
+            import pyautogui
+            import pyperclip
+            self.HAS_PYAUTOGUI = True
+        except ImportError:
+            pass
+
+    # ---- 窗口 ----
+
+    def _enum_wechat_window(self):
+        """查找微信窗口 - 改进版"""
+        if not self.HAS_WIN32:
+            return None
+
+        import win32gui
+
+        def enum_windows_callback(hwnd, windows):
+            if not win32gui.IsWindowVisible(hwnd) or not win32gui.IsWindowEnabled(hwnd):
+                return True
+
+            window_text = win32gui.GetWindowText(hwnd)
+            class_name = win32gui.GetClassName(hwnd)
+
+            # 计算匹配得分
+            match_score = 0
+
+            # 主要匹配条件
+            if class_name == "WeChatMainWndForPC":
+                match_score += 50
+            elif "WeChat" in class_name:
+                match_score += 30
+            elif "Wnd" in class_name and "PC" in class_name:
+                match_score += 20
+
+            # 窗口标题匹配
+            if "微信" in window_text:
+                match_score += 30
+            elif "WeChat" in window_text:
+                match_score += 25
+
+            # Qt框架提示
+            if "Qt5" in class_name or "Chrome_WidgetWin_1" in class_name:
+                match_score += 10
+
+            if match_score >= 30:  # 设定阈值
+                windows.append((hwnd, match_score, window_text, class_name))
+
+            return True
+
+        windows = []
+        try:
+            win32gui.EnumWindows(enum_windows_callback, windows)
+        except Exception as e:
+            self.progress(f"枚举窗口失败: {e}")
+            return None
+
+        if not windows:
+            return None
+
+        # 按匹配得分排序，选择最佳匹配
+        windows.sort(key=lambda x: x[1], reverse=True)
+        best_match = windows[0]
+
+        self.progress(f"找到微信窗口: {best_match[2]} (类名: {best_match[3]}, 得分: {best_match[1]})")
+        return best_match[0]
+
+    def find_window(self) -> bool:
+        self.hwnd = self._enum_wechat_window()
+        if not self.hwnd:
+            self.progress("❌ 未找到微信窗口")
+        return bool(self.hwnd)
+
+    def activate(self) -> bool:
+        """激活微信窗口 - 改进版"""
+        try:
+            if not self.HAS_WIN32 or not self.hwnd:
+                return False
+
+            import win32gui, win32con
+
+            # 检查窗口是否仍然有效
+            try:
+                if not win32gui.IsWindow(self.hwnd):
+                    self.progress("❌ 微信窗口句柄无效")
+                    return False
+            except Exception:
+                self.progress("❌ 无法验证微信窗口")
+                return False
+
+            # 多步骤激活窗口
+            try:
+                # 步骤1: 恢复窗口（如果最小化）
+                win32gui.ShowWindow(self.hwnd, win32con.SW_RESTORE)
+                time.sleep(0.2)
+
+                # 步骤2: 设置为顶层窗口
+                win32gui.SetWindowPos(self.hwnd, win32con.HWND_TOP, 0, 0, 0, 0,
+                                      win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
+                time.sleep(0.2)
+
+                # 步骤3: 设置为前台窗口
+                win32gui.SetForegroundWindow(self.hwnd)
+                time.sleep(0.3)
+
+                # 验证激活是否成功
+                try:
+                    if win32gui.GetForegroundWindow() == self.hwnd:
+                        self.progress("✅ 微信窗口已激活")
+                    else:
+                        self.progress("⚠️ 微信窗口激活可能不完整")
+                except Exception:
+                    self.progress("⚠️ 无法验证窗口激活状态，继续尝试")
+                return True  # 仍然尝试继续
+
+            except Exception as e:
+                self.progress(f"❌ 激活微信窗口失败: {e}")
+                return False
+
+        except Exception as e:
+            self.progress(f"❌ 激活微信窗口异常: {e}")
+            return False
+
+    def read_title(self) -> str:
+        """窗口标题（通常就是“微信”，不是当前聊天名）"""
+        try:
+            import win32gui
+            return win32gui.GetWindowText(self.hwnd) if self.hwnd else ""
+        except Exception:
+            return ""
+
+    # ---- 聊天 ----
+
+    def search_chat(self, name: str) -> bool:
+        """搜索并进入聊天窗口"""
+        try:
+            if not self.HAS_PYAUTOGUI:
+                return False
+
+            import pyautogui
+            import pyperclip
+
+            self.progress(f"🔍 搜索联系人: {name}")
+
+            # 多次尝试打开搜索框
+            search_attempts = 0
+            max_attempts = 3
+
+            while search_attempts < max_attempts:
+                try:
+                    pyautogui.hotkey('ctrl', 'f')
+                    time.sleep(0.5)
+                    search_attempts += 1
+
+                    # 清空搜索框
+                    pyautogui.hotkey('ctrl', 'a')
+                    time.sleep(0.2)
+                    pyautogui.press('delete')
+                    time.sleep(0.2)
+
+                    # 复制联系人姓名到剪贴板并验证
+                    pyperclip.copy(name)
+                    time.sleep(0.1)
+
+                    # 验证剪贴板内容
+                    if pyperclip.paste() != name:
+                        self.progress("⚠️ 剪贴板验证失败，重试...")
+                        continue
+
+                    # 粘贴联系人姓名
+                    pyautogui.hotkey('ctrl', 'v')
+                    time.sleep(0.5)
+
+                    # 按回车进入聊天
+                    pyautogui.press('enter')
+                    time.sleep(1.5)  # 等待聊天窗口加载
+
+                    self.progress(f"✅ 已进入与 {name} 的聊天")
+                    return True
+
+                except Exception as e:
+                    self.progress(f"⚠️ 搜索尝试 {search_attempts} 失败: {e}")
+                    if search_attempts < max_attempts:
+                        time.sleep(0.5)
+                        continue
+                    else:
+                        break
+
+            return False
+
+        except Exception as e:
+            self.progress(f"❌ 搜索联系人失败: {e}")
+            return False
+
+    # ---- 输入框 ----
+
+    def find_input_box_position(self):
+        """查找微信输入框的实际位置"""
+        try:
+            # 方法1: 尝试使用控件识别（如果可用）
+            position = self.find_input_by_control()
+            if position:
+                return position
+
+            # 方法2: 基于窗口计算
+            return self.find_input_by_window_calc()
+
+        except Exception as e:
+            self.progress(f"查找输入框位置失败: {e}")
+            return None
+
+    def find_input_by_control(self):
+        """通过控件识别查找输入框"""
+        try:
+            if not self.HAS_AUTO or not self.hwnd:
+                return None
+
+            import uiautomation as auto
+
+            # 获取微信窗口的控制对象
+            main_window = auto.WindowControl(Handle=self.hwnd)
+            if not main_window.Exists(0.5):
+                return None
+
+            # 查找所有编辑框控件
+            edit_controls = main_window.EditControls()
+            if not edit_controls:
+                return None
+
+            # 从后往前遍历，找到最适合的输入框
+            for edit_control in reversed(edit_controls):
+                try:
+                    rect = edit_control.BoundingRectangle
+                    if rect.width() > 100 and rect.height() > 20:  # 合理的输入框尺寸
+                        center_x = rect.left + rect.width() // 2
+                        center_y = rect.top + rect.height() // 2
+                        self.progress(f"通过控件找到输入框: ({center_x}, {center_y})")
+                        return (center_x, center_y)
+                except Exception:
+                    continue
+
+            return None
+
+        except Exception as e:
+            self.progress(f"控件识别查找输入框失败: {e}")
+            return None
+
+    def find_input_by_window_calc(self):
+        """通过窗口计算估算输入框位置"""
+        try:
+            if not self.HAS_WIN32 or not self.hwnd:
+                return None
+
+            import win32gui
+
+            # 获取微信窗口位置和尺寸
+            rect = win32gui.GetWindowRect(self.hwnd)
+            window_width = rect[2] - rect[0]
+            window_height = rect[3] - rect[1]
+
+            # 基于窗口尺寸动态计算输入框位置
+            # 输入框通常在窗口底部，距离底部约60-100像素
+            if window_height > 800:
+                y_offset = 100
+            elif window_height > 600:
+                y_offset = 85
+            else:
+                y_offset = 70
+
+            # 计算输入框中心位置
+            center_x = rect[0] + window_width // 2
+            center_y = rect[3] - y_offset
+
+            self.progress(f"通过窗口计算输入框位置: ({center_x}, {center_y})")
+            return (center_x, center_y)
+
+        except Exception as e:
+            self.progress(f"窗口计算查找输入框失败: {e}")
+            return None
+
+    def smart_click_input_area(self) -> bool:
+        """智能点击输入区域并验证"""
+        try:
+            if not self.HAS_PYAUTOGUI or not self.hwnd:
+                return False
+
+            import pyautogui
+            import win32gui
+
+            # 获取微信窗口位置
+            rect = win32gui.GetWindowRect(self.hwnd)
+            window_width = rect[2] - rect[0]
+
+            # 尝试多个可能的输入区域位置
+            base_y = rect[3] - 80  # 距离底部80像素
+
+            click_positions = [
+                (rect[0] + window_width // 2, base_y),  # 中央
+                (rect[0] + window_width // 3, base_y),  # 左侧1/3
+                (rect[0] + window_width * 2 // 3, base_y),  # 右侧2/3
+            ]
+
+            for pos_x, pos_y in click_positions:
+                try:
+                    self.progress(f"尝试点击输入区域: ({pos_x}, {pos_y})")
+                    pyautogui.click(pos_x, pos_y)
+                    time.sleep(0.3)
+
+                    # 验证点击是否成功：尝试输入一个字符然后删除
+                    pyautogui.typewrite('a')
+                    time.sleep(0.1)
+                    pyautogui.press('backspace')
+                    time.sleep(0.1)
+
+                    self.progress("✅ 输入区域点击成功")
+                    return True
+
+                except Exception as e:
+                    self.progress(f"点击位置 ({pos_x}, {pos_y}) 失败: {e}")
+                    continue
+
+            return False
+
+        except Exception as e:
+            self.progress(f"智能点击输入区域失败: {e}")
+            return False
+
+    def focus_input(self) -> bool:
+        """点击输入框：先按控件 / 窗口位置定位，找不到时逐个位置试点"""
+        if not self.HAS_PYAUTOGUI:
+            return False
+        input_position = self.find_input_box_position()
+        if input_position:
+            # 使用找到的精确位置
+            import pyautogui
+            pyautogui.click(input_position[0], input_position[1])
+            time.sleep(0.3)
+        elif not self.smart_click_input_area():
+            self.progress("⚠️ 无法定位输入框，使用默认位置")
+        return True
+
+    def paste(self, text: str) -> bool:
+        """经剪贴板把消息粘贴进输入框（先清空输入框）"""
+        try:
+            if not self.HAS_PYAUTOGUI:
+                return False
+
+            import pyautogui
+            import pyperclip
+
+            # 复制消息到剪贴板并验证
+            pyperclip.copy(text)
+            time.sleep(0.2)
+            if pyperclip.paste() != text:
+                self.progress("⚠️ 剪贴板内容验证失败")
+                return False
+
+            # 清空输入框
+            pyautogui.hotkey('ctrl', 'a')
+            time.sleep(0.1)
+            pyautogui.press('delete')
+            time.sleep(0.1)
+
+            # 粘贴消息
+            pyautogui.hotkey('ctrl', 'v')
+            time.sleep(0.5)
+            return True
+
+        except Exception as e:
+            self.progress(f"发送消息内容失败: {e}")
+            return False
+
+    def send(self) -> bool:
+        try:
+            import pyautogui
+            pyautogui.press('enter')
+            time.sleep(0.3)
+            return True
+        except Exception as e:
+            self.progress(f"发送消息内容失败: {e}")
+            return False
+
+    def send_via_hotkeys(self, name: str, text: str) -> bool:
+        """兜底：不定位输入框，纯热键 搜索 → 粘贴 → 回车"""
+        try:
+            import pyautogui
+            import pyperclip
+
+            pyautogui.FAILSAFE = True
+            pyautogui.PAUSE = 0.1
+
+            # 确保微信窗口激活
+            self.find_window() and self.activate()
+            time.sleep(1.0)
+
+            # 搜索联系人
+            pyautogui.hotkey('ctrl', 'f')
+            time.sleep(0.5)
+            pyperclip.copy(name)
+            pyautogui.hotkey('ctrl', 'a')
+            time.sleep(0.2)
+            pyautogui.hotkey('ctrl', 'v')
+            time.sleep(0.5)
+            pyautogui.press('enter')
+            time.sleep(1.5)
+
+            # 发送消息
+            pyperclip.copy(text)
+            pyautogui.hotkey('ctrl', 'a')
+            time.sleep(0.1)
+            pyautogui.hotkey('ctrl', 'v')
+            time.sleep(0.3)
+            pyautogui.press('enter')
+
+            self.progress(f"✅ 已发送给 {name} (热键方式)")
+            return True
+
+        except Exception as e:
+            self.progress(f"❌ 发送给 {name} 完全失败: {e}")
+            return False
+
+
+class SimulatedWeChat(WeChatDriver):
+    """进程内模拟的微信，用于在 Linux 上测试和压测发送流程。
+
+    chats       已有的聊天（群 / 联系人）名；strict_chats=False 时搜索任何名字都能进入
+    latency     每步耗时（秒），一个数或 {步骤: 秒}；sleep=False 时只累计到 elapsed 不真的等待
+    failure     每步失败概率，一个数或 {步骤: 概率}；失败的步骤返回 False，状态不变
+    running     微信是否“已启动”；False 时 find_window 失败
+    发出的消息按顺序记在 sent [(聊天, 内容)]，各聊天的记录在 chats[名字]，每步调用次数和失败次数在 calls / failures。
+    """
+
+    name = "sim"
+    label = "模拟"
+    title_reliable = True
+
+    def __init__(self, chats=(), latency: Union[float, Dict[str, float]] = 0.0,
+                 failure: Union[float, Dict[str, float]] = 0.0, seed: Optional[int] = None,
+                 running: bool = True, strict_chats: bool = True, sleep: bool = True,
+                 progress: Optional[Callable[[str], None]] = None):
+        super().__init__(progress)
+        self.chats: Dict[str, List[str]] = {str(c): [] for c in chats}
+        self.latency = self._per_step(latency)
+        self.failure = self._per_step(failure)
+        self.running = running
+        self.strict_chats = strict_chats
+        self.sleep = sleep
+        self.sent: List[Tuple[str, str]] = []
+        self.calls: Dict[str, int] = {step: 0 for step in STEPS}
+        self.failures: Dict[str, int] = {step: 0 for step in STEPS}
+        self.elapsed = 0.0
+        self.window_found = False
+        self.active = False
+        self.current: Optional[str] = None
+        self.input_focused = False
+        self.draft = ""
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _per_step(value: Union[float, Dict[str, float]]) -> Dict[str, float]:
+        if isinstance(value, dict):
+            unknown = set(value) - set(STEPS)
+            if unknown:
+                raise ValueError(f"未知的步骤: {', '.join(sorted(unknown))}（可选: {', '.join(STEPS)}）")
+            return {step: float(value.get(step, 0.0)) for step in STEPS}
+        return {step: float(value) for step in STEPS}
+
+    def _step(self, step: str) -> bool:
+        """记一次调用、模拟耗时，按失败率决定这一步是否成功"""
+        with self._lock:
+            self.calls[step] += 1
+            delay = self.latency[step]
+            self.elapsed += delay
+            failed = self.failure[step] > 0 and self._rng.random() < self.failure[step]
+            if failed:
+                self.failures[step] += 1
+        if delay and self.sleep:
+            time.sleep(delay)
+        return not failed
+
+    def find_window(self) -> bool:
+        self.window_found = self._step("find_window") and self.running
+        if not self.window_found:
+            self.active = False
+        return self.window_found
+
+    def activate(self) -> bool:
+        if not self._step("activate") or not self.window_found:
+            return False
+        self.active = True
+        return True
+
+    def search_chat(self, name: str) -> bool:
+        if not self._step("search_chat") or not self.active:
+            return False
+        if name not in self.chats:
+            if self.strict_chats:
+                self.progress(f"模拟微信：没有找到 {name}")
+                return False
+            self.chats[name] = []
+        # 切换聊天后输入框失去焦点，未发出的草稿不带过去
+        self.current = name
+        self.input_focused = False
+        self.draft = ""
+        return True
+
+    def focus_input(self) -> bool:
+        if not self._step("focus_input") or not self.active or self.current is None:
+            return False
+        self.input_focused = True
+        return True
+
+    def paste(self, text: str) -> bool:
+        if not self._step("paste") or not self.input_focused:
+            return False
+        self.draft = text  # 粘贴前先全选，替换输入框原有内容
+        return True
+
+    def send(self) -> bool:
+        if not self._step("send") or not self.input_focused or not self.draft:
+            return False
+        with self._lock:
+            self.chats[self.current].append(self.draft)
+            self.sent.append((self.current, self.draft))
+        self.draft = ""
+        return True
+
+    def read_title(self) -> str:
+        self._step("read_title")
+        return self.current or ""
+
+    def lose_focus(self):
+        """模拟用户切走窗口：微信不再是前台，输入框失去焦点"""
+        self.active = False
+        self.input_focused = False
+
+    def stats(self) -> Dict[str, object]:
+        return {"sent": len(self.sent), "elapsed": round(self.elapsed, 3),
+                "calls": dict(self.calls), "failures": {k: v for k, v in self.failures.items() if v}}
+
+
+DRIVERS = {
+    "desktop": DesktopDriver,
+    "sim": SimulatedWeChat,
+}
+
+
+def get_driver(name: Optional[str] = None, progress: Optional[Callable[[str], None]] = None) -> WeChatDriver:
+    """按名字或环境变量 PY_WECHAT_DRIVER 创建驱动，都未指定时用 DesktopDriver。
+    环境变量选 sim 时可进入任意聊天，每步耗时取 PY_WECHAT_SIM_LATENCY（秒，默认 0）。
+    环境变量与订单发送器共用，其中本工具没有的驱动（如 uia）回退到 DesktopDriver，不影响启动"""
+    explicit = name is not None
+    name = (name or os.environ.get(DRIVER_ENV) or "desktop").strip().lower()
+    if name not in DRIVERS:
+        if explicit:
+            raise ValueError(f"未知的微信驱动: {name}（可选: {', '.join(DRIVERS)}）")
+        if progress:
+            progress(f"⚠️ 餐数统计发送器不支持微信驱动 {name}，改用 desktop")
+        name = "desktop"
+    if name == "sim":
+        return SimulatedWeChat(strict_chats=False, latency=float(os.environ.get(SIM_LATENCY_ENV) or 0),
+                               progress=progress)
+    return DRIVERS[name](progress)